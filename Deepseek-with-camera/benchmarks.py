@@ -0,0 +1,1130 @@
+"""Benchmarks for dscamera.py
+
+用法：
+    python benchmarks.py transport [--iterations 20] [--image photo.jpg]
+    python benchmarks.py pipeline [--depths 1 2 3] [--duration 30]
+    python benchmarks.py reply [--first-token 400] [--tokens-per-second 30]
+    python benchmarks.py tts [--first-chunk 300] [--realtime-factor 4]
+    python benchmarks.py encode [--iterations 50] [--image photo.jpg]
+    python benchmarks.py burst [--images f1.jpg f2.jpg f3.jpg f4.jpg] [--live]
+    python benchmarks.py asr [--batch-sizes 1 4 16] [--audio a.wav b.wav] [--runtime onnx]
+    python benchmarks.py startup [--runs 3] [--eager]
+    python benchmarks.py capture [--duration 20] [--busy-threads 4] [--stall 500]
+    python benchmarks.py vad-energy [--chunks 5000] [--history 100 1000 10000]
+    python benchmarks.py vad-eval --speech s1.wav s2.wav --noise keyboard.wav fan.wav [--ambient room.wav]
+    python benchmarks.py asr-stream [--audio a.wav b.wav]
+    python benchmarks.py transcript [--records 1000 10000 100000]
+    python benchmarks.py ui [--duration 5] [--status-rate 500] [--preview-rate 30] [--message-rate 20]
+    python benchmarks.py preview [--frames 300] [--image photo.jpg]   （需要图形界面）
+
+所有基准都在本机运行，外部服务（OSS / Qwen-VL 等）用本地桩服务器代替，
+网络延迟和带宽通过参数模拟，因此结果只用于比较不同实现之间的相对差异。
+"""
+import argparse
+import base64
+import io
+import json
+import math
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import cv2
+import numpy as np
+
+
+# ---------------- Helpers ----------------
+def make_test_frame(image_path=None, size=(640, 480)):
+    """Return a BGR test frame: the given photo, or a synthetic desk-like scene"""
+    if image_path:
+        frame = cv2.imread(image_path)
+        if frame is None:
+            raise SystemExit(f"无法读取图片: {image_path}")
+        return cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+
+    # 合成画面：渐变背景 + 几个色块 + 轻微噪声，JPEG 体积接近真实摄像头画面
+    width, height = size
+    xx, yy = np.meshgrid(np.linspace(0, 1, width), np.linspace(0, 1, height))
+    frame = np.zeros((height, width, 3), dtype=np.float32)
+    frame[..., 0] = 90 + 60 * xx
+    frame[..., 1] = 80 + 70 * yy
+    frame[..., 2] = 120 + 40 * xx * yy
+    frame = frame.astype(np.uint8)
+    cv2.circle(frame, (width // 2, height // 3), height // 6, (60, 110, 200), -1)
+    cv2.rectangle(frame, (width // 3, height // 2), (2 * width // 3, height), (40, 40, 50), -1)
+    cv2.rectangle(frame, (width // 8, 2 * height // 3), (width // 4, height - 20), (200, 200, 220), -1)
+    noise = np.random.default_rng(0).normal(0, 6, frame.shape)
+    return np.clip(frame + noise, 0, 255).astype(np.uint8)
+
+
+def estimate_vl_tokens(image):
+    """Rough Qwen-VL visual token count: one token per 28x28 patch"""
+    height, width = image.shape[:2]
+    return math.ceil(height / 28) * math.ceil(width / 28)
+
+
+def summarize(samples):
+    """median / p90 / mean of a list of seconds, in milliseconds"""
+    ordered = sorted(samples)
+    p90 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.9))]
+    return "median {:8.1f} ms   p90 {:8.1f} ms   mean {:8.1f} ms".format(
+        statistics.median(ordered) * 1000, p90 * 1000, statistics.mean(ordered) * 1000)
+
+
+class HeadlessApp:
+    """Minimal stand-in for MultimediaAssistantApp so handlers run without a window.
+
+    after() callbacks run on timer threads but are serialized by one lock, like the Tk
+    main loop; update_placeholder() sleeps `reply_delay` seconds to stand in for DeepSeek.
+    post_message() hands image commentary to a background thread, one at a time, like the
+    app's single-worker image lane.
+    """
+    def __init__(self, reply_delay=0.0):
+        self.observation_history = []
+        self.placeholder_map = {}
+        self.reply_delay = reply_delay
+        self.tk_lock = threading.Lock()
+        self.lane_lock = threading.Lock()
+        self.ui = HeadlessUI(self)
+
+    def update_status(self, text):
+        pass
+
+    def add_observation(self, observation):
+        self.observation_history.append(observation)  # 不截断：基准要统计全部观察条数
+
+    def after(self, ms, func=None, *args):
+        if func is not None:
+            timer = threading.Timer(ms / 1000, self._run_callback, (func,) + args)
+            timer.daemon = True
+            timer.start()
+            return timer
+
+    def after_cancel(self, timer):
+        timer.cancel()
+
+    def _run_callback(self, func, *args):
+        with self.tk_lock:
+            func(*args)
+
+    def add_ai_message(self, text, screenshot=None, is_placeholder=False, placeholder_id=None):
+        if placeholder_id:
+            self.placeholder_map[placeholder_id] = len(self.placeholder_map)
+
+    def update_placeholder(self, placeholder_id, new_content, screenshots=None):
+        time.sleep(self.reply_delay)
+        self.placeholder_map.pop(placeholder_id, None)
+
+    def post_message(self, priority, message):
+        threading.Thread(target=self._run_lane, args=(message,), daemon=True).start()
+
+    def _run_lane(self, message):
+        with self.lane_lock:
+            self.update_placeholder(message["placeholder_id"], message["content"], message.get("screenshots"))
+
+    def _find_placeholder_label(self, placeholder_id):
+        return None
+
+    def _update_bubble_text(self, placeholder_id, text):
+        pass
+
+    def _finish_stream_bubble(self, placeholder_id, text):
+        self.placeholder_map.pop(placeholder_id, None)
+
+
+class HeadlessUI:
+    """UIDispatcher stand-in: every update runs through HeadlessApp.after()"""
+    def __init__(self, app):
+        self.app = app
+
+    def call(self, func, *args, **kwargs):
+        self.app.after(0, lambda: func(*args, **kwargs))
+
+    def latest(self, key, func, *args, **kwargs):
+        self.call(func, *args, **kwargs)
+
+
+class FakeSynthesizer:
+    """Local stand-in for CosyVoice: speech length follows text length, synthesized at
+    `realtime_factor` x real time after `first_chunk` seconds of startup latency"""
+    def __init__(self, callback=None, first_chunk=0.3, realtime_factor=4.0, chars_per_second=4.5,
+                 rate=22050, chunk_ms=100):
+        self.callback = callback
+        self.first_chunk = first_chunk
+        self.realtime_factor = realtime_factor
+        self.chars_per_second = chars_per_second
+        self.rate = rate
+        self.chunk_bytes = int(rate * chunk_ms / 1000) * 2
+
+    def pcm(self, text):
+        seconds = len(text) / self.chars_per_second
+        t = np.arange(int(seconds * self.rate)) / self.rate
+        return (np.sin(2 * np.pi * 220 * t) * 8000).astype(np.int16).tobytes()
+
+    def call(self, text):
+        pcm = self.pcm(text)
+        time.sleep(self.first_chunk)
+        if self.callback is None:
+            # 非流式：合成完整段音频后一次性返回
+            time.sleep(len(pcm) / 2 / self.rate / self.realtime_factor)
+            return pcm
+        for offset in range(0, len(pcm), self.chunk_bytes):
+            chunk = pcm[offset:offset + self.chunk_bytes]
+            self.callback.on_data(chunk)
+            time.sleep(len(chunk) / 2 / self.rate / self.realtime_factor)
+        self.callback.on_complete()
+
+
+class PacedSink:
+    """Output stand-in that takes as long to write as the audio lasts, like a sound card"""
+    def __init__(self, rate=22050):
+        self.rate = rate
+
+    def write(self, data):
+        time.sleep(len(data) / 2 / self.rate)
+
+
+class RecordingPlayer:
+    """Stand-in for AudioPlayer that only records when each TTS request arrives"""
+    def __init__(self):
+        self.requests = []
+
+    def begin_stream(self, priority=2):
+        return 1
+
+    def end_stream(self, stream_id):
+        pass
+
+    def play_text(self, text, priority=2, stream_id=0):
+        self.requests.append((time.perf_counter(), text))
+
+
+# ---------------- Stub server ----------------
+class StubServer:
+    """Local stand-in for OSS (PUT/GET objects) and the OpenAI-compatible Qwen-VL endpoint.
+
+    Every request pays `rtt` seconds plus body_size / bandwidth; the chat endpoint
+    additionally pays `fetch` seconds per image URL it has to pull back from "OSS"
+    and `model` seconds of simulated inference. Requests with "stream": true get the
+    reply as server-sent events, one character every `token_interval` seconds.
+    """
+
+    def __init__(self, rtt=0.03, bandwidth_mbps=20.0, fetch=0.05, model=0.8, token_interval=0.0,
+                 reply="画面中的人正在看电脑屏幕。判断结果：1.认真专注工作"):
+        self.rtt = rtt
+        self.token_interval = token_interval
+        self.reply = reply
+        self.bytes_per_second = bandwidth_mbps * 1024 * 1024 / 8
+        self.fetch = fetch
+        self.model = model
+        self.objects = {}
+        self.bytes_received = 0
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+
+    def reset_counters(self):
+        with self.lock:
+            self.bytes_received = 0
+
+    def _pay_transfer(self, size):
+        with self.lock:
+            self.bytes_received += size
+        time.sleep(self.rtt + size / self.bytes_per_second)
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _read_body(self):
+                length = int(self.headers.get("Content-Length", 0))
+                return self.rfile.read(length) if length else b""
+
+            def _reply(self, status, body=b"", content_type="application/json", headers=None):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("x-oss-request-id", "bench")
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                if body:
+                    self.wfile.write(body)
+
+            def do_PUT(self):
+                body = self._read_body()
+                server._pay_transfer(len(body))
+                server.objects[urlparse(self.path).path] = body
+                self._reply(200, headers={"ETag": '"bench"'})
+
+            def do_GET(self):
+                data = server.objects.get(urlparse(self.path).path)
+                if data is None:
+                    self._reply(404)
+                else:
+                    self._reply(200, data, content_type="image/jpeg")
+
+            def do_POST(self):
+                body = self._read_body()
+                server._pay_transfer(len(body))
+                request = json.loads(body)
+                images = []
+                for message in request.get("messages", []):
+                    content = message.get("content")
+                    if not isinstance(content, list):
+                        continue
+                    for part in content:
+                        if part.get("type") == "video":
+                            images.extend(part["video"])
+                        elif part.get("type") == "image_url":
+                            images.append(part["image_url"]["url"])
+                for ref in images:
+                    if ref.startswith("data:"):
+                        base64.b64decode(ref.split(",", 1)[1])
+                    else:
+                        # 模拟 Qwen 从 OSS 把图片拉回去
+                        time.sleep(server.fetch)
+                        server.objects.get(urlparse(ref).path)
+                time.sleep(server.model)
+                if request.get("stream"):
+                    self._stream_reply(request)
+                    return
+                time.sleep(server.token_interval * len(server.reply))
+                reply = {
+                    "id": "bench",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": request.get("model", "bench"),
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": server.reply},
+                        "finish_reason": "stop",
+                    }],
+                    "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+                }
+                self._reply(200, json.dumps(reply).encode("utf-8"))
+
+            def _stream_reply(self, request):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                for char in server.reply:
+                    time.sleep(server.token_interval)
+                    event = {
+                        "id": "bench",
+                        "object": "chat.completion.chunk",
+                        "created": int(time.time()),
+                        "model": request.get("model", "bench"),
+                        "choices": [{"index": 0, "delta": {"content": char}, "finish_reason": None}],
+                    }
+                    self.wfile.write(b"data: " + json.dumps(event).encode("utf-8") + b"\n\n")
+                    self.wfile.flush()
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+                self.close_connection = True
+
+        return Handler
+
+
+def stub_webcam_handler(dscamera, server, app):
+    """A WebcamHandler whose OSS bucket and Qwen-VL client both point at the stub server"""
+    import oss2
+    from openai import OpenAI
+
+    dscamera.OSS_BUCKET = "bench"
+    dscamera.OSS_ENDPOINT = f"127.0.0.1:{server.port}"
+    dscamera.qwen_client = OpenAI(api_key="bench", base_url=server.url + "/v1")
+
+    handler = dscamera.WebcamHandler(app)
+    handler.debug = False
+    handler._oss_bucket = oss2.Bucket(oss2.AnonymousAuth(), server.url, "bench",
+                                      is_cname=True, enable_crc=False,
+                                      session=oss2.Session(pool_size=dscamera.OSS_CONNECTION_POOL_SIZE))
+    return handler
+
+
+# ---------------- Benchmarks ----------------
+def bench_transport(args):
+    """End-to-end burst analysis latency: OSS upload vs inline base64 transport"""
+    import dscamera
+
+    frame = make_test_frame(args.image)
+    with StubServer(rtt=args.rtt / 1000, bandwidth_mbps=args.bandwidth, fetch=args.fetch / 1000,
+                    model=args.model / 1000) as server:
+        handler = stub_webcam_handler(dscamera, server, HeadlessApp())
+        start = time.time()
+        for i in range(dscamera.FRAME_BUFFER_SIZE):
+            handler.frame_buffer.begin_write()
+            handler.frame_buffer.commit(frame, timestamp=start + i / 30)
+
+        print(f"stub: rtt={args.rtt}ms bandwidth={args.bandwidth}Mbit/s oss-fetch={args.fetch}ms model={args.model}ms")
+        for transport in ("oss", "inline"):
+            dscamera.IMAGE_TRANSPORT = transport
+            prepare_times, total_times = [], []
+            server.reset_counters()
+            for _ in range(args.iterations):
+                screenshots, _current = handler._capture_screenshots()
+                t0 = time.perf_counter()
+                refs = handler._prepare_image_refs(screenshots)
+                t1 = time.perf_counter()
+                handler._get_image_analysis(refs)
+                t2 = time.perf_counter()
+                prepare_times.append(t1 - t0)
+                total_times.append(t2 - t0)
+            sent_kb = server.bytes_received / args.iterations / 1024
+            print(f"\n[{transport}] {sent_kb:.1f} KB sent per analysis")
+            print(f"  prepare  {summarize(prepare_times)}")
+            print(f"  total    {summarize(total_times)}")
+        handler.stop()
+
+
+def bench_capture(args):
+    """Audio lost by the VAD capture path while other threads keep the CPU / GIL busy"""
+    import dscamera
+
+    chunk_seconds = dscamera.CHUNK / dscamera.RATE
+    rng = np.random.default_rng(0)
+    chunks = [(rng.standard_normal(dscamera.CHUNK) * 300).astype(np.int16).tobytes() for _ in range(64)]
+
+    def busy():
+        # 模拟 ASR 后处理 / 图表线程：纯 Python 计算，一直抢 GIL
+        x = 0
+        while not stop.is_set():
+            for i in range(10000):
+                x += i * i
+
+    def produce(ring):
+        # 模拟 PortAudio：每 CHUNK/RATE 秒交付一块
+        next_time = time.perf_counter()
+        i = 0
+        while not stop.is_set():
+            ring.callback(chunks[i % len(chunks)], dscamera.CHUNK, None, 0)
+            i += 1
+            next_time += chunk_seconds
+            time.sleep(max(0, next_time - time.perf_counter()))
+
+    def consume(ring, poll_sleep):
+        vad = dscamera.VoiceActivityDetector(HeadlessApp())
+        vad.is_calibrating = False
+        last_stall = time.perf_counter()
+        while not stop.is_set():
+            data = ring.read(timeout=0.5)
+            if data is None:
+                continue
+            vad._is_speech(data, vad._get_energy(data))
+            if args.stall and time.perf_counter() - last_stall > args.stall_every:
+                time.sleep(args.stall / 1000)  # 模拟偶发的长处理（转写线程启动、打印等）
+                last_stall = time.perf_counter()
+            if poll_sleep:
+                time.sleep(poll_sleep)
+
+    # 旧做法的近似：阻塞 read + sleep(0.01)，能缓冲的只有 PortAudio 的几个主机缓冲区
+    modes = [
+        ("read+sleep", dscamera.AudioCaptureRing(seconds=args.legacy_buffers * chunk_seconds), 0.01),
+        ("callback ring", dscamera.AudioCaptureRing(), 0),
+    ]
+    print(f"{args.busy_threads} busy threads, stall {args.stall}ms every {args.stall_every}s, {args.duration}s per mode")
+    for name, ring, poll_sleep in modes:
+        stop = threading.Event()
+        threads = [threading.Thread(target=busy, daemon=True) for _ in range(args.busy_threads)]
+        threads += [threading.Thread(target=produce, args=(ring,), daemon=True),
+                    threading.Thread(target=consume, args=(ring, poll_sleep), daemon=True)]
+        for thread in threads:
+            thread.start()
+        time.sleep(args.duration)
+        stop.set()
+        for thread in threads:
+            thread.join(timeout=2)
+        stats = ring.stats()
+        lost_ms = stats["dropped"] * chunk_seconds * 1000
+        print(f"{name:14s} captured {stats['captured']:5d}  dropped {stats['dropped']:4d} ({lost_ms:7.0f} ms)  "
+              f"max fill {stats['max_fill']:3d}/{stats['capacity']}  underruns {stats['underruns']}")
+
+
+def bench_vad_energy(args):
+    """Per-chunk cost of energy + noise statistics: list-based VAD state vs NoiseStats ring"""
+    import dscamera
+
+    rng = np.random.default_rng(0)
+    chunks = [(rng.standard_normal(dscamera.CHUNK) * 300).astype(np.int16).tobytes() for _ in range(64)]
+
+    def legacy_step(noise_levels, history, audio_data):
+        # 旧实现：每块都分配临时数组；平均噪音每次对整个列表求和，pop(0) 是 O(n)
+        data = np.frombuffer(audio_data, dtype=np.int16)
+        energy = 0.0 if len(data) == 0 or np.all(data == 0) else np.mean(np.abs(data))
+        noise_levels.append(energy)
+        if len(noise_levels) > history:
+            noise_levels.pop(0)
+        return energy > max(100, sum(noise_levels) / len(noise_levels) * 2.5)
+
+    def current_step(vad, audio_data):
+        energy = vad._get_energy(audio_data)
+        vad.noise_levels.append(energy)
+        return energy > max(100, vad.noise_levels.mean * 2.5)
+
+    def measure(step):
+        for i in range(200):  # 预热：填满历史
+            step(chunks[i % len(chunks)])
+        start = time.perf_counter()
+        for i in range(args.chunks):
+            step(chunks[i % len(chunks)])
+        per_chunk = (time.perf_counter() - start) / args.chunks
+        tracemalloc.start()
+        base, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        for i in range(500):
+            step(chunks[i % len(chunks)])
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return per_chunk, peak - base
+
+    print(f"{args.chunks} chunks of {dscamera.CHUNK} samples")
+    for history in args.history:
+        noise_levels = [0.0] * history
+        legacy_time, legacy_peak = measure(lambda data: legacy_step(noise_levels, history, data))
+        vad = dscamera.VoiceActivityDetector(HeadlessApp())
+        vad.noise_levels = dscamera.NoiseStats(history)
+        current_time, current_peak = measure(lambda data: current_step(vad, data))
+        print(f"history {history:6d}: list {legacy_time * 1e6:8.1f} us/chunk (peak +{legacy_peak:6d} B)   "
+              f"ring {current_time * 1e6:8.1f} us/chunk (peak +{current_peak:6d} B)")
+
+
+def load_chunks(path):
+    """Read a WAV (any format pydub understands) as 16kHz mono int16 CHUNK-sized byte strings"""
+    from pydub import AudioSegment
+    import dscamera
+
+    sound = AudioSegment.from_file(path).set_channels(1).set_frame_rate(dscamera.RATE).set_sample_width(2)
+    raw = sound.raw_data
+    step = dscamera.CHUNK * 2
+    return [raw[i:i + step] for i in range(0, len(raw) - step + 1, step)]
+
+
+def count_utterances(decisions, chunk_seconds, silence=0.8, min_duration=0.5):
+    """Replay the detector's state machine: runs of speech chunks bridged across short silences"""
+    utterances = 0
+    start = last_speech = None
+    for i, is_speech in enumerate(decisions):
+        t = i * chunk_seconds
+        if is_speech:
+            if start is None:
+                start = t
+            last_speech = t
+        elif start is not None and t - last_speech > silence:
+            utterances += (last_speech - start + chunk_seconds) >= min_duration
+            start = None
+    if start is not None:
+        utterances += (last_speech - start + chunk_seconds) >= min_duration
+    return utterances
+
+
+def bench_vad_eval(args):
+    """Replay labeled recordings through each VAD backend: false triggers, speech hit rate, CPU per audio-second"""
+    import dscamera
+
+    chunk_seconds = dscamera.CHUNK / dscamera.RATE
+    speech = [(path, load_chunks(path)) for path in args.speech or []]
+    noise = [(path, load_chunks(path)) for path in args.noise or []]
+    ambient = load_chunks(args.ambient) if args.ambient else []
+    if not speech and not noise:
+        raise SystemExit("至少给出 --speech 或 --noise 录音")
+
+    def replay(vad, chunks):
+        vad.backend.reset()
+        decisions = []
+        start = time.process_time()
+        for data in chunks:
+            energy = vad._get_energy(data)
+            if not vad.is_speaking:
+                vad.noise_levels.append(energy)
+            is_speech = vad._is_speech(data, energy)
+            vad.is_speaking = is_speech
+            decisions.append(is_speech)
+        return decisions, time.process_time() - start
+
+    noise_minutes = sum(len(chunks) for _, chunks in noise) * chunk_seconds / 60
+    print(f"{len(speech)} speech files, {len(noise)} noise files ({noise_minutes:.1f} min)")
+    for name in args.backends:
+        vad = dscamera.VoiceActivityDetector(HeadlessApp())
+        vad.debug = False
+        if vad.set_backend(name) != name:
+            print(f"{name:7s} unavailable")
+            continue
+        # 和真实程序一样先用环境录音校准能量阈值
+        vad.is_calibrating = False
+        for data in ambient:
+            vad.noise_levels.append(vad._get_energy(data))
+        if len(vad.noise_levels):
+            vad.energy_threshold = max(100, vad.noise_levels.mean * 2.5)
+
+        cpu = audio = 0.0
+        false_triggers = 0
+        for _, chunks in noise:
+            decisions, spent = replay(vad, chunks)
+            false_triggers += count_utterances(decisions, chunk_seconds)
+            cpu += spent
+            audio += len(chunks) * chunk_seconds
+        detected = 0
+        for _, chunks in speech:
+            decisions, spent = replay(vad, chunks)
+            detected += count_utterances(decisions, chunk_seconds) > 0
+            cpu += spent
+            audio += len(chunks) * chunk_seconds
+        rate = false_triggers / noise_minutes if noise_minutes else float("nan")
+        hit = detected / len(speech) if speech else float("nan")
+        print(f"{name:7s} false triggers {false_triggers:3d} ({rate:5.2f}/min)  speech detected {hit:6.1%}  "
+              f"CPU {cpu / audio * 1000:6.2f} ms per audio-second")
+
+
+def bench_encode(args):
+    """Per-frame JPEG encode time for each backend and preset, against the old PIL path"""
+    from PIL import Image
+    import dscamera
+
+    frame = make_test_frame(args.image, size=(args.width, args.height))
+
+    def legacy_encode(frame):
+        # 原来的做法：BGR→RGB→PIL，每次新建 BytesIO，PIL 默认质量
+        buffer = io.BytesIO()
+        Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)).save(buffer, format='JPEG')
+        return buffer.getvalue()
+
+    cases = [("legacy pil", legacy_encode)]
+    for backend in ("turbojpeg", "cv2", "pil"):
+        if backend == "turbojpeg" and dscamera.TurboJPEG is None:
+            print("turbojpeg: 未安装 PyTurboJPEG，跳过")
+            continue
+        for preset in dscamera.JPEG_PRESETS:
+            encoder = dscamera.JpegEncoder(backend=backend, preset=preset)
+            if encoder.backend != backend:
+                continue
+            cases.append((f"{backend} / {preset}", encoder.encode))
+
+    print(f"frame {args.width}x{args.height}, {args.iterations} iterations")
+    for name, encode in cases:
+        encode(frame)  # 预热（分配缓冲区、加载库）
+        samples = []
+        for _ in range(args.iterations):
+            start = time.perf_counter()
+            data = encode(frame)
+            samples.append(time.perf_counter() - start)
+        print(f"{name:24s} {len(data) / 1024:7.1f} KB   {summarize(samples)}")
+
+
+def bench_burst(args):
+    """Bytes and visual tokens per analysis for each burst layout (optionally compare live Qwen-VL labels)"""
+    import dscamera
+
+    encoder = dscamera.JpegEncoder()
+
+    if args.images:
+        frames = [make_test_frame(path) for path in args.images]
+    else:
+        # 合成连拍：同一画面逐帧轻微平移，模拟小幅动作
+        base = make_test_frame()
+        frames = [np.roll(base, 4 * i, axis=1) for i in range(4)]
+
+    variants = [("frames", False), ("frames", True), ("mosaic", False), ("mosaic", True)]
+    baseline = None
+    for layout, crop in variants:
+        start = time.perf_counter()
+        images = dscamera.compose_burst(frames, layout=layout, crop_person=crop)
+        compose_ms = (time.perf_counter() - start) * 1000
+        jpeg_bytes = sum(len(encoder.encode(image)) for image in images)
+        tokens = sum(estimate_vl_tokens(image) for image in images)
+        if baseline is None:
+            baseline = (jpeg_bytes, tokens)
+        name = layout + (" + crop" if crop else "")
+        print(f"{name:16s} {len(images)} image(s)  {jpeg_bytes / 1024:8.1f} KB ({baseline[0] / jpeg_bytes:4.1f}x less)"
+              f"  ~{tokens:5d} visual tokens ({baseline[1] / tokens:4.1f}x less)  compose {compose_ms:6.1f} ms")
+
+    if args.live:
+        # 用真实的 Qwen-VL 比较不同布局下 extract_behavior_type 的结果是否一致（需要配置好 API key / OSS）
+        handler = dscamera.WebcamHandler(HeadlessApp())
+        handler.debug = False
+        dscamera.IMAGE_TRANSPORT = "inline"
+        for layout, crop in variants:
+            dscamera.BURST_LAYOUT, dscamera.BURST_CROP_PERSON = layout, crop
+            analysis = handler._get_image_analysis(handler._prepare_image_refs(frames))
+            behavior = dscamera.extract_behavior_type(analysis) if analysis else ("-", "调用失败")
+            print(f"[live] {layout}{' + crop' if crop else ''}: {behavior[0]}-{behavior[1]}")
+
+
+def bench_pipeline(args):
+    """Observations per minute of the analysis loop at different pipeline depths"""
+    import dscamera
+
+    base = make_test_frame(args.image)
+    with StubServer(rtt=args.rtt / 1000, bandwidth_mbps=args.bandwidth, fetch=args.fetch / 1000,
+                    model=args.model / 1000) as server:
+        app = HeadlessApp(reply_delay=args.reply / 1000)
+        handler = stub_webcam_handler(dscamera, server, app)
+        handler.running = True
+
+        # 模拟摄像头线程：画面一直在动，场景检测每次都判定为“有变化”
+        def feed():
+            shift = 0
+            while handler.running:
+                shift += 3
+                frame = np.roll(base, shift, axis=1)
+                handler.frame_buffer.begin_write()
+                handler.frame_buffer.commit(frame)
+                handler.scene_detector.update(frame)
+                time.sleep(1 / 30)
+        threading.Thread(target=feed, daemon=True).start()
+        time.sleep(1)
+
+        print(f"stub: model={args.model}ms reply={args.reply}ms, {args.duration}s per depth")
+        for depth in args.depths:
+            app.observation_history.clear()
+            handler.last_capture_time = 0
+            handler.pipeline = dscamera.AnalysisPipeline(handler._run_analysis, handler._apply_analysis, depth=depth)
+            handler.analysis_running = True
+            app.after(0, handler._schedule_capture, 0)
+            time.sleep(args.duration)
+            handler.analysis_running = False
+            handler.pipeline.stop()
+            timestamps = [obs["timestamp"] for obs in app.observation_history]
+            in_order = timestamps == sorted(timestamps)
+            rate = len(timestamps) * 60 / args.duration
+            print(f"depth {depth}: {len(timestamps):3d} observations  {rate:6.1f}/min  in order: {in_order}")
+            time.sleep(2.5)  # 等残留的 after() 定时器全部过期
+        handler.running = False
+
+
+def bench_reply(args):
+    """Time until the first sentence reaches TTS: streaming vs non-streaming DeepSeek replies"""
+    from openai import OpenAI
+    import dscamera
+
+    reply = "帆哥！你又在玩手机了，马上放下手机回到工作状态。工作时间玩手机会严重影响效率，专注起来！"
+    with StubServer(rtt=args.rtt / 1000, model=args.first_token / 1000,
+                    token_interval=1 / args.tokens_per_second, reply=reply) as server:
+        dscamera.deepseek_client = OpenAI(api_key="bench", base_url=server.url + "/v1")
+        app = HeadlessApp()
+        messages = [{"role": "user", "content": "bench"}]
+        print(f"stub: first token {args.first_token}ms, {args.tokens_per_second} chars/s, reply {len(reply)} chars")
+        for streaming in (False, True):
+            dscamera.DEEPSEEK_STREAMING = streaming
+            first_audio, totals = [], []
+            for _ in range(args.iterations):
+                app.audio_player = RecordingPlayer()
+                start = time.perf_counter()
+                dscamera.MultimediaAssistantApp.stream_ai_reply(app, messages, tts_priority=1)
+                totals.append(time.perf_counter() - start)
+                first_audio.append(app.audio_player.requests[0][0] - start)
+            print(f"\n[{'streaming' if streaming else 'blocking'}]")
+            print(f"  first TTS request {summarize(first_audio)}")
+            print(f"  full reply        {summarize(totals)}")
+
+
+def bench_tts(args):
+    """First-sample and total latency: streaming PCM playback vs mp3 temp file + decode"""
+    import os
+    from pydub import AudioSegment
+    import dscamera
+
+    text = "帆哥！你又在玩手机了，马上放下手机回到工作状态。"
+    fake_options = dict(first_chunk=args.first_chunk / 1000, realtime_factor=args.realtime_factor)
+    print(f"fake synthesizer: first chunk {args.first_chunk}ms, {args.realtime_factor}x real time, {len(text)} chars")
+
+    # 原来的流程：完整 mp3 → 写临时文件 → ffmpeg 解码 → 才能开始播放
+    legacy_first, legacy_total = [], []
+    synthesizer = FakeSynthesizer(**fake_options)
+    mp3 = io.BytesIO()
+    AudioSegment(synthesizer.pcm(text), sample_width=2, frame_rate=synthesizer.rate, channels=1).export(mp3, format="mp3")
+    for _ in range(args.iterations):
+        start = time.perf_counter()
+        synthesizer.call(text)
+        output_file = f"output_bench_{int(time.time() * 1000)}.mp3"
+        with open(output_file, "wb") as f:
+            f.write(mp3.getvalue())
+        sound = AudioSegment.from_file(output_file, format="mp3")
+        first = time.perf_counter() - start
+        os.remove(output_file)
+        legacy_first.append(first)
+        legacy_total.append(first + len(sound) / 1000)
+
+    # 流式：回调直接把 PCM 块写进输出流
+    stream_first, stream_total = [], []
+    app = HeadlessApp()
+    player = dscamera.AudioPlayer(app, synthesizer_factory=lambda callback: FakeSynthesizer(callback, **fake_options),
+                                  sink=PacedSink())
+    for _ in range(args.iterations):
+        player._synthesize_and_stream(text)
+        first, total = player.last_tts_latency
+        stream_first.append(first)
+        stream_total.append(total)
+
+    print("\n[mp3 file + decode]")
+    print(f"  first sample {summarize(legacy_first)}")
+    print(f"  total        {summarize(legacy_total)}")
+    print("\n[streaming pcm]")
+    print(f"  first sample {summarize(stream_first)}")
+    print(f"  total        {summarize(stream_total)}")
+
+
+def load_utterances(paths=None, count=16):
+    """Return float32 16kHz utterances: the given audio files, or synthetic speech-like tones of 1-4 s"""
+    if paths:
+        from pydub import AudioSegment
+        utterances = []
+        for path in paths:
+            sound = AudioSegment.from_file(path).set_channels(1).set_frame_rate(16000).set_sample_width(2)
+            utterances.append(np.frombuffer(sound.raw_data, dtype=np.int16).astype(np.float32) / 32768.0)
+        return [utterances[i % len(utterances)] for i in range(count)]
+
+    # 合成语音：基频抖动的谐波 + 音节包络 + 噪声，只用于测吞吐，不关心识别结果
+    rng = np.random.default_rng(0)
+    utterances = []
+    for i in range(count):
+        seconds = 1 + 3 * (i % 4) / 3
+        t = np.arange(int(16000 * seconds)) / 16000
+        pitch = 140 + 30 * np.sin(2 * math.pi * 0.7 * t)
+        phase = 2 * math.pi * np.cumsum(pitch) / 16000
+        voice = sum(np.sin(k * phase) / k for k in range(1, 6))
+        envelope = np.clip(np.sin(2 * math.pi * 3 * t), 0, None)
+        utterances.append((0.2 * voice * envelope + 0.01 * rng.standard_normal(len(t))).astype(np.float32))
+    return utterances
+
+
+def bench_asr(args):
+    """SenseVoice throughput (utterances/s) when queued utterances are transcribed in batches"""
+    import dscamera
+
+    model = dscamera.create_asr_model(device=args.device, use_vad=args.fsmn_vad, runtime=args.runtime)
+    utterances = load_utterances(args.audio, count=max(args.batch_sizes) * args.rounds)
+    dscamera.run_asr_batch(model, utterances[:1])  # 预热
+
+    # 先确认这个 runtime 对一整批样本数组返回的是逐条结果，而不是报错或数量对不上
+    sample = utterances[:max(args.batch_sizes)]
+    res = model.generate(input=sample, fs=16000, cache={}, language="auto", use_itn=False,
+                         ban_emo_unk=True, batch_size=len(sample))
+    if len(res) != len(sample):
+        raise SystemExit(f"{args.runtime}: {len(sample)} 段语音只返回了 {len(res)} 条结果")
+
+    audio_seconds = sum(len(u) for u in utterances) / 16000
+    print(f"{args.runtime}/{args.device} fsmn-vad={args.fsmn_vad}: {len(utterances)} utterances, {audio_seconds:.1f}s audio")
+    for batch_size in args.batch_sizes:
+        start = time.perf_counter()
+        for i in range(0, len(utterances), batch_size):
+            dscamera.run_asr_batch(model, utterances[i:i + batch_size])
+        elapsed = time.perf_counter() - start
+        print(f"batch {batch_size:2d}: {len(utterances) / elapsed:6.2f} utt/s  RTF {elapsed / audio_seconds:.3f}")
+
+
+def bench_asr_stream(args):
+    """End-of-utterance to text latency: streaming paraformer (chunks decoded while speaking) vs one SenseVoice pass"""
+    import dscamera
+
+    model = dscamera.create_asr_model(device=args.device)
+    stream_model = dscamera.create_streaming_asr_model(device=args.device)
+    utterances = load_utterances(args.audio, count=args.count)
+    step = dscamera.ASR_STREAM_CHUNK_SAMPLES
+    dscamera.run_asr_batch(model, utterances[:1])  # 预热
+    dscamera.run_asr_stream_chunk(stream_model, {}, utterances[0][:step], True)
+
+    whole, final_chunk, slowest_chunk = [], [], []
+    for utterance in utterances:
+        # 整段识别：静音判定结束后才开始推理
+        start = time.perf_counter()
+        dscamera.run_asr_batch(model, [utterance])
+        whole.append(time.perf_counter() - start)
+
+        # 流式识别：说话期间每 600ms 解一块，结束时只剩最后一块
+        cache = {}
+        chunk_times = []
+        for i in range(0, len(utterance), step):
+            start = time.perf_counter()
+            dscamera.run_asr_stream_chunk(stream_model, cache, utterance[i:i + step], i + step >= len(utterance))
+            chunk_times.append(time.perf_counter() - start)
+        final_chunk.append(chunk_times[-1])
+        slowest_chunk.append(max(chunk_times))
+
+    print(f"device={args.device}: {len(utterances)} utterances, chunk {step / 16000 * 1000:.0f}ms")
+    print(f"  SenseVoice whole utterance  {summarize(whole)}")
+    print(f"  streaming final chunk       {summarize(final_chunk)}")
+    print(f"  streaming slowest chunk     {summarize(slowest_chunk)}  (must stay under the chunk length to keep up)")
+
+
+def startup_probe(eager):
+    """Runs in a fresh interpreter: time import, first rendered window and ASR readiness"""
+    start = time.perf_counter()
+    import dscamera
+    imported = time.perf_counter() - start
+    if eager:
+        # 旧的做法：窗口创建之前同步加载模型
+        dscamera.create_asr_model()
+    app = dscamera.MultimediaAssistantApp()
+    app.update()
+    window = time.perf_counter() - start
+    while not app.asr_worker.ready.is_set() and app.asr_worker.state != "failed" and not eager:
+        app.update()
+        time.sleep(0.01)
+    ready = time.perf_counter() - start
+    dscamera.quit_app(app)
+    print(json.dumps({"import": imported, "window": window, "asr_ready": ready}))
+
+
+def bench_startup(args):
+    """Cold start: time to first rendered window and to ASR readiness (lazy background load vs eager load)"""
+    if args.probe:
+        startup_probe(args.eager)
+        return
+
+    timings = {"import": [], "window": [], "asr_ready": []}
+    for _ in range(args.runs):
+        command = [sys.executable, __file__, "startup", "--probe"] + (["--eager"] if args.eager else [])
+        output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        for key, value in result.items():
+            timings[key].append(value)
+
+    print(f"[{'eager' if args.eager else 'lazy'} ASR load] {args.runs} cold starts")
+    print(f"  import dscamera  {summarize(timings['import'])}")
+    print(f"  first window     {summarize(timings['window'])}")
+    print(f"  ASR ready        {summarize(timings['asr_ready'])}")
+
+
+def bench_transcript(args):
+    """Chat transcript store: append cost, memory and reading back early history from disk"""
+    import tempfile
+    import dscamera
+
+    text = "帆哥！你又在玩手机了，马上放下手机回到工作状态。" * 2
+    for records in args.records:
+        with tempfile.TemporaryDirectory() as directory:
+            tracemalloc.start()
+            store = dscamera.TranscriptStore(directory)
+            start = time.perf_counter()
+            for i in range(records):
+                store.append("ai" if i % 2 else "user", text)
+            append_us = (time.perf_counter() - start) / records * 1e6
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            # 翻到最早的一页（超出内存部分要从文件读回）
+            start = time.perf_counter()
+            earliest = store.before(dscamera.TRANSCRIPT_LOAD_STEP, dscamera.TRANSCRIPT_LOAD_STEP)
+            read_ms = (time.perf_counter() - start) * 1000
+            store.close()
+        print(f"{records:7d} records: append {append_us:6.1f} us/record  peak memory {peak / 1024:8.1f} KB  "
+              f"in memory {len(store.entries):5d}  earliest page {len(earliest)} records in {read_ms:7.1f} ms")
+
+
+def bench_ui(args):
+    """UI dispatcher: updates executed on the (simulated) Tk thread vs updates posted by workers"""
+    import dscamera
+
+    app = HeadlessApp()
+    dispatcher = dscamera.UIDispatcher(app)
+    executed = {"status": 0, "preview": 0, "message": 0}
+
+    def work(kind):
+        executed[kind] += 1
+        time.sleep(args.cost / 1000)  # 模拟一次控件更新的开销
+
+    def producer(kind, rate, keyed):
+        deadline = time.time() + args.duration
+        while time.time() < deadline:
+            if keyed:
+                dispatcher.latest(kind, work, kind)
+            else:
+                dispatcher.call(work, kind)
+            time.sleep(1 / rate)
+
+    dispatcher.start()
+    threads = [threading.Thread(target=producer, args=("status", args.status_rate, True)),
+               threading.Thread(target=producer, args=("preview", args.preview_rate, True)),
+               threading.Thread(target=producer, args=("message", args.message_rate, False))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    time.sleep(0.5)
+    dispatcher.stop()
+    for kind, count in executed.items():
+        print(f"{kind:8s} executed {count / args.duration:7.1f}/s")
+    print(dispatcher.summary())
+
+
+def bench_preview(args):
+    """Camera preview: frames rendered per CPU second, old CTkImage path vs PreviewRenderer"""
+    import customtkinter as ctk
+    import dscamera
+
+    frame = make_test_frame(args.image, size=(args.width, args.height))
+    root = ctk.CTk()
+    root.withdraw()
+
+    # 原来的做法：整帧转 PIL -> copy + thumbnail -> 每帧新建 CTkImage 再 configure 到 CTkLabel
+    buffer = dscamera.FrameRingBuffer()
+    label = ctk.CTkLabel(root, text="")
+    label.pack()
+    keep = None
+    start = time.process_time()
+    for _ in range(args.frames):
+        buffer.commit(frame)
+        img = buffer.get_image()
+        img_resized = img.copy()
+        img_resized.thumbnail(dscamera.PREVIEW_SIZE)
+        keep = ctk.CTkImage(light_image=img_resized, dark_image=img_resized, size=dscamera.PREVIEW_SIZE)
+        label.configure(image=keep)
+        root.update_idletasks()
+    old_cpu = time.process_time() - start
+
+    # 现在的做法：cv2.resize / cvtColor 写进预分配缓冲区，贴到同一个 PhotoImage
+    window = dscamera.CameraWindow(root)
+    window.withdraw()
+    renderer = dscamera.PreviewRenderer()
+    start = time.process_time()
+    for _ in range(args.frames):
+        renderer.prepare(frame)
+        window.show_preview(renderer)
+        root.update_idletasks()
+    new_cpu = time.process_time() - start
+    stats = renderer.stats()
+    root.destroy()
+
+    print(f"{args.width}x{args.height} -> preview {dscamera.PREVIEW_SIZE[0]}x{dscamera.PREVIEW_SIZE[1]}, {args.frames} frames")
+    print(f"CTkImage per frame : {args.frames / old_cpu:8.1f} frames/CPU-s  ({old_cpu / args.frames * 1000:6.2f} ms/frame)")
+    print(f"PreviewRenderer    : {args.frames / new_cpu:8.1f} frames/CPU-s  ({new_cpu / args.frames * 1000:6.2f} ms/frame)"
+          f"  -> adaptive {stats['fps']:.1f} fps at {dscamera.PREVIEW_CPU_BUDGET:.0%} CPU budget")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    transport = subparsers.add_parser("transport", help=bench_transport.__doc__)
+    transport.add_argument("--iterations", type=int, default=20)
+    transport.add_argument("--image", help="用真实照片代替合成画面")
+    transport.add_argument("--rtt", type=float, default=30, help="每个请求的往返延迟 (ms)")
+    transport.add_argument("--bandwidth", type=float, default=20, help="上行带宽 (Mbit/s)")
+    transport.add_argument("--fetch", type=float, default=50, help="Qwen 从 OSS 拉取每张图的耗时 (ms)")
+    transport.add_argument("--model", type=float, default=800, help="模拟的模型推理耗时 (ms)")
+    transport.set_defaults(func=bench_transport)
+
+    pipeline = subparsers.add_parser("pipeline", help=bench_pipeline.__doc__)
+    pipeline.add_argument("--depths", type=int, nargs="+", default=[1, 2, 3])
+    pipeline.add_argument("--duration", type=float, default=30, help="每个深度运行的秒数")
+    pipeline.add_argument("--image", help="用真实照片代替合成画面")
+    pipeline.add_argument("--rtt", type=float, default=30, help="每个请求的往返延迟 (ms)")
+    pipeline.add_argument("--bandwidth", type=float, default=20, help="上行带宽 (Mbit/s)")
+    pipeline.add_argument("--fetch", type=float, default=50, help="Qwen 从 OSS 拉取每张图的耗时 (ms)")
+    pipeline.add_argument("--model", type=float, default=2500, help="模拟的 Qwen-VL 推理耗时 (ms)")
+    pipeline.add_argument("--reply", type=float, default=1500, help="模拟的 DeepSeek 回复耗时 (ms)")
+    pipeline.set_defaults(func=bench_pipeline)
+
+    reply = subparsers.add_parser("reply", help=bench_reply.__doc__)
+    reply.add_argument("--iterations", type=int, default=5)
+    reply.add_argument("--rtt", type=float, default=30, help="每个请求的往返延迟 (ms)")
+    reply.add_argument("--first-token", type=float, default=400, help="模拟的首个token延迟 (ms)")
+    reply.add_argument("--tokens-per-second", type=float, default=30, help="模拟的生成速度（字/秒）")
+    reply.set_defaults(func=bench_reply)
+
+    tts = subparsers.add_parser("tts", help=bench_tts.__doc__)
+    tts.add_argument("--iterations", type=int, default=5)
+    tts.add_argument("--first-chunk", type=float, default=300, help="假合成器的首包延迟 (ms)")
+    tts.add_argument("--realtime-factor", type=float, default=4.0, help="假合成器的合成速度（相对实时的倍数）")
+    tts.set_defaults(func=bench_tts)
+
+    encode = subparsers.add_parser("encode", help=bench_encode.__doc__)
+    encode.add_argument("--iterations", type=int, default=50)
+    encode.add_argument("--image", help="用真实照片代替合成画面")
+    encode.add_argument("--width", type=int, default=640)
+    encode.add_argument("--height", type=int, default=480)
+    encode.set_defaults(func=bench_encode)
+
+    burst = subparsers.add_parser("burst", help=bench_burst.__doc__)
+    burst.add_argument("--images", nargs="+", help="按时间顺序给出一组真实连拍照片")
+    burst.add_argument("--live", action="store_true", help="同时调用真实的 Qwen-VL 比较各布局的行为判断")
+    burst.set_defaults(func=bench_burst)
+
+    asr = subparsers.add_parser("asr", help=bench_asr.__doc__)
+    asr.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 16])
+    asr.add_argument("--rounds", type=int, default=2, help="语音段总数 = 最大批大小 × rounds")
+    asr.add_argument("--audio", nargs="+", help="用真实录音代替合成语音（循环使用）")
+    asr.add_argument("--device", default="cpu")
+    asr.add_argument("--fsmn-vad", action="store_true", help="串联 fsmn-vad（此时每段语音单独推理）")
+    asr.add_argument("--runtime", choices=["torch", "onnx"], default="torch")
+    asr.set_defaults(func=bench_asr)
+
+    capture = subparsers.add_parser("capture", help=bench_capture.__doc__)
+    capture.add_argument("--duration", type=float, default=20, help="每种模式运行的秒数")
+    capture.add_argument("--busy-threads", type=int, default=4, help="抢占 CPU / GIL 的后台线程数")
+    capture.add_argument("--stall", type=float, default=500, help="VAD 线程偶发卡顿的时长 (ms)，0 表示不卡顿")
+    capture.add_argument("--stall-every", type=float, default=3, help="卡顿间隔 (秒)")
+    capture.add_argument("--legacy-buffers", type=int, default=4, help="旧做法下 PortAudio 能缓冲的块数")
+    capture.set_defaults(func=bench_capture)
+
+    vad_energy = subparsers.add_parser("vad-energy", help=bench_vad_energy.__doc__)
+    vad_energy.add_argument("--chunks", type=int, default=5000)
+    vad_energy.add_argument("--history", type=int, nargs="+", default=[100, 1000, 10000], help="噪声历史长度")
+    vad_energy.set_defaults(func=bench_vad_energy)
+
+    vad_eval = subparsers.add_parser("vad-eval", help=bench_vad_eval.__doc__)
+    vad_eval.add_argument("--speech", nargs="+", help="每个文件都包含一句话（应当触发）")
+    vad_eval.add_argument("--noise", nargs="+", help="只有噪声的录音，如键盘声、风扇（不应触发）")
+    vad_eval.add_argument("--ambient", help="用于校准能量阈值的环境录音")
+    vad_eval.add_argument("--backends", nargs="+", default=["energy", "webrtc", "silero"])
+    vad_eval.set_defaults(func=bench_vad_eval)
+
+    asr_stream = subparsers.add_parser("asr-stream", help=bench_asr_stream.__doc__)
+    asr_stream.add_argument("--count", type=int, default=8)
+    asr_stream.add_argument("--audio", nargs="+", help="用真实录音代替合成语音（循环使用）")
+    asr_stream.add_argument("--device", default="cpu")
+    asr_stream.set_defaults(func=bench_asr_stream)
+
+    startup = subparsers.add_parser("startup", help=bench_startup.__doc__)
+    startup.add_argument("--runs", type=int, default=3)
+    startup.add_argument("--eager", action="store_true", help="窗口创建前同步加载 ASR 模型（旧行为）作对比")
+    startup.add_argument("--probe", action="store_true", help=argparse.SUPPRESS)
+    startup.set_defaults(func=bench_startup)
+
+    transcript = subparsers.add_parser("transcript", help=bench_transcript.__doc__)
+    transcript.add_argument("--records", type=int, nargs="+", default=[1000, 10000, 100000])
+    transcript.set_defaults(func=bench_transcript)
+
+    ui = subparsers.add_parser("ui", help=bench_ui.__doc__)
+    ui.add_argument("--duration", type=float, default=5, help="seconds")
+    ui.add_argument("--status-rate", type=float, default=500, help="status updates per second")
+    ui.add_argument("--preview-rate", type=float, default=30, help="preview frames per second")
+    ui.add_argument("--message-rate", type=float, default=20, help="chat updates per second")
+    ui.add_argument("--cost", type=float, default=1.0, help="ms per executed UI update")
+    ui.set_defaults(func=bench_ui)
+
+    preview = subparsers.add_parser("preview", help=bench_preview.__doc__)
+    preview.add_argument("--frames", type=int, default=300)
+    preview.add_argument("--image", help="test image (default: synthetic frame)")
+    preview.add_argument("--width", type=int, default=1280)
+    preview.add_argument("--height", type=int, default=720)
+    preview.set_defaults(func=bench_preview)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,8 +2,11 @@ import os
 import cv2
 import time
 import io
+import base64
+import uuid
 import threading
 import queue
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import customtkinter as ctk
 from PIL import Image, ImageTk
@@ -17,6 +20,10 @@ from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from matplotlib.figure import Figure
 from openai import OpenAI
 import matplotlib.font_manager as fm
+try:
+    from turbojpeg import TurboJPEG  # 可选依赖：PyTurboJPEG（需要系统安装 libjpeg-turbo）
+except ImportError:
+    TurboJPEG = None
 
 # 日志配置
 LOG_FILE = "behavior_logg.txt"  # 定义日志文件名
@@ -27,6 +34,40 @@ logging.basicConfig(
     datefmt='%Y-%m-%d %H:%M:%S'  # 定义时间格式: 年-月-日 时:分:秒
 )
 
+# 摄像头配置
+FRAME_BUFFER_SIZE = 32  # 环形缓冲区保留的原始帧数（30fps 下约 1 秒历史）
+SCENE_CHECK_INTERVAL = 0.2  # 场景变化检测的采样间隔（秒）
+SCENE_CHANGE_THRESHOLD = 6.0  # 缩略灰度图平均差异超过该值才算画面变化（0-255）
+SCENE_MAX_REUSE_SECONDS = 60  # 画面一直不变时，最多沿用上次分析结果这么久，之后强制重新分析
+
+# 图像传输配置
+IMAGE_TRANSPORT = "oss"  # "oss": 上传到 OSS 再把公网 URL 发给 Qwen-VL；"inline": 直接把 base64 data URL 内联发送
+INLINE_MAX_SIDE = 640  # 内联图片最长边（像素）
+INLINE_MAX_BYTES = 120 * 1024  # 每张内联 JPEG 的字节上限
+INLINE_JPEG_QUALITIES = (85, 75, 65, 50)  # 依次尝试的 JPEG 质量，直到满足字节上限
+
+# 连拍布局配置
+BURST_LAYOUT = "frames"  # "frames": 4 张原图作为 video 发送；"mosaic": 拼成一张 2x2 缩略网格图发送
+BURST_CROP_PERSON = False  # True: 先按人脸检测结果裁出人物区域（含肩膀、手部和桌面），检测不到人时用整帧
+MOSAIC_TILE_WIDTH = 320  # 网格中每一格的宽度（像素），高度按原始比例
+
+# JPEG 编码配置
+JPEG_BACKEND = "auto"  # "auto": 有 PyTurboJPEG 就用 turbojpeg，否则用 cv2.imencode；也可指定 "turbojpeg" / "cv2" / "pil"
+JPEG_PRESET = "balanced"  # 上传截图使用的预设，见 JPEG_PRESETS
+JPEG_PRESETS = {
+    "high": {"quality": 90, "max_side": None},
+    "balanced": {"quality": 75, "max_side": None},  # 和原来 PIL 默认质量一致
+    "small": {"quality": 70, "max_side": 480},
+}
+
+# OSS 上传配置
+OSS_UPLOAD_WORKERS = 4  # 并行上传的线程数（一次分析的 4 张截图同时上传）
+OSS_CONNECTION_POOL_SIZE = 8  # OSS keep-alive 连接池大小
+
+# 图表配置
+CHART_UPDATE_INTERVAL = 2  # 检查图表是否需要重绘的间隔（秒），没有新数据时不画
+CHART_TIME_STEP = 60  # 折线图时间轴右端按这个粒度（秒）向前移动，移动时才整图重绘
+
 # 设置中文字体支持
 # 尝试加载系统默认中文字体
 try:
@@ -90,6 +131,291 @@ def extract_behavior_type(analysis_text):
     
     return "0", "未识别"  # 如果没有匹配项，返回默认值
 
+# ---------------- JPEG 编码器 ----------------
+class JpegEncoder:
+    """把原始 BGR 帧编码成 JPEG 字节，后端可替换
+    "turbojpeg"（PyTurboJPEG / libjpeg-turbo SIMD）、"cv2"（cv2.imencode 直接编码 BGR 数组，不用转 RGB）、
+    "pil"（原来的做法）；"auto" 自动选可用的最快后端。每个编码线程各自复用缩放缓冲区和 BytesIO"""
+
+    def __init__(self, backend=JPEG_BACKEND, preset=JPEG_PRESET):
+        self._turbo = None
+        self.backend = self._resolve_backend(backend)
+        self.preset = JPEG_PRESETS[preset]
+        self._local = threading.local()  # 每个线程一份可复用的缩放缓冲区和 BytesIO
+
+    def _resolve_backend(self, backend):
+        if backend in ("auto", "turbojpeg"):
+            if TurboJPEG is not None:
+                try:
+                    self._turbo = TurboJPEG()
+                    return "turbojpeg"
+                except (OSError, RuntimeError) as e:
+                    print(f"无法加载 libturbojpeg: {e}")
+            if backend == "turbojpeg":
+                print("turbojpeg 不可用，改用 cv2 编码")
+            return "cv2"
+        if backend not in ("cv2", "pil"):
+            raise ValueError(f"未知的 JPEG 编码后端: {backend}")
+        return backend
+
+    def _resize(self, frame, max_side):
+        """帧超过 max_side 时缩小到本线程复用的缓冲区里"""
+        height, width = frame.shape[:2]
+        if not max_side or max(height, width) <= max_side:
+            return frame
+        scale = max_side / max(height, width)
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        buffer = getattr(self._local, "resize_buffer", None)
+        if buffer is None or buffer.shape != (size[1], size[0], 3):
+            buffer = np.empty((size[1], size[0], 3), dtype=np.uint8)
+            self._local.resize_buffer = buffer
+        cv2.resize(frame, size, dst=buffer, interpolation=cv2.INTER_AREA)
+        return buffer
+
+    def encode(self, frame, quality=None, max_side=None):
+        """返回一帧 BGR 画面的 JPEG 字节，quality / max_side 默认取预设值"""
+        quality = self.preset["quality"] if quality is None else quality
+        max_side = self.preset["max_side"] if max_side is None else max_side
+        frame = self._resize(frame, max_side)
+
+        if self.backend == "turbojpeg":
+            return self._turbo.encode(frame, quality=quality)  # 默认就是 BGR 像素格式
+        if self.backend == "cv2":
+            ok, data = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+            if not ok:
+                raise RuntimeError("cv2.imencode 编码失败")
+            return data.tobytes()
+
+        buffer = getattr(self._local, "output", None)
+        if buffer is None:
+            buffer = self._local.output = io.BytesIO()
+        buffer.seek(0)
+        buffer.truncate()
+        Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)).save(buffer, format='JPEG', quality=quality)
+        return buffer.getvalue()
+
+def encode_inline_image(frame, encoder, max_side=INLINE_MAX_SIDE, max_bytes=INLINE_MAX_BYTES):
+    """把 BGR 帧编码成不超过 max_bytes 的 base64 JPEG data URL
+    先缩小到 max_side，再依次降低 JPEG 质量；最低质量仍然太大时把图像再缩小 25% 重试"""
+    max_side = min(max_side, max(frame.shape[:2]))
+    while True:
+        for quality in INLINE_JPEG_QUALITIES:
+            data = encoder.encode(frame, quality=quality, max_side=max_side)
+            if len(data) <= max_bytes:
+                break
+        if len(data) <= max_bytes or max_side <= 160:
+            break
+        max_side = int(max_side * 0.75)
+    return "data:image/jpeg;base64," + base64.b64encode(data).decode("ascii")
+
+_face_cascade = None
+
+def find_person_box(frames):
+    """返回整个连拍中人物所在的 (x0, y0, x1, y1) 区域，检测不到人脸时返回 None
+    人脸框会向外扩到肩膀、手部和面前的桌面——吃东西、喝水、玩手机都要看手和物品，只看脸判断不了"""
+    global _face_cascade
+    if _face_cascade is None:
+        _face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
+
+    height, width = frames[0].shape[:2]
+    box = None
+    for frame in frames:
+        # 在半尺寸灰度图上检测，速度快很多
+        small = cv2.resize(frame, (width // 2, height // 2), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        faces = _face_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(24, 24))
+        for fx, fy, fw, fh in faces:
+            fx, fy, fw, fh = fx * 2, fy * 2, fw * 2, fh * 2
+            face_box = (fx - 1.5 * fw, fy - 0.5 * fh, fx + 2.5 * fw, fy + 4 * fh)
+            if box is None:
+                box = face_box
+            else:
+                box = (min(box[0], face_box[0]), min(box[1], face_box[1]),
+                       max(box[2], face_box[2]), max(box[3], face_box[3]))
+
+    if box is None:
+        return None
+    return (max(0, int(box[0])), max(0, int(box[1])), min(width, int(box[2])), min(height, int(box[3])))
+
+def compose_burst(frames, layout=None, crop_person=None, tile_width=MOSAIC_TILE_WIDTH):
+    """编码前整理原始 BGR 连拍：可选裁剪到人物区域，可选拼成一张网格图
+    返回要发送的 BGR 图像列表——（裁剪后的）各帧，或只有一张拼图"""
+    layout = BURST_LAYOUT if layout is None else layout
+    crop_person = BURST_CROP_PERSON if crop_person is None else crop_person
+    if not frames:
+        return frames
+
+    if crop_person:
+        box = find_person_box(frames)
+        if box is not None:
+            # 整个连拍用同一个裁剪框，保证各帧之间仍然可以对比动作
+            x0, y0, x1, y1 = box
+            frames = [frame[y0:y1, x0:x1].copy() for frame in frames]
+
+    if layout != "mosaic":
+        return frames
+
+    # 按时间顺序从左到右、从上到下拼成网格，每格缩小到 tile_width 宽
+    height, width = frames[0].shape[:2]
+    tile_w = min(tile_width, width)
+    tile_h = max(1, round(height * tile_w / width))
+    cols = 2 if len(frames) > 1 else 1
+    rows = (len(frames) + cols - 1) // cols
+    mosaic = np.zeros((rows * tile_h, cols * tile_w, 3), dtype=np.uint8)
+    for i, frame in enumerate(frames):
+        row, col = divmod(i, cols)
+        mosaic[row * tile_h:(row + 1) * tile_h, col * tile_w:(col + 1) * tile_w] = cv2.resize(
+            frame, (tile_w, tile_h), interpolation=cv2.INTER_AREA)
+    return [mosaic]
+
+# ---------------- 帧环形缓冲区 ----------------
+class FrameRingBuffer:
+    """预分配的原始 BGR 帧环形缓冲区，每帧带序号
+    采集线程直接读进预留的槽位（稳定运行时不再分配内存），用到哪一帧才转换哪一帧"""
+
+    def __init__(self, capacity=FRAME_BUFFER_SIZE):
+        self.capacity = capacity
+        self.lock = threading.Lock()
+        self.frames = None  # (capacity, h, w, 3) uint8，第一帧确定分辨率后才分配
+        self.seqs = np.full(capacity, -1, dtype=np.int64)  # 每个槽位存放的帧序号，-1 表示无效
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+        self.next_seq = 0
+        self.latest_seq = -1
+        self._write_slot = None
+
+    def begin_write(self):
+        """预留下一个槽位，返回可写视图（第一帧之前返回 None）"""
+        with self.lock:
+            if self.frames is None:
+                self._write_slot = None
+                return None
+            slot = self.next_seq % self.capacity
+            # 写入期间把槽位标记为无效，读者不会读到写了一半的帧
+            self.seqs[slot] = -1
+            self._write_slot = slot
+            return self.frames[slot]
+
+    def abort_write(self):
+        """读取失败时放弃预留的槽位"""
+        with self.lock:
+            self._write_slot = None
+
+    def commit(self, frame, timestamp=None):
+        """发布写进预留槽位的帧，返回它的序号"""
+        with self.lock:
+            slot = self._write_slot
+            if self.frames is None or self.frames.shape[1:] != frame.shape:
+                # 第一帧或分辨率变化时（重新）分配整块缓冲区
+                self.frames = np.empty((self.capacity,) + frame.shape, dtype=frame.dtype)
+                self.seqs.fill(-1)
+                slot = None
+            if slot is None:
+                slot = self.next_seq % self.capacity
+            if not np.shares_memory(self.frames[slot], frame):
+                np.copyto(self.frames[slot], frame)
+            seq = self.next_seq
+            self.seqs[slot] = seq
+            self.timestamps[slot] = time.time() if timestamp is None else timestamp
+            self.next_seq += 1
+            self.latest_seq = seq
+            self._write_slot = None
+            return seq
+
+    def _slot_of(self, seq):
+        """返回存放 seq 的槽位，已被覆盖则返回 None（调用方需持有锁）"""
+        if seq is None:
+            seq = self.latest_seq
+        if seq < 0:
+            return None
+        slot = seq % self.capacity
+        if self.seqs[slot] != seq:
+            return None
+        return slot
+
+    def get_frame(self, seq=None):
+        """返回一帧原始 BGR 数据的副本（默认最新一帧）"""
+        with self.lock:
+            slot = self._slot_of(seq)
+            if slot is None:
+                return None
+            return self.frames[slot].copy()
+
+    def sample(self, count, interval):
+        """从已采集的历史中挑选最多 count 帧，间隔 interval 秒，以最新一帧结尾
+        完全不碰摄像头设备，返回按时间从早到晚排列的 BGR 副本"""
+        with self.lock:
+            valid = np.flatnonzero(self.seqs >= 0)
+            if valid.size == 0:
+                return []
+            stamps = self.timestamps[valid]
+            latest_ts = stamps.max()
+            picked = []
+            # 目标时间点从早到晚排列，每个目标取时间戳最接近的一帧（去重，历史不够时返回更少的帧）
+            for k in range(count - 1, -1, -1):
+                target = latest_ts - k * interval
+                slot = valid[np.argmin(np.abs(stamps - target))]
+                if slot not in picked:
+                    picked.append(slot)
+            return [self.frames[slot].copy() for slot in picked]
+
+    def get_image(self, seq=None):
+        """把缓冲区中的一帧（默认最新一帧）惰性转换为 PIL RGB 图像"""
+        with self.lock:
+            slot = self._slot_of(seq)
+            if slot is None:
+                return None
+            # cvtColor 本身就会生成新数组，所以在锁内转换即可，不用额外复制
+            frame_rgb = cv2.cvtColor(self.frames[slot], cv2.COLOR_BGR2RGB)
+        return Image.fromarray(frame_rgb)
+
+class SceneChangeDetector:
+    """基于极小灰度缩略图的场景变化检测器（本地运行，开销很小）
+    参考图是上次真正分析时的画面，has_changed() 判断此后是否有任意一帧和它的差异超过阈值"""
+    #画面没变化就沿用上次的行为结果，不再上传 OSS、不再调用 Qwen-VL
+
+    def __init__(self, threshold=SCENE_CHANGE_THRESHOLD, size=(32, 24)):
+        self.threshold = threshold
+        self.size = size
+        self.lock = threading.Lock()
+        self.latest = None  # 最近一次采样的缩略图
+        self.reference = None  # 上次分析时的缩略图
+        self.max_diff = 0.0  # 自上次分析以来与参考图的最大差异
+
+    def _signature(self, frame):
+        """缩小为零均值的灰度缩略图"""
+        small = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY).astype(np.float32)
+        # 减去均值，自动曝光/灯光整体变亮变暗不会被当成画面变化
+        gray -= gray.mean()
+        return gray
+
+    def update(self, frame):
+        """输入一帧原始 BGR 画面（由采集线程低频调用）"""
+        signature = self._signature(frame)
+        with self.lock:
+            self.latest = signature
+            if self.reference is not None:
+                diff = float(np.mean(np.abs(signature - self.reference)))
+                self.max_diff = max(self.max_diff, diff)
+
+    def mark_reference(self):
+        """把当前画面记为正在分析的画面"""
+        with self.lock:
+            self.reference = self.latest
+            self.max_diff = 0.0
+
+    def invalidate(self):
+        """丢弃参考图，下一次检查一定返回“有变化”（例如分析失败后）"""
+        with self.lock:
+            self.reference = None
+
+    def has_changed(self):
+        """自 mark_reference() 以来画面是否变化（没有可比较的数据时也返回 True）"""
+        with self.lock:
+            if self.reference is None or self.latest is None:
+                return True
+            return self.max_diff > self.threshold
+
 # ---------------- 摄像头显示窗口 ----------------
 class CameraWindow(ctk.CTkToplevel):
     def __init__(self, *args, **kwargs):
@@ -186,21 +512,21 @@ class BehaviorVisualizer:
             "7": "#795548"   # 棕色表示其他
         }
         
-        # 数据存储
+        # 数据存储（add_behavior_data 可能在分析线程里调用，读写都加锁）
         self.behavior_history = []  # (时间戳, 行为编号) 元组列表
         self.behavior_counts = {key: 0 for key in self.behavior_map}
+        self.data_lock = threading.Lock()
+        self.dirty = False  # 有新数据、图表还没画
         
         # 图表更新频率
-        self.update_interval = 2  # 秒
+        self.update_interval = CHART_UPDATE_INTERVAL  # 秒
         
         # 设置图表
         self.setup_charts()
         
-        # 启动更新线程
+        # 定时检查（在 Tk 主线程执行，没有新数据、时间轴也没走动时什么都不画）
         self.running = True
-        self.update_thread = threading.Thread(target=self._update_charts_thread)
-        self.update_thread.daemon = True
-        self.update_thread.start()
+        self.update_job = self.parent_frame.after(int(self.update_interval * 1000), self._update_charts_tick)
     
     def setup_charts(self):
         """创建并设置折线图和饼图"""
@@ -265,12 +591,36 @@ class BehaviorVisualizer:
         # 设置y轴显示行为类型
         self.line_ax.set_yticks(list(range(1, 8)))
         self.line_ax.set_yticklabels([self.behavior_map[str(i)] for i in range(1, 8)])
+        self.line_ax.set_ylim(0.5, 7.5)  # 添加一些填充
         
         # 添加网格
         self.line_ax.grid(True, linestyle='--', alpha=0.3, color='gray')
         
+        # 将x轴格式化为时间
+        self.line_ax.xaxis_date()
+        self.line_ax.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M:%S'))
+        
+        # 数据图元只创建一次，之后用 set_offsets / set_data 更新
+        # animated=True：整图重绘时不画它们，由 blitting 叠加在缓存的背景上
+        self.line_trail, = self.line_ax.plot([], [], '-', alpha=0.3, color='white', animated=True)
+        self.line_scatters = {}
+        for i in range(1, 8):
+            key = str(i)
+            self.line_scatters[key] = self.line_ax.scatter(
+                [], [],
+                color=self.behavior_colors[key],
+                s=50,  # 点的大小
+                label=self.behavior_map[key],
+                animated=True
+            )
+        self.line_xlim = None
+        self.line_background = None
+        
         # 嵌入到Tkinter
         self.line_canvas = FigureCanvasTkAgg(self.line_fig, master=self.line_chart_frame)
+        # 每次整图重绘（首次显示、窗口缩放、时间轴移动）后重新缓存背景，再把数据图元画上去
+        self.line_canvas.mpl_connect('draw_event', self._on_line_draw)
+        self.line_fig.tight_layout()
         self.line_canvas.draw()
         self.line_canvas.get_tk_widget().pack(fill="both", expand=True)
     
@@ -300,116 +650,107 @@ class BehaviorVisualizer:
     def add_behavior_data(self, timestamp, behavior_num, behavior_desc):
         """向可视化添加新的行为数据点"""
         try:
-            # 添加到历史记录
-            self.behavior_history.append((timestamp, behavior_num))
-            
-            # 更新计数
-            self.behavior_counts[behavior_num] = self.behavior_counts.get(behavior_num, 0) + 1
-            
-            # 限制历史记录长度以提高性能（保留最近100个条目）
-            if len(self.behavior_history) > 100:
-                self.behavior_history = self.behavior_history[-100:]
+            with self.data_lock:
+                # 添加到历史记录
+                self.behavior_history.append((timestamp, behavior_num))
+                
+                # 更新计数
+                self.behavior_counts[behavior_num] = self.behavior_counts.get(behavior_num, 0) + 1
+                
+                # 限制历史记录长度以提高性能（保留最近100个条目）
+                if len(self.behavior_history) > 100:
+                    self.behavior_history = self.behavior_history[-100:]
+                self.dirty = True
                 
             print(f"添加行为数据: {behavior_num} - {behavior_desc}")
             
-            # 不立即更新图表，更新线程会处理此操作
+            # 不立即更新图表，定时检查会处理此操作
         except Exception as e:
             print(f"添加行为数据时出错: {e}")
     
-    def _update_charts_thread(self):
-        """定期更新图表的线程"""
-        while self.running:
-            try:
-                # 更新折线图
+    def _update_charts_tick(self):
+        """定期检查是否需要重绘（Tk 主线程）"""
+        if not self.running:
+            return
+        try:
+            with self.data_lock:
+                dirty, self.dirty = self.dirty, False
+            
+            # 折线图：时间轴走到下一格时整图重绘，只有新数据时用 blitting 只画数据
+            xlim_moved = self._update_line_xlim()
+            if xlim_moved:
+                self.line_canvas.draw_idle()
+            elif dirty:
                 self.update_line_chart()
-                
-                # 更新饼图
+            
+            # 饼图和统计只在有新数据时更新
+            if dirty:
                 self.update_pie_chart()
-                
-                # 更新统计信息
                 self.update_statistics()
-            except Exception as e:
-                print(f"更新图表时出错: {e}")
-            
-            # 等待下次更新
-            time.sleep(self.update_interval)
+        except Exception as e:
+            print(f"更新图表时出错: {e}")
+        
+        # 等待下次更新
+        self.update_job = self.parent_frame.after(int(self.update_interval * 1000), self._update_charts_tick)
+    
+    def _line_window(self, times):
+        """当前时间窗口：最多显示1小时的数据，右端按 CHART_TIME_STEP 取整，不必每次都移动"""
+        step = CHART_TIME_STEP
+        now = time.time()
+        right = datetime.fromtimestamp((int(now // step) + 1) * step)
+        min_time = right - timedelta(hours=1)
+        if times and times[0] > min_time:
+            return times[0], right
+        return min_time, right
+    
+    def _update_line_xlim(self):
+        """设置时间窗口；窗口移动时返回 True（需要重画坐标轴背景）"""
+        with self.data_lock:
+            times = [t for t, _ in self.behavior_history]
+        if not times:
+            return False
+        xlim = self._line_window(times)
+        if xlim == self.line_xlim:
+            return False
+        self.line_xlim = xlim
+        self.line_ax.set_xlim(*xlim)
+        return True
+    
+    def _set_line_data(self):
+        """把最新数据写进已有的图元（不新建、不清空坐标轴）"""
+        with self.data_lock:
+            history = list(self.behavior_history)
+        if not history:
+            return
+        times = mdates.date2num([t for t, _ in history])
+        values = np.array([int(b) for _, b in history], dtype=float)
+        
+        self.line_trail.set_data(times, values)
+        for key, scatter in self.line_scatters.items():
+            mask = values == int(key)
+            scatter.set_offsets(np.column_stack((times[mask], values[mask])))
+    
+    def _draw_line_artists(self):
+        self.line_ax.draw_artist(self.line_trail)
+        for scatter in self.line_scatters.values():
+            self.line_ax.draw_artist(scatter)
+    
+    def _on_line_draw(self, event):
+        """draw_event：缓存没有数据图元的背景，再把数据画上去"""
+        self.line_background = self.line_canvas.copy_from_bbox(self.line_fig.bbox)
+        self._set_line_data()
+        self._draw_line_artists()
     
     def update_line_chart(self):
-        """用最新数据更新折线图"""
+        """用最新数据更新折线图（恢复缓存的背景，只重画数据图元）"""
         try:
-            self.line_ax.clear()
-            
-            # 设置背景颜色
-            self.line_ax.set_facecolor('#1a1a1a')
-            
-            # 设置文本颜色为白色
-            self.line_ax.set_title("行为随时间变化", color='white')
-            self.line_ax.set_xlabel("时间", color='white')
-            self.line_ax.set_ylabel("行为", color='white')
-            self.line_ax.tick_params(axis='x', colors='white')
-            self.line_ax.tick_params(axis='y', colors='white')
-            
-            # 设置边框颜色为白色
-            for spine in self.line_ax.spines.values():
-                spine.set_edgecolor('white')
-            
-            if not self.behavior_history:
-                # 尚无数据，显示带有正确标签的空图表
-                self.line_ax.set_yticks(list(range(1, 8)))
-                self.line_ax.set_yticklabels([self.behavior_map[str(i)] for i in range(1, 8)])
-                self.line_ax.grid(True, linestyle='--', alpha=0.3, color='gray')
-                self.line_canvas.draw()
+            if self.line_background is None:
+                self.line_canvas.draw_idle()
                 return
-            
-            # 提取数据
-            times, behaviors = zip(*self.behavior_history)
-            
-            # 将行为编号转换为整数以便绘图
-            behavior_ints = [int(b) for b in behaviors]
-            
-            # 为每种行为创建散点图和线
-            for i in range(1, 8):
-                # 筛选此行为的数据
-                indices = [j for j, b in enumerate(behavior_ints) if b == i]
-                if indices:
-                    behavior_times = [times[j] for j in indices]
-                    behavior_vals = [behavior_ints[j] for j in indices]
-                    
-                    # 用正确的颜色绘制散点
-                    self.line_ax.scatter(
-                        behavior_times, 
-                        behavior_vals, 
-                        color=self.behavior_colors[str(i)],
-                        s=50,  # 点的大小
-                        label=self.behavior_map[str(i)]
-                    )
-            
-            # 绘制连接相邻点的线
-            self.line_ax.plot(times, behavior_ints, 'k-', alpha=0.3, color='white')
-            
-            # 将x轴格式化为时间
-            self.line_ax.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M:%S'))
-            
-            # 设置时间范围，最多显示1小时的数据，如果数据较少则显示较少时间
-            now = datetime.now()
-            min_time = now - timedelta(hours=1)
-            if times and times[0] < min_time:
-                self.line_ax.set_xlim(min_time, now)
-            elif times:
-                self.line_ax.set_xlim(times[0], now)
-            
-            # 设置y轴
-            self.line_ax.set_yticks(list(range(1, 8)))
-            self.line_ax.set_yticklabels([self.behavior_map[str(i)] for i in range(1, 8)])
-            self.line_ax.set_ylim(0.5, 7.5)  # 添加一些填充
-            
-            # 添加网格
-            self.line_ax.grid(True, linestyle='--', alpha=0.3, color='gray')
-            
-            # 更新画布
-            self.line_fig.tight_layout()
-            self.line_canvas.draw()
-            
+            self._set_line_data()
+            self.line_canvas.restore_region(self.line_background)
+            self._draw_line_artists()
+            self.line_canvas.blit(self.line_fig.bbox)
         except Exception as e:
             print(f"更新折线图时出错: {e}")
     
@@ -465,16 +806,21 @@ class BehaviorVisualizer:
         pass
     
     def refresh_charts(self):
-        """手动刷新所有图表"""
-        self.update_line_chart()
+        """手动刷新所有图表（整图重绘）"""
+        self._update_line_xlim()
+        self.line_canvas.draw_idle()
         self.update_pie_chart()
         self.update_statistics()
     
     def stop(self):
-        """停止更新线程"""
+        """停止定时更新"""
         self.running = False
-        if self.update_thread and self.update_thread.is_alive():
-            self.update_thread.join(timeout=1.0)
+        if self.update_job is not None:
+            try:
+                self.parent_frame.after_cancel(self.update_job)
+            except Exception:
+                pass
+            self.update_job = None
 
 # ---------------- 摄像头处理类 ----------------
 class WebcamHandler:
@@ -502,7 +848,15 @@ class WebcamHandler:
         self.processing = False  # 标记分析是否正在进行
         self.cap = None  # OpenCV摄像头对象
         self.webcam_thread = None  # 线程对象
-        self.last_webcam_image = None  # 存储最近的摄像头图像
+        self.frame_buffer = FrameRingBuffer()  # 原始 BGR 帧环形缓冲区，用时才转换
+        self.scene_detector = SceneChangeDetector()  # 画面静止时跳过分析
+        self.last_analysis = None  # 上次真正调用 Qwen-VL 的结果，画面不变时沿用
+        
+        # 长期复用的 OSS 客户端和上传线程池（第一次上传时创建）
+        self._oss_bucket = None
+        self._oss_lock = threading.Lock()
+        self.upload_executor = None
+        self.jpeg_encoder = JpegEncoder()  # 上传线程池和内联传输共用的 JPEG 编码器
         self.debug = True  # 设置为True启用调试输出
         
         # 顺序处理控制
@@ -511,6 +865,11 @@ class WebcamHandler:
         # 摄像头窗口
         self.camera_window = None
     
+    @property
+    def last_webcam_image(self):
+        """最近一帧摄像头画面（访问时才转换为 PIL 图像）"""
+        return self.frame_buffer.get_image()
+    
     def start(self):
         """启动摄像头捕获进程"""
         if not self.running:
@@ -589,6 +948,12 @@ class WebcamHandler:
         # self.cap 是通过 cv2.VideoCapture(0) 打开的摄像头对象。
         # .release() 是 OpenCV 提供的关闭摄像头设备的方法。
         
+        # 释放上传线程池（和 _get_oss_bucket 用同一把锁，避免上传线程拿到一半被置空）
+        with self._oss_lock:
+            if self.upload_executor:
+                self.upload_executor.shutdown(wait=False)
+                self.upload_executor = None
+        
         # 关闭摄像头窗口
         if self.camera_window:
             self.camera_window.destroy()
@@ -599,33 +964,38 @@ class WebcamHandler:
 
     
     def _process_webcam(self):
-        """主摄像头处理循环 - 仅保留最近的帧"""
+        """主摄像头处理循环 - 把最近的原始帧保存在环形缓冲区中"""
         #它是一个**“后台线程执行的主循环”**，不断从摄像头采集图像、处理并更新到界面。
         last_ui_update_time = 0
         ui_update_interval = 0.05  # 以20fps更新UI
+        last_scene_check_time = 0
         #UI每 0.05秒更新一次图像 → 相当于最多20fps（1秒最多更新20次）
         while self.running:
             try:
-                ret, frame = self.cap.read()
+                # 直接读进环形缓冲区的下一个槽位（每帧不再分配新数组）
+                slot = self.frame_buffer.begin_write()
+                ret, frame = self.cap.read(slot) if slot is not None else self.cap.read()
                 #ret：是否成功（布尔值）
                 #frame：读取到的图像数据（OpenCV格式）
 
                 if not ret:
+                    self.frame_buffer.abort_write()
                     self.app.update_status("无法捕获画面")
                     time.sleep(0.1)
                     continue
                 
-                frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                # OpenCV 默认使用 BGR 色彩顺序，而我们在 Tkinter 中要用的是 PIL 的 RGB 格式
-                img = Image.fromarray(frame_rgb)
-                # （简而言之就是图像载体转化）把 OpenCV 图像 → PIL 图像，后续 CustomTkinter 的窗口可以显示它
-                
-                # 存储最近的图像
-                self.last_webcam_image = img
+                seq = self.frame_buffer.commit(frame)
+                # 这里只保存原始 BGR 帧，不再每帧都转成 PIL 图像
                 
                 # 用当前帧更新摄像头窗口
                 current_time = time.time()
+                if current_time - last_scene_check_time >= SCENE_CHECK_INTERVAL:
+                    # 低频地把缩略图喂给场景变化检测器
+                    self.scene_detector.update(frame)
+                    last_scene_check_time = current_time
                 if self.camera_window and not self.camera_window.is_closed and current_time - last_ui_update_time >= ui_update_interval:
+                    # OpenCV 默认使用 BGR 色彩顺序，预览需要 PIL 的 RGB 图像，只在真正要显示时才转换
+                    img = self.frame_buffer.get_image(seq)
                     self.camera_window.update_frame(img)
                     last_ui_update_time = current_time
                 # self.camera_window：摄像头窗口对象是否存在
@@ -643,8 +1013,8 @@ class WebcamHandler:
             #总结:_process_webcam(self):
             # 这段 _process_webcam() 方法是摄像头采集线程的核心循环，只要 self.running 为 True，线程就会不断执行：
             # 使用 OpenCV 的 read() 方法读取一帧摄像头画面；
-            # 将图像从 BGR 转为 RGB 并转为 PIL 格式；
-            # 缓存为 self.last_webcam_image，供后续分析或截图使用；
+            # 直接读进预分配的环形缓冲区（不做颜色转换）；
+            # 需要时再通过 self.last_webcam_image / get_image() 转为 PIL 格式，供后续分析或截图使用；
             # 每隔 0.05 秒更新一次摄像头窗口中的图像画面（≈ 20fps）；
             # 每轮之间 sleep(0.03) 控制采集频率在 30fps 左右，节省资源；
             # 若发生异常，捕获错误、提示用户，并在 1 秒后自动重试。
@@ -675,10 +1045,19 @@ class WebcamHandler:
         
         try:
             self.processing = True
+            
+            # 画面自上次分析以来没有变化：沿用上次结果，不上传也不调用大模型
+            if self._can_reuse_analysis():
+                self._reuse_last_analysis()
+                self.processing = False
+                self.app.after(10000, self.trigger_next_capture)
+                return
+            
             self.app.update_status("捕捉图像中...")
             
             # 获取分析用的截图和当前显示用的截图
             screenshots, current_screenshot = self._capture_screenshots()
+            self.scene_detector.mark_reference()
             # 如果到时候接入情感分析接口，可能就需要用到这两个参数！！！🖼️函数就在下面定义
             # _capture_screenshots() 是你自定义的函数，会从摄像头里捕获几张连续帧（用于分析），再单独捕获一帧用于显示。
             # 返回两个结果：
@@ -710,19 +1089,41 @@ class WebcamHandler:
         #->capture_and_analyze
 
 
+    def _can_reuse_analysis(self):
+        """上次的分析结果是否仍然适用于（没有变化的）当前画面"""
+        if self.last_analysis is None or self.scene_detector.has_changed():
+            return False
+        return time.time() - self.last_analysis["timestamp"] < SCENE_MAX_REUSE_SECONDS
+    
+    def _reuse_last_analysis(self):
+        """不上传、不调用 Qwen-VL，直接再记录一次上次的行为"""
+        behavior_num = self.last_analysis["behavior_num"]
+        behavior_desc = self.last_analysis["behavior_desc"]
+        analysis_text = self.last_analysis["analysis"]
+        
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        logging.info(f"{timestamp}-{behavior_num}-[画面无变化，沿用上次结果] {behavior_desc}")
+        
+        # 图表照常追加数据点，时间线保持连续
+        self.app.add_behavior_data(datetime.now(), behavior_num, behavior_desc, analysis_text)
+        self.app.update_status(f"画面无变化，沿用上次结果: {behavior_desc}")
+        if self.debug:
+            print(f"画面无变化，跳过Qwen-VL分析，沿用: {behavior_num}-{behavior_desc}")
+
     #开始正式分析！
     def _analyze_screenshots(self, screenshots, current_screenshot):
         """分析截图并更新UI"""
+        analyzed = False
         try:
             self.app.update_status("正在分析图像...")
             
-            # 将截图上传到OSS
-            screenshot_urls = self._upload_screenshots(screenshots)
-            #调用你自己定义的 _upload_screenshots() 函数（下面👇），把图像上传到阿里云 OSS
-            #返回每张图像的访问链接（列表）
+            # 将截图上传到OSS（或者按 IMAGE_TRANSPORT 配置直接内联编码）
+            screenshot_urls = self._prepare_image_refs(screenshots)
+            #默认调用你自己定义的 _upload_screenshots() 函数（下面👇），把图像上传到阿里云 OSS
+            #返回每张图像的访问链接（列表）；内联模式下返回的是 base64 data URL
 
             if screenshot_urls:
-                print(f"已上传 {len(screenshot_urls)} 张图片，开始分析")
+                print(f"已准备 {len(screenshot_urls)} 张图片 ({IMAGE_TRANSPORT})，开始分析")
                 
                 # 发送进行分析并等待结果（阻塞）
                 analysis_text = self._get_image_analysis(screenshot_urls)
@@ -733,6 +1134,14 @@ class WebcamHandler:
                     
                     # 从分析文本中提取行为类型
                     behavior_num, behavior_desc = extract_behavior_type(analysis_text)
+                    analyzed = True
+                    # 记下这次结果，画面不变时直接沿用
+                    self.last_analysis = {
+                        "timestamp": time.time(),
+                        "behavior_num": behavior_num,
+                        "behavior_desc": behavior_desc,
+                        "analysis": analysis_text
+                    }
                     #这个函数是你自定义的行为标签提取器！
                     #VL：“这个人正在玩手机，低头看着屏幕，手里拿着一部智能手机。”
                     #behavior_num = 5；behavior_desc = 玩手机
@@ -756,12 +1165,15 @@ class WebcamHandler:
                 else:
                     print("图像分析返回空结果")
             else:
-                print("未能上传截图，无法进行分析")
+                print("未能准备截图，无法进行分析")
         except Exception as e:
             error_msg = f"分析截图时出错: {e}"
             print(error_msg)
             self.app.update_status(error_msg)
         finally:#✅ 最后的 finally：无论成功或失败都做的事
+            if not analyzed:
+                # 分析失败时不能沿用旧结果，下一轮必须重新分析
+                self.scene_detector.invalidate()
             # 重要：标记为未处理并触发下一次捕获
             self.processing = False
             # 下次捕获前添加延迟 - 增加此值以减少API调用
@@ -775,9 +1187,18 @@ class WebcamHandler:
         # 因为程序正忙着上传图像/等AI模型返回，根本没时间响应事件循环。
 
 
+    def _prepare_image_refs(self, screenshots):
+        """把原始帧转换成 Qwen-VL 能读取的图像引用：OSS URL 或内联 data URL"""
+        # 按 BURST_LAYOUT / BURST_CROP_PERSON 先裁剪或拼图，减少上传字节和模型的图像 token
+        screenshots = compose_burst(screenshots)
+        if IMAGE_TRANSPORT == "inline":
+            # 跳过 OSS：不上传、Qwen 也不用再从 OSS 拉图，直接把缩小后的 JPEG 以 base64 随请求发送
+            return [encode_inline_image(frame, self.jpeg_encoder) for frame in screenshots]
+        return self._upload_screenshots(screenshots)
+
     def _get_image_analysis(self, image_urls):
         #这里的自由度非常非常大！我们到时候要非常细致的讨论这个问题！
-        """发送图像到Qwen-VL API并获取分析文本"""
+        """发送图像（OSS URL 或 base64 data URL）到Qwen-VL API并获取分析文本"""
         try:
             print("调用Qwen-VL API分析图像...")
             # 构建 messages 结构：详见文档！
@@ -808,11 +1229,19 @@ class WebcamHandler:
                 "content": [{"type": "text", "text": "详细观察这个人正在做什么。务必判断他属于以下哪种情况：1.认真专注工作, 2.吃东西, 3.用杯子喝水, 4.喝饮料, 5.玩手机, 6.睡觉, 7.其他。分析他的表情、姿势、手部动作和周围环境来作出判断。使用中文回答，并明确指出是哪种情况。"}]
             }]
             
+            if BURST_LAYOUT == "mosaic":
+                # 拼图模式只有一张图：按普通图片发送，并说明网格里各帧的时间顺序
+                visual = {"type": "image_url", "image_url": {"url": image_urls[0]}}
+                layout_hint = "这张图由同一个人连续拍摄的几张画面按时间顺序（从左到右、从上到下）拼成网格，请把它们当作连续动作来判断。"
+            else:
+                visual = {"type": "video", "video": image_urls}
+                layout_hint = ""
+
             message_payload = {
                 "role": "user",
                 "content": [
-                    {"type": "video", "video": image_urls},
-                    {"type": "text", "text": "这个人正在做什么？请判断他是：1.认真专注工作, 2.吃东西, 3.用杯子喝水, 4.喝饮料, 5.玩手机, 6.睡觉, 7.其他。请详细描述你观察到的内容并明确指出判断结果。"}
+                    visual,
+                    {"type": "text", "text": layout_hint + "这个人正在做什么？请判断他是：1.认真专注工作, 2.吃东西, 3.用杯子喝水, 4.喝饮料, 5.玩手机, 6.睡觉, 7.其他。请详细描述你观察到的内容并明确指出判断结果。"}
                 ]
             }
             messages.append(message_payload)
@@ -871,35 +1300,18 @@ class WebcamHandler:
         #你在 _process_webcam() 中保存了摄像头最新帧到 self.last_webcam_image
     
     def _capture_screenshots(self, num_shots=4, interval=0.1):
-        """ 作用：从摄像头连续捕获 num_shots 张截图 + 一张当前截图
-            从摄像头捕获多个截图用于分析
-            返回完整集合（用于分析）和一张当前截图（用于显示）"""
-            # 默认捕获 4 张图用于行为分析
-            # 每张图之间间隔 0.1 秒，模拟“动态图像”感觉
-            # 同时再抓一张“当前最新帧”用于 UI 展示
-        screenshots = []
-        for i in range(num_shots):
-            ret, frame = self.cap.read()
-            if not ret:
-                continue# 忽略错误帧
-            
-            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            img = Image.fromarray(frame_rgb)
-            #Image.fromarray() 方法将一个 NumPy 数组（如 frame_rgb）转换为 PIL 图像对象。
-            screenshots.append(img)
-            time.sleep(interval)
-            # 将图像从 OpenCV 的 BGR 转成 PIL 的 RGB 格式
-            # 加入 screenshots 列表
-            # 等 interval 秒（0.1s），再拍下一张
+        """ 作用：从环形缓冲区中按间隔挑选 num_shots 帧 + 一张当前截图
+            返回原始 BGR 帧集合（用于分析）和一张当前截图（用于显示）"""
+            # 默认挑选 4 帧用于行为分析
+            # 每帧之间间隔 0.1 秒，模拟“动态图像”感觉
+            # 同时取“当前最新帧”用于 UI 展示
+        screenshots = self.frame_buffer.sample(num_shots, interval)
+        # 不再直接 self.cap.read() + time.sleep()：那样会和 _process_webcam 线程抢同一个摄像头，
+        # 而且会阻塞 Tk 线程 400ms 以上；现在只是从已采集的历史帧里拷贝几帧，几乎不花时间
         
-        # 再捕获一张当前帧专门用于显示
-        ret, current_frame = self.cap.read()
-        current_screenshot = None
-        if ret:
-            current_frame_rgb = cv2.cvtColor(current_frame, cv2.COLOR_BGR2RGB)
-            current_screenshot = Image.fromarray(current_frame_rgb)
-        # 这是额外拍的一张“当前帧”
-        # 会作为当前 UI 显示用，不用于分析（分析用的是 screenshot 序列）
+        # 最新一帧作为当前截图用于显示
+        current_screenshot = self.frame_buffer.get_image()
+        # 会作为当前 UI 显示用，不用于分析（分析用的是 screenshots 序列）
 
 
         if self.debug:
@@ -907,51 +1319,74 @@ class WebcamHandler:
             
         return screenshots, current_screenshot
     
+    def _get_oss_bucket(self):
+        """返回 (bucket, executor)：长期复用的 OSS Bucket（Session 保持 keep-alive 连接）和上传线程池"""
+        # 原来每次上传都新建 oss2.Auth + oss2.Bucket，连接无法复用；现在只建一次
+        #注意：配置应该是自己提前在项目中配置好的（或者在 .env 或 config 文件里写的）
+        with self._oss_lock:
+            if self._oss_bucket is None:
+                auth = oss2.Auth(OSS_ACCESS_KEY_ID, OSS_ACCESS_KEY_SECRET)
+                session = oss2.Session(pool_size=OSS_CONNECTION_POOL_SIZE)
+                self._oss_bucket = oss2.Bucket(auth, OSS_ENDPOINT, OSS_BUCKET, session=session)
+            if self.upload_executor is None:
+                self.upload_executor = ThreadPoolExecutor(max_workers=OSS_UPLOAD_WORKERS)
+            # 在锁内取出线程池的局部引用：stop() 可能随时把 self.upload_executor 置空
+            return self._oss_bucket, self.upload_executor
+    
+    def _upload_one(self, bucket, object_key, frame):
+        """把一帧原始 BGR 画面编码成 JPEG 并上传到 OSS（在上传线程池中运行）"""
+        # 到了上传线程里才编码原始 BGR 帧（后端和质量见 JPEG_BACKEND / JPEG_PRESET）
+        # 💡 为什么不直接上传帧？
+        # 因为 OSS 需要的是 JPEG “字节流”，而不是 numpy 数组。
+        return bucket.put_object(object_key, self.jpeg_encoder.encode(frame))
+    
     def _upload_screenshots(self, screenshots):
         #它把你从摄像头捕获的图像上传到阿里云 OSS，让后面的图像分析模型（Qwen-VL）可以远程访问这些图片。
-        """将截图上传到OSS并返回URL
+        """将截图并行上传到OSS并按顺序返回URL
         目标：把这些图片上传到阿里云 OSS
         最终返回：一个 URL 列表，供图像分析 API 使用
         """
         try:
-            #1.连接 OSS 服务器
-            #注意：配置应该是自己提前在项目中配置好的（或者在 .env 或 config 文件里写的）
-            auth = oss2.Auth(OSS_ACCESS_KEY_ID, OSS_ACCESS_KEY_SECRET)
-            bucket = oss2.Bucket(auth, OSS_ENDPOINT, OSS_BUCKET)
+            #1.拿到长期复用的 OSS 连接
+            bucket, executor = self._get_oss_bucket()
             
             if self.debug:
                 print(f"正在上传 {len(screenshots)} 张截图到OSS")
-                
+            
+            #2.并行上传：总耗时从 sum(PUT) 变成 max(PUT)
+            #用毫秒时间戳 + 随机批次号 + 编号生成一个唯一文件名，防止同一秒内的两批截图互相覆盖
+            #例如：screenshots/1722856741123_3f9a0c1e_0.jpg
+            batch_id = f"{int(time.time() * 1000)}_{uuid.uuid4().hex[:8]}"
+            uploads = []
+            try:
+                for i, frame in enumerate(screenshots):
+                    object_key = f"screenshots/{batch_id}_{i}.jpg"
+                    uploads.append((object_key, executor.submit(self._upload_one, bucket, object_key, frame)))
+            except RuntimeError:
+                #stop() 已经关闭了线程池（cannot schedule new futures after shutdown）
+                if self.debug:
+                    print("摄像头已停止，放弃本次上传")
+                return []
+            
+            #3.按原顺序收集结果并检查状态
             oss_urls = []
-            #把图像写入内存缓冲区
-            for i, img in enumerate(screenshots):
-                buffer = io.BytesIO()
-                img.save(buffer, format='JPEG')
-                buffer.seek(0)
-                # io.BytesIO() 创建一个内存中的“文件”
-                # .save(..., format='JPEG') 把图片压缩成 JPEG 格式写进去
-                # .seek(0) 让指针回到开头（准备读出来上传）
-                # 💡 为什么不直接上传 img？
-                # 因为 OSS 需要的是“字节流”，而不是 PIL 对象。
-
-                #用时间戳 + 编号生成一个唯一文件名，防止覆盖
-                #例如：screenshots/1722856741_0.jpg
-                object_key = f"screenshots/{int(time.time())}_{i}.jpg"
+            for i, (object_key, future) in enumerate(uploads):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    error_msg = f"上传图片 {i+1} 时出错: {e}"
+                    print(error_msg)
+                    self.app.update_status(error_msg)
+                    continue
                 
-                #上传到 OSS 并检查状态
-                result = bucket.put_object(object_key, buffer)
                 if result.status == 200:
                     #拼接出图片的公网地址
-                    # 公网地址（Public URL）就是：
-                    # 在任意一台联网的电脑或手机上，通过浏览器就可以访问的“图片链接”。
                     url = f"https://{OSS_BUCKET}.{OSS_ENDPOINT}/{object_key}"
-                    #上传！
                     oss_urls.append(url)
                 
                     if self.debug:
                         print(f"已上传图片 {i+1}: {url}")
-                #基础的前后端知识：put_object() 把文件上传到 OSS 中返回 result，
-                #里面有 HTTP 状态码状态码 200 说明上传成功->，404就是错误！
+                #put_object() 返回的 result 里有 HTTP 状态码，200 说明上传成功
                 else:
                     error_msg = f"上传错误，状态码: {result.status}"
                     print(error_msg)
@@ -987,9 +1422,6 @@ class BehaviorVisualizationApp(ctk.CTk):
         # 短暂延迟后启动摄像头
         self.after(1000, self.start_webcam)
         
-        # 启动时间戳检查
-        self.check_timestamp()
-        
         # 设置观察历史
         self.observation_history = []
         
@@ -1201,14 +1633,6 @@ class BehaviorVisualizationApp(ctk.CTk):
     def update_status(self, text):
         """更新状态消息"""
         self.status_label.configure(text=text)
-    
-    def check_timestamp(self):
-        """检查周期性更新（用于刷新图表）"""
-        # 定期刷新可视化
-        self.behavior_visualizer.refresh_charts()
-        
-        # 安排下一次检查
-        self.after(30000, self.check_timestamp)  # 每30秒
 
 # ---------------- 主函数 ----------------
 def main():
@@ -2,12 +2,19 @@ import os
 import cv2
 import time
 import io
+import base64
+import bisect
+import json
+import uuid
 import threading
 import queue
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque, OrderedDict
 import numpy as np
 import pyaudio
-import wave
 import keyboard
+import tkinter as tk
 import customtkinter as ctk
 from PIL import Image, ImageTk
 import oss2
@@ -15,12 +22,22 @@ from pydub import AudioSegment
 from pydub.playback import play
 from openai import OpenAI
 import dashscope
-from dashscope.audio.tts_v2 import SpeechSynthesizer
-from funasr import AutoModel
-from funasr.utils.postprocess_utils import rich_transcription_postprocess
+from dashscope.audio.tts_v2 import SpeechSynthesizer, ResultCallback, AudioFormat
 from datetime import datetime
 import re
 import logging
+try:
+    from turbojpeg import TurboJPEG  # 可选依赖：PyTurboJPEG（需要系统安装 libjpeg-turbo）
+except ImportError:
+    TurboJPEG = None
+try:
+    import webrtcvad  # 可选依赖：VAD_BACKEND = "webrtc"
+except ImportError:
+    webrtcvad = None
+try:
+    import onnxruntime  # 可选依赖：VAD_BACKEND = "silero"
+except ImportError:
+    onnxruntime = None
 
 # ---------------- Configuration ----------------
 
@@ -29,6 +46,22 @@ import logging
 dashscope.api_key = QWEN_API_KEY
 TTS_MODEL = "cosyvoice-v1"
 TTS_VOICE = "longwan"
+TTS_STREAMING = True  # True: 流式合成，PCM 块直接写进常驻的输出流；False: 等完整 mp3 写成临时文件再解码播放
+TTS_SAMPLE_RATE = 22050  # 流式合成的 PCM 采样率（对应 AudioFormat.PCM_22050HZ_MONO_16BIT）
+TTS_CHUNK_TIMEOUT = 10  # 流式合成时等待下一个音频块的最长时间（秒）
+TTS_CHUNK_MIN_CHARS = 6  # 流式回复中，句子至少这么长才单独送去合成
+TTS_CHUNK_MAX_CHARS = 40  # 句子太长时在逗号处提前切开，缩短首句等待时间
+
+# DeepSeek Streaming Configuration
+DEEPSEEK_STREAMING = True  # True: 边生成边显示，并按句送入TTS；False: 等完整回复后再显示和朗读
+STREAM_RENDER_INTERVAL = 0.05  # 流式渲染聊天气泡的最小间隔（秒）
+STREAM_PLACEHOLDER_TEXT = "正在思考..."
+
+# Message Lane Configuration
+VOICE_LANE_WORKERS = 1  # 语音输入通道的并发数（1 = 按说话顺序逐条回答）
+IMAGE_LANE_WORKERS = 1  # 图像分析点评通道的并发数
+IMAGE_LANE_MAX_AGE = 15  # 图像分析在队列里等了超过这么久就不再点评，只显示分析结果（秒）
+IMAGE_LANE_COALESCE = True  # 队列里已经有更新的图像分析时，跳过旧的，只点评最新一条
 
 # SenseVoice ASR Configuration
 MODEL_DIR = "iic/SenseVoiceSmall"
@@ -38,7 +71,91 @@ CHUNK = 1024
 FORMAT = pyaudio.paInt16
 CHANNELS = 1
 RATE = 16000
-WAVE_OUTPUT_FILENAME = "output.wav"
+AUDIO_RING_SECONDS = 4.0  # 回调采集环形缓冲区能容纳的音频时长（秒），VAD 线程落后不超过这么久就不会丢音频
+
+# VAD Configuration
+VAD_BACKEND = "energy"  # "energy": 能量阈值（2.5倍环境噪声）；"webrtc": WebRTC VAD；"silero": Silero 神经网络 VAD（onnx，CPU）
+VAD_BACKENDS = ["energy", "webrtc", "silero"]  # 运行时按 'v' 键依次切换
+WEBRTC_VAD_AGGRESSIVENESS = 2  # 0-3，越大越不容易把噪声判成语音
+WEBRTC_VAD_FRAME_MS = 30  # WebRTC VAD 只接受 10/20/30ms 的帧
+WEBRTC_VAD_SPEECH_RATIO = 0.5  # 一块音频中至少这么多帧是语音，才算这一块有语音
+SILERO_VAD_MODEL = "silero_vad.onnx"  # Silero VAD v5 的 onnx 模型文件路径
+SILERO_VAD_THRESHOLD = 0.5  # 语音概率阈值
+VAD_PRE_PADDING = 0.3  # 检测到语音时，把之前这么久的音频也补进来，避免句首被截掉（秒）
+VAD_POST_PADDING = 0.3  # 语音结束后保留的静音时长（秒），其余的尾部静音在送去识别前裁掉
+
+# ASR Worker Configuration
+ASR_DEVICE = "auto"  # "auto": 有可用的 CUDA 就用 cuda:0，否则用 cpu；也可以直接写 "cpu" / "cuda:0"
+ASR_RUNTIME = "torch"  # "torch": funasr AutoModel；"onnx": funasr_onnx 运行时（CPU 上更快、内存更小，需要 pip install funasr-onnx）
+ASR_QUANTIZE = True  # onnx 运行时使用 int8 量化模型
+ASR_CPU_THREADS = 4  # CPU 推理使用的线程数
+ASR_START_DELAY = 200  # 窗口显示出来之后再启动 ASR 工作进程（毫秒）
+ASR_USE_PROCESS = True  # True: SenseVoice 常驻在独立进程里（推理不占主进程的 GIL）；False: 常驻在主进程的后台线程里
+ASR_MAX_BATCH = 8  # 一次推理最多合并的语音段数
+ASR_BATCH_WINDOW = 0.05  # 第一段语音到达后再等这么久，把同时到达的语音段凑成一批（秒）
+ASR_BATCH_SIZE_S = 60  # funasr 动态批处理的总时长上限（秒）
+ASR_FSMN_VAD = False  # 语音已经由 VoiceActivityDetector / AudioRecorder 切好（不超过 ASR_MAX_SEGMENT_S），不再串 fsmn-vad，多段语音可以直接拼成一批推理
+ASR_MAX_SEGMENT_S = 30  # 送进 SenseVoice 的单段语音最长秒数（和 fsmn-vad 的 max_single_segment_time 一致）
+
+# Streaming ASR Configuration
+ASR_STREAMING = False  # True: 说话过程中按块增量识别，实时显示部分文本，静音结束时几乎立即出结果（paraformer 流式模型只支持中文）
+ASR_STREAMING_MODEL = "paraformer-zh-streaming"
+ASR_STREAM_CHUNK_SIZE = [0, 10, 5]  # [0, 10, 5]：每块 600ms，向后看 300ms
+ASR_STREAM_ENCODER_LOOK_BACK = 4  # 编码器自注意力回看的块数
+ASR_STREAM_DECODER_LOOK_BACK = 1  # 解码器交叉注意力回看的块数
+ASR_STREAM_CHUNK_SAMPLES = ASR_STREAM_CHUNK_SIZE[1] * 960  # 每块的采样数（16kHz 下 60ms * 10）
+
+# Camera Configuration
+FRAME_BUFFER_SIZE = 32  # 环形缓冲区保留的原始帧数（30fps 下约 1 秒历史）
+SCENE_CHECK_INTERVAL = 0.2  # 场景变化检测的采样间隔（秒）
+SCENE_CHANGE_THRESHOLD = 6.0  # 缩略灰度图平均差异超过该值才算画面变化（0-255）
+SCENE_MAX_REUSE_SECONDS = 60  # 画面一直不变时，最多沿用上次分析结果这么久，之后强制重新分析
+PREVIEW_SIZE = (640, 480)  # 预览画面的最大尺寸（保持原始比例缩放）
+PREVIEW_MAX_FPS = 20  # 预览帧率上限
+PREVIEW_MIN_FPS = 5  # 渲染开销太大时最低降到这个帧率
+PREVIEW_CPU_BUDGET = 0.05  # 预览渲染（缩放 + 转色 + 贴图）最多占用一个核心的比例，按实测开销自动调整帧率
+
+# Image Transport Configuration
+IMAGE_TRANSPORT = "oss"  # "oss": 上传到 OSS 再把公网 URL 发给 Qwen-VL；"inline": 直接把 base64 data URL 内联发送
+INLINE_MAX_SIDE = 640  # 内联图片最长边（像素）
+INLINE_MAX_BYTES = 120 * 1024  # 每张内联 JPEG 的字节上限
+INLINE_JPEG_QUALITIES = (85, 75, 65, 50)  # 依次尝试的 JPEG 质量，直到满足字节上限
+
+# Burst Layout Configuration
+BURST_LAYOUT = "frames"  # "frames": 4 张原图作为 video 发送；"mosaic": 拼成一张 2x2 缩略网格图发送
+BURST_CROP_PERSON = False  # True: 先按人脸检测结果裁出人物区域（含肩膀、手部和桌面），检测不到人时用整帧
+MOSAIC_TILE_WIDTH = 320  # 网格中每一格的宽度（像素），高度按原始比例
+
+# JPEG Encoder Configuration
+JPEG_BACKEND = "auto"  # "auto": 有 PyTurboJPEG 就用 turbojpeg，否则用 cv2.imencode；也可指定 "turbojpeg" / "cv2" / "pil"
+JPEG_PRESET = "balanced"  # 上传截图使用的预设，见 JPEG_PRESETS
+JPEG_PRESETS = {
+    "high": {"quality": 90, "max_side": None},
+    "balanced": {"quality": 75, "max_side": None},  # 和原来 PIL 默认质量一致
+    "small": {"quality": 70, "max_side": 480},
+}
+
+# OSS Upload Configuration
+OSS_UPLOAD_WORKERS = 4  # 并行上传的线程数（一次分析的 4 张截图同时上传）
+OSS_CONNECTION_POOL_SIZE = 8  # OSS keep-alive 连接池大小
+
+# Analysis Pipeline Configuration
+ANALYSIS_PIPELINE_DEPTH = 2  # 同时在途的分析批次上限（采集/上传/Qwen-VL/DeepSeek 各阶段互相重叠）；1 等于原来的串行循环
+ANALYSIS_CAPTURE_INTERVAL = 1.0  # 相邻两次采集之间的最小间隔（秒）
+OBSERVATION_HISTORY_SIZE = 20  # observation_history 只保留最近这么多条观察（画面不变时每秒都会记一条）
+
+# Chat Transcript Configuration
+TRANSCRIPT_WINDOW = 50  # 聊天区最多保留的消息控件数，更早的消息只留在聊天记录里
+TRANSCRIPT_LOAD_STEP = 25  # 每次点“加载更早的消息”重新显示的条数
+TRANSCRIPT_MEMORY = 2000  # 内存中保留的最近聊天记录条数，更早的从文件读回
+TRANSCRIPT_THUMBNAILS = 100  # 内存中保留截图缩略图的记录条数，更早的记录重新显示时只有文字
+TRANSCRIPT_DIR = "transcripts"  # 聊天记录 JSONL 文件目录（每次启动一个文件）；None 表示只保存在内存里
+PLACEHOLDER_TTL = 120  # 占位气泡超过这么久（秒）没有任何更新就当作孤儿处理（比如画面分析失败），见 check_placeholders
+PLACEHOLDER_CHECK_INTERVAL = 10  # 检查孤儿占位气泡的间隔（秒）
+
+# UI Dispatch Configuration
+UI_PUMP_INTERVAL = 16  # 工作线程提交的界面更新每隔这么多毫秒在 Tk 主线程集中执行一次
+UI_MAX_CALLS_PER_TICK = 50  # 每次最多执行的按顺序调用数，剩下的留到下一次（合并类更新每个 key 只执行最新一次）
 
 # Logging Configuration
 LOG_FILE = "behavior_log.txt"
@@ -62,17 +179,6 @@ qwen_client = OpenAI(
     base_url=QWEN_BASE_URL
 )
 
-# ASR Model
-asr_model = AutoModel(
-    model=MODEL_DIR,
-    trust_remote_code=True,
-    remote_code="./model.py",
-    vad_model="fsmn-vad",
-    vad_kwargs={"max_single_segment_time": 30000},
-    device="cuda:0",
-)
-
-
 #配置说明：OSS 配置：
 # 是一款高可靠、安全、低成本、高扩展性的分布式对象存储服务。 它可以帮助用户轻松地存储和管理海量非结构化数据
 # 用处：_upload_screenshots() 会用 oss2.Auth + oss2.Bucket 把图片上传到阿里云 OSS，
@@ -103,6 +209,10 @@ def extract_language_emotion_content(text):
     
     return content.strip()
 
+def frames_to_samples(frames):
+    """Join raw int16 PCM frames into the float32 array (-1..1) SenseVoice accepts directly"""
+    return np.frombuffer(b''.join(frames), dtype=np.int16).astype(np.float32) / 32768.0
+
 def extract_behavior_type(analysis_text):
     """Extract behavior type number from AI analysis text"""
     # Try to find behavior type number in the text (1-7)
@@ -131,6 +241,589 @@ def extract_behavior_type(analysis_text):
     
     return "0", "未识别"  # Default if no pattern matches
 
+# ---------------- JPEG Encoder ----------------
+class JpegEncoder:
+    """Encode raw BGR frames to JPEG bytes with a pluggable backend.
+
+    Backends: "turbojpeg" (PyTurboJPEG / libjpeg-turbo SIMD), "cv2" (cv2.imencode straight
+    from the BGR array, no RGB conversion) and "pil" (the old path). "auto" picks the fastest
+    one available. Each encoding thread keeps its own resize buffer and BytesIO.
+    """
+
+    def __init__(self, backend=JPEG_BACKEND, preset=JPEG_PRESET):
+        self._turbo = None
+        self.backend = self._resolve_backend(backend)
+        self.preset = JPEG_PRESETS[preset]
+        self._local = threading.local()  # 每个线程一份可复用的缩放缓冲区和 BytesIO
+    
+    def _resolve_backend(self, backend):
+        if backend in ("auto", "turbojpeg"):
+            if TurboJPEG is not None:
+                try:
+                    self._turbo = TurboJPEG()
+                    return "turbojpeg"
+                except (OSError, RuntimeError) as e:
+                    print(f"无法加载 libturbojpeg: {e}")
+            if backend == "turbojpeg":
+                print("turbojpeg 不可用，改用 cv2 编码")
+            return "cv2"
+        if backend not in ("cv2", "pil"):
+            raise ValueError(f"未知的 JPEG 编码后端: {backend}")
+        return backend
+    
+    def _resize(self, frame, max_side):
+        """Downscale into this thread's reusable buffer when the frame exceeds max_side"""
+        height, width = frame.shape[:2]
+        if not max_side or max(height, width) <= max_side:
+            return frame
+        scale = max_side / max(height, width)
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        buffer = getattr(self._local, "resize_buffer", None)
+        if buffer is None or buffer.shape != (size[1], size[0], 3):
+            buffer = np.empty((size[1], size[0], 3), dtype=np.uint8)
+            self._local.resize_buffer = buffer
+        cv2.resize(frame, size, dst=buffer, interpolation=cv2.INTER_AREA)
+        return buffer
+    
+    def encode(self, frame, quality=None, max_side=None):
+        """Return JPEG bytes for a BGR frame; quality / max_side default to the preset"""
+        quality = self.preset["quality"] if quality is None else quality
+        max_side = self.preset["max_side"] if max_side is None else max_side
+        frame = self._resize(frame, max_side)
+        
+        if self.backend == "turbojpeg":
+            return self._turbo.encode(frame, quality=quality)  # 默认就是 BGR 像素格式
+        if self.backend == "cv2":
+            ok, data = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+            if not ok:
+                raise RuntimeError("cv2.imencode 编码失败")
+            return data.tobytes()
+        
+        buffer = getattr(self._local, "output", None)
+        if buffer is None:
+            buffer = self._local.output = io.BytesIO()
+        buffer.seek(0)
+        buffer.truncate()
+        Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)).save(buffer, format='JPEG', quality=quality)
+        return buffer.getvalue()
+
+def encode_inline_image(frame, encoder, max_side=INLINE_MAX_SIDE, max_bytes=INLINE_MAX_BYTES):
+    """Encode a BGR frame as a base64 JPEG data URL no larger than max_bytes.
+
+    Downscales to max_side first and walks down INLINE_JPEG_QUALITIES; if even the
+    lowest quality is too big, shrinks the image by 25% and tries again.
+    """
+    max_side = min(max_side, max(frame.shape[:2]))
+    while True:
+        for quality in INLINE_JPEG_QUALITIES:
+            data = encoder.encode(frame, quality=quality, max_side=max_side)
+            if len(data) <= max_bytes:
+                break
+        if len(data) <= max_bytes or max_side <= 160:
+            break
+        max_side = int(max_side * 0.75)
+    return "data:image/jpeg;base64," + base64.b64encode(data).decode("ascii")
+
+_face_cascade = None
+
+def find_person_box(frames):
+    """Return an (x0, y0, x1, y1) box around the person across the burst, or None if no face is found.
+
+    Each detected face is widened to take in shoulders, hands and the desk in front,
+    since eating, drinking and phone use are judged from hands and objects, not the face.
+    """
+    global _face_cascade
+    if _face_cascade is None:
+        _face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
+    
+    height, width = frames[0].shape[:2]
+    box = None
+    for frame in frames:
+        # 在半尺寸灰度图上检测，速度快很多
+        small = cv2.resize(frame, (width // 2, height // 2), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        faces = _face_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(24, 24))
+        for fx, fy, fw, fh in faces:
+            fx, fy, fw, fh = fx * 2, fy * 2, fw * 2, fh * 2
+            face_box = (fx - 1.5 * fw, fy - 0.5 * fh, fx + 2.5 * fw, fy + 4 * fh)
+            if box is None:
+                box = face_box
+            else:
+                box = (min(box[0], face_box[0]), min(box[1], face_box[1]),
+                       max(box[2], face_box[2]), max(box[3], face_box[3]))
+    
+    if box is None:
+        return None
+    return (max(0, int(box[0])), max(0, int(box[1])), min(width, int(box[2])), min(height, int(box[3])))
+
+def compose_burst(frames, layout=None, crop_person=None, tile_width=MOSAIC_TILE_WIDTH):
+    """Shape the raw BGR burst before encoding: optionally crop to the person, optionally tile into one grid.
+
+    Returns the list of BGR images to send - the (cropped) frames, or a single mosaic.
+    """
+    layout = BURST_LAYOUT if layout is None else layout
+    crop_person = BURST_CROP_PERSON if crop_person is None else crop_person
+    if not frames:
+        return frames
+    
+    if crop_person:
+        box = find_person_box(frames)
+        if box is not None:
+            # 整个连拍用同一个裁剪框，保证各帧之间仍然可以对比动作
+            x0, y0, x1, y1 = box
+            frames = [frame[y0:y1, x0:x1].copy() for frame in frames]
+    
+    if layout != "mosaic":
+        return frames
+    
+    # 按时间顺序从左到右、从上到下拼成网格，每格缩小到 tile_width 宽
+    height, width = frames[0].shape[:2]
+    tile_w = min(tile_width, width)
+    tile_h = max(1, round(height * tile_w / width))
+    cols = 2 if len(frames) > 1 else 1
+    rows = (len(frames) + cols - 1) // cols
+    mosaic = np.zeros((rows * tile_h, cols * tile_w, 3), dtype=np.uint8)
+    for i, frame in enumerate(frames):
+        row, col = divmod(i, cols)
+        mosaic[row * tile_h:(row + 1) * tile_h, col * tile_w:(col + 1) * tile_w] = cv2.resize(
+            frame, (tile_w, tile_h), interpolation=cv2.INTER_AREA)
+    return [mosaic]
+
+# ---------------- Frame Ring Buffer ----------------
+class FrameRingBuffer:
+    """Preallocated ring of raw BGR frames tagged with sequence numbers.
+
+    The capture thread reads straight into a reserved slot, so steady-state
+    capture allocates nothing; consumers convert only the frames they use.
+    """
+    #原来每一帧都要 cvtColor + Image.fromarray（约30fps），但真正用到的只有预览(20fps)和偶尔的分析截图。
+    #现在摄像头线程只把原始 BGR 帧写进预分配好的环形数组，谁要用哪一帧，谁再去转换（惰性转换）。
+
+    def __init__(self, capacity=FRAME_BUFFER_SIZE):
+        self.capacity = capacity
+        self.lock = threading.Lock()
+        self.frames = None  # (capacity, h, w, 3) uint8，第一帧确定分辨率后才分配
+        self.seqs = np.full(capacity, -1, dtype=np.int64)  # 每个槽位存放的帧序号，-1 表示无效
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+        self.next_seq = 0
+        self.latest_seq = -1
+        self._write_slot = None
+
+    def begin_write(self):
+        """Reserve the next slot and return it as a writable view (None before the first frame)"""
+        with self.lock:
+            if self.frames is None:
+                self._write_slot = None
+                return None
+            slot = self.next_seq % self.capacity
+            # 写入期间把槽位标记为无效，读者不会读到写了一半的帧
+            self.seqs[slot] = -1
+            self._write_slot = slot
+            return self.frames[slot]
+
+    def abort_write(self):
+        """Give up the reserved slot after a failed read"""
+        with self.lock:
+            self._write_slot = None
+
+    def commit(self, frame, timestamp=None):
+        """Publish the frame written into the reserved slot and return its sequence number"""
+        with self.lock:
+            slot = self._write_slot
+            if self.frames is None or self.frames.shape[1:] != frame.shape:
+                # 第一帧或分辨率变化时（重新）分配整块缓冲区
+                self.frames = np.empty((self.capacity,) + frame.shape, dtype=frame.dtype)
+                self.seqs.fill(-1)
+                slot = None
+            if slot is None:
+                slot = self.next_seq % self.capacity
+            if not np.shares_memory(self.frames[slot], frame):
+                np.copyto(self.frames[slot], frame)
+            seq = self.next_seq
+            self.seqs[slot] = seq
+            self.timestamps[slot] = time.time() if timestamp is None else timestamp
+            self.next_seq += 1
+            self.latest_seq = seq
+            self._write_slot = None
+            return seq
+
+    def _slot_of(self, seq):
+        """Return the slot holding seq, or None if it was overwritten (caller holds the lock)"""
+        if seq is None:
+            seq = self.latest_seq
+        if seq < 0:
+            return None
+        slot = seq % self.capacity
+        if self.seqs[slot] != seq:
+            return None
+        return slot
+
+    def get_frame(self, seq=None):
+        """Return a private copy of a raw BGR frame (latest by default)"""
+        with self.lock:
+            slot = self._slot_of(seq)
+            if slot is None:
+                return None
+            return self.frames[slot].copy()
+
+    def sample(self, count, interval):
+        """Pick up to count raw frames spaced interval seconds apart, ending at the latest one.
+
+        Works purely on the already-captured history, so it never touches the camera.
+        Frames are returned oldest first as private BGR copies.
+        """
+        with self.lock:
+            valid = np.flatnonzero(self.seqs >= 0)
+            if valid.size == 0:
+                return []
+            stamps = self.timestamps[valid]
+            latest_ts = stamps.max()
+            picked = []
+            # 目标时间点从早到晚排列，每个目标取时间戳最接近的一帧（去重，历史不够时返回更少的帧）
+            for k in range(count - 1, -1, -1):
+                target = latest_ts - k * interval
+                slot = valid[np.argmin(np.abs(stamps - target))]
+                if slot not in picked:
+                    picked.append(slot)
+            return [self.frames[slot].copy() for slot in picked]
+
+    def get_image(self, seq=None):
+        """Lazily convert one buffered frame (latest by default) to a PIL RGB image"""
+        with self.lock:
+            slot = self._slot_of(seq)
+            if slot is None:
+                return None
+            # cvtColor 本身就会生成新数组，所以在锁内转换即可，不用额外复制
+            frame_rgb = cv2.cvtColor(self.frames[slot], cv2.COLOR_BGR2RGB)
+        return Image.fromarray(frame_rgb)
+
+class SceneChangeDetector:
+    """Cheap on-device scene change detector working on tiny grayscale thumbnails.
+
+    The reference is the scene at the last real analysis; has_changed() reports
+    whether any frame since then differed from it by more than the threshold.
+    """
+    #用来判断“画面从上次分析以来有没有变化”：没变化就沿用上次的行为结果，不再上传 OSS、不再调用 Qwen-VL。
+
+    def __init__(self, threshold=SCENE_CHANGE_THRESHOLD, size=(32, 24)):
+        self.threshold = threshold
+        self.size = size
+        self.lock = threading.Lock()
+        self.latest = None  # 最近一次采样的缩略图
+        self.reference = None  # 上次分析时的缩略图
+        self.max_diff = 0.0  # 自上次分析以来与参考图的最大差异
+
+    def _signature(self, frame):
+        """Downscale to a tiny zero-mean grayscale thumbnail"""
+        small = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY).astype(np.float32)
+        # 减去均值，自动曝光/灯光整体变亮变暗不会被当成画面变化
+        gray -= gray.mean()
+        return gray
+
+    def update(self, frame):
+        """Feed a raw BGR frame (called from the capture thread at a low rate)"""
+        signature = self._signature(frame)
+        with self.lock:
+            self.latest = signature
+            if self.reference is not None:
+                diff = float(np.mean(np.abs(signature - self.reference)))
+                self.max_diff = max(self.max_diff, diff)
+
+    def mark_reference(self):
+        """Remember the current scene as the one being analyzed"""
+        with self.lock:
+            self.reference = self.latest
+            self.max_diff = 0.0
+
+    def invalidate(self):
+        """Forget the reference so the next check reports a change (e.g. after a failed analysis)"""
+        with self.lock:
+            self.reference = None
+
+    def has_changed(self):
+        """True if the scene changed since mark_reference() or there is nothing to compare"""
+        with self.lock:
+            if self.reference is None or self.latest is None:
+                return True
+            return self.max_diff > self.threshold
+
+# ---------------- Queue Instrumentation ----------------
+class QueueWaitStats:
+    """Per-message-type queue wait times (enqueue -> dequeue), for finding where latency goes"""
+
+    def __init__(self, window=200):
+        self.lock = threading.Lock()
+        self.window = window
+        self.kinds = {}  # kind -> {"count", "total", "max", "recent"}
+    
+    def record(self, kind, seconds):
+        with self.lock:
+            stats = self.kinds.get(kind)
+            if stats is None:
+                stats = self.kinds[kind] = {"count": 0, "total": 0.0, "max": 0.0, "recent": deque(maxlen=self.window)}
+            stats["count"] += 1
+            stats["total"] += seconds
+            stats["max"] = max(stats["max"], seconds)
+            stats["recent"].append(seconds)
+    
+    def summary(self):
+        """One line per message type: count, mean / p90 (recent window) / max wait in ms"""
+        lines = []
+        with self.lock:
+            for kind, stats in sorted(self.kinds.items()):
+                recent = sorted(stats["recent"])
+                p90 = recent[min(len(recent) - 1, int(len(recent) * 0.9))]
+                lines.append(f"{kind}: {stats['count']}条, 平均等待 {stats['total'] / stats['count'] * 1000:.1f}ms, "
+                             f"p90 {p90 * 1000:.1f}ms, 最长 {stats['max'] * 1000:.1f}ms")
+        return "\n".join(lines)
+
+# ---------------- Message Lanes ----------------
+class MessageLane:
+    """Priority queue for one message type, drained by its own bounded set of worker threads.
+
+    Each lane has its own concurrency limit, so a slow handler in one lane never delays
+    another. Messages that waited longer than max_age, or (with coalesce) that a newer
+    message already superseded, are handed to on_drop instead of the handler.
+    """
+
+    def __init__(self, name, handle, workers=1, stats=None, coalesce=False, max_age=None, on_drop=None):
+        self.name = name
+        self.handle = handle
+        self.workers = workers
+        self.stats = stats
+        self.coalesce = coalesce
+        self.max_age = max_age
+        self.on_drop = on_drop
+        self.queue = queue.PriorityQueue()
+        self.lock = threading.Lock()
+        self.latest_id = -1
+        self.running = False
+        self.threads = []
+    
+    def start(self):
+        self.running = True
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"{self.name}-lane-{i}")
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+    
+    def put(self, priority, msg_id, message):
+        with self.lock:
+            self.latest_id = max(self.latest_id, msg_id)
+        self.queue.put((priority, msg_id, message))
+    
+    def busy(self):
+        """True while a message is queued on this lane or still being handled"""
+        return self.queue.unfinished_tasks > 0
+    
+    def _run(self):
+        while self.running:
+            try:
+                priority, msg_id, message = self.queue.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            if message is None:
+                self.queue.task_done()
+                break
+            
+            try:
+                waited = time.perf_counter() - message.get("enqueued_at", time.perf_counter())
+                if self.stats:
+                    self.stats.record(message["type"], waited)
+                if self.max_age is not None and waited > self.max_age:
+                    self._drop(message, f"排队 {waited:.1f} 秒已过期")
+                elif self.coalesce and msg_id < self.latest_id:
+                    self._drop(message, "已有更新的消息")
+                else:
+                    print(f"[{self.name}] 处理消息: 类型={message['type']}, 优先级={priority}, ID={msg_id}")
+                    self.handle(message, msg_id)
+            except Exception as e:
+                print(f"[{self.name}] 处理消息出错: {e}")
+            finally:
+                self.queue.task_done()
+    
+    def _drop(self, message, reason):
+        print(f"[{self.name}] 跳过消息 ({reason}): 类型={message['type']}")
+        if self.on_drop:
+            self.on_drop(message)
+    
+    def stop(self, timeout=1.0):
+        """Wake every worker with a shutdown sentinel and wait for them to exit"""
+        self.running = False
+        for _ in self.threads:
+            self.queue.put((-1, -1, None))
+        for thread in self.threads:
+            thread.join(timeout=timeout)
+        self.threads = []
+
+# ---------------- Analysis Pipeline ----------------
+class AnalysisPipeline:
+    """Overlaps consecutive analysis cycles while applying their results strictly in capture order.
+
+    submit() is called on the Tk thread right after a burst is captured. The burst is prepared
+    (upload / inline encode) and sent to Qwen-VL on a worker thread, so burst N+1 can upload
+    while the VLM call for N is still running. A single apply thread hands finished results to
+    `apply_result` in sequence order (log, observation_history, DeepSeek reply), holding back a
+    later burst that finishes before an earlier one. At most `depth` bursts are in flight.
+    """
+
+    def __init__(self, analyze, apply_result, depth=ANALYSIS_PIPELINE_DEPTH):
+        self.analyze = analyze  # (screenshots) -> analysis text or None, runs on a worker thread
+        self.apply_result = apply_result  # (job, analysis_text), runs on the apply thread in order
+        self.depth = depth
+        self.condition = threading.Condition()
+        self.in_flight = 0  # 已提交但还没应用完的批次数
+        self.next_seq = 0
+        self.next_to_apply = 0
+        self.finished = {}  # seq -> (job, analysis_text)，等待按顺序应用
+        self.running = True
+        self.executor = ThreadPoolExecutor(max_workers=depth)
+        self.apply_thread = threading.Thread(target=self._apply_loop)
+        self.apply_thread.daemon = True
+        self.apply_thread.start()
+    
+    def has_capacity(self):
+        """Whether another burst may be submitted now"""
+        with self.condition:
+            return self.running and self.in_flight < self.depth
+    
+    def idle(self):
+        """Whether every submitted burst has been applied"""
+        with self.condition:
+            return self.in_flight == 0
+    
+    def submit(self, screenshots, current_screenshot, placeholder_id):
+        """Queue a captured burst; returns False when the pipeline is full or stopped"""
+        with self.condition:
+            if not self.running or self.in_flight >= self.depth:
+                return False
+            job = {
+                "seq": self.next_seq,
+                "screenshots": screenshots,
+                "current_screenshot": current_screenshot,
+                "placeholder_id": placeholder_id,
+            }
+            self.next_seq += 1
+            self.in_flight += 1
+        self.executor.submit(self._run, job)
+        return True
+    
+    def _run(self, job):
+        """Worker stage: prepare images and call the VLM"""
+        analysis_text = None
+        try:
+            analysis_text = self.analyze(job["screenshots"])
+        except Exception as e:
+            print(f"分析截图时出错: {e}")
+        with self.condition:
+            self.finished[job["seq"]] = (job, analysis_text)
+            self.condition.notify_all()
+    
+    def _apply_loop(self):
+        """Apply stage: hand results over one at a time, in capture order"""
+        while True:
+            with self.condition:
+                while self.running and self.next_to_apply not in self.finished:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                job, analysis_text = self.finished.pop(self.next_to_apply)
+                self.next_to_apply += 1
+            
+            try:
+                self.apply_result(job, analysis_text)
+            except Exception as e:
+                print(f"应用分析结果时出错: {e}")
+            finally:
+                with self.condition:
+                    self.in_flight -= 1
+    
+    def stop(self):
+        """Stop accepting bursts; results that have not been applied yet are dropped"""
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        self.executor.shutdown(wait=False)
+
+# ---------------- Camera Preview ----------------
+class PreviewRenderer:
+    """Camera preview frames prepared in preallocated buffers, at an adaptive frame rate.
+
+    The capture thread calls prepare() with a raw BGR frame: cv2.resize and cvtColor
+    write into buffers that are reused for every frame. The Tk thread then pastes the
+    RGB buffer into one persistent PhotoImage (see CameraWindow.show_preview). Only one
+    frame is in flight at a time, and the interval between frames is chosen so that the
+    measured render cost stays within PREVIEW_CPU_BUDGET.
+    """
+    def __init__(self, size=PREVIEW_SIZE, max_fps=PREVIEW_MAX_FPS, min_fps=PREVIEW_MIN_FPS,
+                 cpu_budget=PREVIEW_CPU_BUDGET):
+        self.size = size
+        self.min_interval = 1.0 / max_fps
+        self.max_interval = 1.0 / min_fps
+        self.cpu_budget = cpu_budget
+        self.interval = self.min_interval
+        self.small = None  # 缩放后的 BGR 帧
+        self.rgb = None  # 转色后的 RGB 帧，Tk 线程从这里贴图
+        self.source_shape = None
+        self.pending = False
+        self.pending_since = 0
+        self.next_time = 0
+        self.prepare_cost = 0.0
+        self.cost = 0.0  # 每帧开销的滑动平均（秒）
+        self.frames = 0
+        self.cpu_time = 0.0
+    
+    def due(self, now):
+        """True when the capture thread should prepare the next preview frame"""
+        if self.pending and now - self.pending_since < 1.0:
+            return False  # 上一帧还没画出来（超过 1 秒当作丢失，不再等）
+        return now >= self.next_time
+    
+    def prepare(self, frame):
+        """Resize and convert a BGR frame into the preview buffers (capture thread)"""
+        start = time.thread_time()
+        if frame.shape != self.source_shape:
+            h, w = frame.shape[:2]
+            scale = min(self.size[0] / w, self.size[1] / h, 1.0)
+            width, height = max(1, int(w * scale)), max(1, int(h * scale))
+            self.small = np.empty((height, width, 3), dtype=np.uint8)
+            self.rgb = np.empty((height, width, 3), dtype=np.uint8)
+            self.source_shape = frame.shape
+        cv2.resize(frame, (self.small.shape[1], self.small.shape[0]), dst=self.small, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(self.small, cv2.COLOR_BGR2RGB, dst=self.rgb)
+        self.prepare_cost = time.thread_time() - start
+        self.pending = True
+        self.pending_since = time.time()
+    
+    def image(self):
+        """PIL view of the RGB buffer (no copy)"""
+        height, width = self.rgb.shape[:2]
+        return Image.frombuffer("RGB", (width, height), self.rgb, "raw", "RGB", 0, 1)
+    
+    def rendered(self, render_cost):
+        """Record one frame's cost (Tk thread) and pick the next frame interval"""
+        frame_cost = self.prepare_cost + render_cost
+        self.cost = frame_cost if self.frames == 0 else 0.8 * self.cost + 0.2 * frame_cost
+        self.frames += 1
+        self.cpu_time += frame_cost
+        self.interval = min(max(self.cost / self.cpu_budget, self.min_interval), self.max_interval)
+        self.next_time = time.time() + self.interval
+        self.pending = False
+    
+    def skip(self):
+        self.pending = False
+    
+    def stats(self):
+        return {
+            "fps": 1.0 / self.interval,
+            "frame_cost_ms": self.cost * 1000,
+            "frames": self.frames,
+            "frames_per_cpu_second": self.frames / self.cpu_time if self.cpu_time > 0 else 0.0,
+        }
+
+
 # ---------------- Camera Display Window ----------------
 class CameraWindow(ctk.CTkToplevel):
     #两个文件的 CameraWindow 虽然名字相同且都是继承自 CTkToplevel，但针对的功能和上下文不同。
@@ -147,7 +840,7 @@ class CameraWindow(ctk.CTkToplevel):
     # _upload_screenshots：将截图上传至 OSS 存储
     # _get_image_analysis：调用 Qwen-VL API 分析图像内容
 
-    #而在dscamera.py文件中（本文件：只有update_frame() on_closing()两个函数）
+    #而在dscamera.py文件中（本文件：只有show_preview() on_closing()两个函数）
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -160,36 +853,33 @@ class CameraWindow(ctk.CTkToplevel):
         self.camera_frame.pack(fill="both", expand=True, padx=10, pady=10)
         
         # Create label for the camera image
-        self.camera_label = ctk.CTkLabel(self.camera_frame, text="Starting camera...")
+        # 用普通 Tk Label + 一个常驻的 PhotoImage：每帧只把像素贴进去，不再新建 CTkImage
+        self.camera_label = tk.Label(self.camera_frame, text="Starting camera...", bg="black", fg="white")
         self.camera_label.pack(fill="both", expand=True)
         
-        # Image holder
-        self.current_image = None
+        # Image holder (kept alive for the lifetime of the window)
+        self.photo = None
         
         # Flag to indicate if window is closed
         self.is_closed = False
     
-    def update_frame(self, img):
-        """Update camera frame with new image"""
+    def show_preview(self, renderer):
+        """Paste the renderer's prepared frame into the persistent PhotoImage (Tk thread)"""
         if self.is_closed:
+            renderer.skip()
             return
-            
+        
+        start = time.thread_time()
         try:
-            if img:
-                # Resize the image to fit the window nicely
-                img_resized = img.copy()
-                img_resized.thumbnail((640, 480))
-                
-                # Convert to CTkImage
-                ctk_img = ctk.CTkImage(light_image=img_resized, dark_image=img_resized, size=(640, 480))
-                
-                # Update the label
-                self.camera_label.configure(image=ctk_img, text="")
-                
-                # Store a reference to prevent garbage collection
-                self.current_image = ctk_img
+            image = renderer.image()
+            if self.photo is None or (self.photo.width(), self.photo.height()) != image.size:
+                # 第一帧或分辨率变化时才新建 PhotoImage
+                self.photo = ImageTk.PhotoImage("RGB", image.size, master=self)
+                self.camera_label.configure(image=self.photo, text="")
+            self.photo.paste(image)
         except Exception as e:
             print(f"Error updating camera frame: {e}")
+        renderer.rendered(time.thread_time() - start)
     
     def on_closing(self):
         """Handle window close event"""
@@ -197,9 +887,614 @@ class CameraWindow(ctk.CTkToplevel):
         self.withdraw()  # Hide instead of destroy to allow reopening
 
 # ---------------- Core Functionality Classes ----------------
+# ---------------- ASR Worker ----------------
+def resolve_asr_device(device=ASR_DEVICE):
+    """Turn "auto" into "cuda:0" when torch sees a GPU, otherwise "cpu" """
+    if device != "auto":
+        return device
+    try:
+        import torch
+    except ImportError:
+        return "cpu"
+    return "cuda:0" if torch.cuda.is_available() else "cpu"
+
+class OnnxSenseVoice:
+    """funasr_onnx SenseVoiceSmall behind the same generate() interface as funasr's AutoModel"""
+
+    def __init__(self, device="cpu", quantize=ASR_QUANTIZE):
+        from funasr_onnx import SenseVoiceSmall  # 可选依赖：funasr-onnx
+        device_id = device.split(":")[1] if device.startswith("cuda") else "-1"
+        self.model = SenseVoiceSmall(MODEL_DIR, batch_size=ASR_MAX_BATCH, device_id=device_id,
+                                     quantize=quantize, intra_op_num_threads=ASR_CPU_THREADS)
+    
+    def generate(self, input, language="auto", use_itn=False, **kwargs):
+        # funasr_onnx 的 load_data 只原样接受单个 ndarray，列表里的元素一律当作 wav 路径去读，
+        # 所以样本数组要逐条送进去（文件路径两种方式都可以）
+        textnorm = "withitn" if use_itn else "woitn"
+        results = []
+        for item in input:
+            texts = self.model(item, language=language, textnorm=textnorm)
+            results.append({"text": texts[0] if texts else ""})
+        return results
+
+def create_asr_model(device=ASR_DEVICE, use_vad=ASR_FSMN_VAD, runtime=ASR_RUNTIME):
+    """Load SenseVoice (torch or onnx runtime), optionally chained with the fsmn-vad segmenter.
+
+    funasr is imported here rather than at module level so that importing dscamera
+    (and opening the window) does not pay for torch / funasr start-up.
+    """
+    device = resolve_asr_device(device)
+    if runtime == "onnx":
+        if use_vad:
+            print("onnx 运行时不支持串联 fsmn-vad，已忽略")
+        return OnnxSenseVoice(device=device)
+    
+    from funasr import AutoModel
+    model_kwargs = dict(
+        model=MODEL_DIR,
+        trust_remote_code=True,
+        remote_code="./model.py",
+        device=device,
+        ncpu=ASR_CPU_THREADS,
+    )
+    if use_vad:
+        model_kwargs.update(vad_model="fsmn-vad", vad_kwargs={"max_single_segment_time": 30000})
+    return AutoModel(**model_kwargs)
+
+def run_asr_batch(model, batch):
+    """Transcribe a list of float32 sample arrays (or file paths) in one generate() call.
+
+    Returns the raw SenseVoice texts in input order.
+    """
+    res = model.generate(
+        input=list(batch),
+        fs=RATE,
+        cache={},
+        language="auto",
+        use_itn=False,
+        ban_emo_unk=True,
+        batch_size=len(batch),  # 不串 VAD 时：整批一次前向
+        batch_size_s=ASR_BATCH_SIZE_S,  # 串 VAD 时：按总时长动态分批
+        merge_vad=True,
+        merge_length_s=15,
+    )
+    texts = [item.get("text", "") for item in res]
+    if len(texts) != len(batch):
+        print(f"ASR结果数量不匹配: {len(texts)} != {len(batch)}")
+        texts = (texts + [""] * len(batch))[:len(batch)]
+    return texts
+
+def create_streaming_asr_model(device=ASR_DEVICE):
+    """Load the streaming paraformer used for partial transcripts"""
+    from funasr import AutoModel
+    return AutoModel(model=ASR_STREAMING_MODEL, device=resolve_asr_device(device), ncpu=ASR_CPU_THREADS)
+
+def run_asr_stream_chunk(model, cache, samples, is_final):
+    """Feed one chunk of an utterance to the streaming model; returns the newly decoded text"""
+    res = model.generate(
+        input=samples,
+        cache=cache,
+        is_final=is_final,
+        chunk_size=ASR_STREAM_CHUNK_SIZE,
+        encoder_chunk_look_back=ASR_STREAM_ENCODER_LOOK_BACK,
+        decoder_chunk_look_back=ASR_STREAM_DECODER_LOOK_BACK,
+    )
+    return res[0].get("text", "") if res else ""
+
+def asr_worker_main(requests, results, device=ASR_DEVICE, use_vad=ASR_FSMN_VAD, runtime=ASR_RUNTIME,
+                    streaming=ASR_STREAMING):
+    """ASR worker loop (own process or thread): load the model once, then serve requests until None arrives.
+
+    Requests are ("audio", id, samples) for whole utterances, which are batched, and
+    ("chunk", id, samples, is_final) / ("cancel", id) for streaming sessions, which are
+    decoded as soon as they arrive.
+    """
+    try:
+        device = resolve_asr_device(device)
+        model = create_asr_model(device=device, use_vad=use_vad, runtime=runtime)
+    except Exception as e:
+        results.put(("failed", None, str(e)))
+        return
+    
+    stream_model = None
+    if streaming:
+        try:
+            stream_model = create_streaming_asr_model(device=device)
+        except Exception as e:
+            # 流式模型不可用时，流式会话退化为：攒齐整段语音，结束时交给 SenseVoice
+            print(f"流式ASR模型加载失败，改为整段识别: {e}")
+    results.put(("ready", None, f"{runtime}/{device}" + (" +streaming" if stream_model else "")))
+    
+    stream_caches = {}  # session id -> funasr cache
+    stream_texts = {}  # session id -> text decoded so far
+    stream_audio = {}  # session id -> chunks (only when the streaming model is unavailable)
+    failed_streams = {}  # session id -> error; later chunks are dropped and the error is reported at the end
+    
+    def handle_stream(item):
+        kind, session_id = item[0], item[1]
+        if kind == "cancel":
+            stream_caches.pop(session_id, None)
+            stream_texts.pop(session_id, None)
+            stream_audio.pop(session_id, None)
+            failed_streams.pop(session_id, None)
+            return
+        
+        samples, is_final = item[2], item[3]
+        if session_id in failed_streams:
+            if is_final:
+                results.put(("error", session_id, failed_streams.pop(session_id)))
+            return
+        try:
+            if stream_model is None:
+                stream_audio.setdefault(session_id, []).append(samples)
+                if is_final:
+                    utterance = np.concatenate(stream_audio.pop(session_id))
+                    results.put(("text", session_id, run_asr_batch(model, [utterance])[0]))
+                return
+            
+            cache = stream_caches.setdefault(session_id, {})
+            text = stream_texts.get(session_id, "") + run_asr_stream_chunk(stream_model, cache, samples, is_final)
+            if is_final:
+                stream_caches.pop(session_id, None)
+                stream_texts.pop(session_id, None)
+                results.put(("text", session_id, text))
+            else:
+                stream_texts[session_id] = text
+                if text:
+                    results.put(("partial", session_id, text))
+        except Exception as e:
+            stream_caches.pop(session_id, None)
+            stream_texts.pop(session_id, None)
+            stream_audio.pop(session_id, None)
+            if is_final:
+                results.put(("error", session_id, str(e)))
+            else:
+                failed_streams[session_id] = str(e)
+    
+    stopping = False
+    while not stopping:
+        item = requests.get()
+        if item is None:
+            break
+        if item[0] != "audio":
+            handle_stream(item)
+            continue
+        
+        # 第一段到了之后稍等片刻，把同时到达的语音段凑成一批；其间到达的流式块照常立即处理
+        batch = [item]
+        deadline = time.time() + ASR_BATCH_WINDOW
+        while len(batch) < ASR_MAX_BATCH:
+            timeout = deadline - time.time()
+            if timeout <= 0:
+                break
+            try:
+                item = requests.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item is None:
+                stopping = True
+                break
+            if item[0] != "audio":
+                handle_stream(item)
+                continue
+            batch.append(item)
+        
+        try:
+            texts = run_asr_batch(model, [audio for _, _, audio in batch])
+            for (_, request_id, _), text in zip(batch, texts):
+                results.put(("text", request_id, text))
+        except Exception as e:
+            for _, request_id, _ in batch:
+                results.put(("error", request_id, str(e)))
+
+class AsrWorker:
+    """Long-lived SenseVoice worker fed over a queue.
+
+    submit() returns immediately; on_result(context, raw_text, error) is called on a
+    listener thread in this process once the utterance has been transcribed.
+    Requests submitted while the model is still loading are queued and handled once
+    it is ready; if loading fails they are answered with an error, and later submit()
+    / open_stream() calls are refused (return None). on_state(state, detail) reports
+    "loading" / "ready" / "failed".
+
+    Streaming sessions (open_stream / feed / cancel_stream) report the text decoded so
+    far through on_partial(context, text) and the final text through on_result.
+    """
+
+    def __init__(self, on_result, on_state=None, on_partial=None, use_process=ASR_USE_PROCESS):
+        self.on_result = on_result
+        self.on_state = on_state
+        self.on_partial = on_partial
+        self.use_process = use_process
+        self.ready = threading.Event()
+        self.state = "stopped"
+        self.pending = {}  # request_id -> context
+        self.pending_lock = threading.Lock()
+        self.next_request_id = 0
+        if use_process:
+            # spawn：子进程不继承 Tk / PyAudio 等状态，Windows 下也是同样的行为
+            self.ctx = multiprocessing.get_context("spawn")
+            self.requests = self.ctx.Queue()
+            self.results = self.ctx.Queue()
+        else:
+            self.requests = queue.Queue()
+            self.results = queue.Queue()
+        self.worker = None
+        self.listener = None
+    
+    def _set_state(self, state, detail=None):
+        self.state = state
+        if self.on_state:
+            self.on_state(state, detail)
+    
+    def start(self):
+        if self.worker is not None:
+            return
+        self._set_state("loading")
+        if self.use_process:
+            self.worker = self.ctx.Process(target=asr_worker_main, args=(self.requests, self.results))
+        else:
+            self.worker = threading.Thread(target=asr_worker_main, args=(self.requests, self.results))
+        self.worker.daemon = True
+        self.worker.start()
+        
+        self.listener = threading.Thread(target=self._listen)
+        self.listener.daemon = True
+        self.listener.start()
+    
+    def _register(self, context):
+        with self.pending_lock:
+            if self.state == "failed":
+                return None
+            request_id = self.next_request_id
+            self.next_request_id += 1
+            self.pending[request_id] = context
+        return request_id
+    
+    def submit(self, audio, context=None):
+        """Queue one utterance (float32 samples or a file path); context is handed back with the result"""
+        request_id = self._register(context)
+        if request_id is not None:
+            self.requests.put(("audio", request_id, audio))
+        return request_id
+    
+    def open_stream(self, context=None):
+        """Start a streaming session for one utterance; returns its session id (None once loading failed)"""
+        return self._register(context)
+    
+    def feed(self, session_id, samples, is_final=False):
+        """Send the next float32 chunk of a streaming session; is_final marks the endpoint"""
+        self.requests.put(("chunk", session_id, samples, is_final))
+    
+    def cancel_stream(self, session_id):
+        """Drop a streaming session (e.g. the utterance turned out to be noise)"""
+        with self.pending_lock:
+            context = self.pending.pop(session_id, None)
+        self.requests.put(("cancel", session_id))
+        return context
+    
+    def _listen(self):
+        while True:
+            kind, request_id, payload = self.results.get()
+            if kind == "stopped":
+                return
+            if kind == "ready":
+                self.ready.set()
+                print(f"ASR模型已就绪: {payload}")
+                self._set_state("ready", payload)
+                continue
+            if kind == "failed":
+                print(f"ASR模型加载失败: {payload}")
+                with self.pending_lock:
+                    # 在锁内置为 failed：之后的 submit / open_stream 不会再登记到 pending 里
+                    self.state = "failed"
+                    waiting = list(self.pending.values())
+                    self.pending.clear()
+                self._set_state("failed", payload)
+                # 加载期间排队的语音也要给出结果，否则它们的“识别中”占位气泡要等到超时才消失
+                for context in waiting:
+                    self.on_result(context, None, payload)
+                return
+            
+            with self.pending_lock:
+                if request_id not in self.pending:
+                    continue  # 已取消的流式会话
+                if kind == "partial":
+                    context = self.pending[request_id]
+                else:
+                    context = self.pending.pop(request_id)
+            if kind == "partial":
+                if self.on_partial:
+                    self.on_partial(context, payload)
+            elif kind == "text":
+                self.on_result(context, payload, None)
+            else:
+                self.on_result(context, None, payload)
+    
+    def stop(self):
+        if self.worker is None:
+            return
+        self.requests.put(None)
+        self.results.put(("stopped", None, None))
+        self.worker.join(timeout=2.0)
+        if self.use_process and self.worker.is_alive():
+            self.worker.terminate()
+        self.worker = None
+
+# ---------------- Audio Capture Ring ----------------
+class AudioCaptureRing:
+    """Single-producer / single-consumer ring of int16 chunks fed by a PyAudio callback.
+
+    PortAudio's callback thread only copies into a preallocated slot and bumps the
+    write counter; the VAD thread blocks in read() until a chunk is available. Each
+    side only ever writes its own counter, so no lock is taken on the audio thread.
+    """
+    #原来是 stream.read(CHUNK) + sleep(0.01) 轮询，VAD 线程一被 ASR / 图表线程拖慢，
+    #PortAudio 的输入缓冲就溢出，而 exception_on_overflow=False 让丢音频悄无声息。
+    #现在由回调把数据放进足够大的环形缓冲区，丢没丢、丢了多少都有计数。
+
+    def __init__(self, chunk=CHUNK, seconds=AUDIO_RING_SECONDS):
+        self.chunk = chunk
+        self.capacity = max(2, int(np.ceil(seconds * RATE / chunk)))
+        self.slots = np.zeros((self.capacity, chunk), dtype=np.int16)
+        self.lengths = np.zeros(self.capacity, dtype=np.int64)
+        self.write_count = 0  # 只由回调线程修改
+        self.read_count = 0  # 只由消费线程修改
+        self.data_ready = threading.Event()
+        
+        # Counters
+        self.dropped_chunks = 0  # 环形缓冲区满了，新数据被丢弃（消费线程落后超过 AUDIO_RING_SECONDS）
+        self.input_overflows = 0  # PortAudio 自己报告的输入溢出（回调本身来不及被调用）
+        self.underruns = 0  # 消费线程等到超时也没有数据（设备停止或卡住）
+        self.max_fill = 0  # 缓冲区里积压最多时的块数
+    
+    def callback(self, in_data, frame_count, time_info, status):
+        """PyAudio stream_callback: copy the chunk into the next free slot"""
+        if status & pyaudio.paInputOverflow:
+            self.input_overflows += 1
+        fill = self.write_count - self.read_count
+        if fill >= self.capacity:
+            self.dropped_chunks += 1
+            return (None, pyaudio.paContinue)
+        
+        slot = self.write_count % self.capacity
+        data = np.frombuffer(in_data, dtype=np.int16)
+        length = min(len(data), self.chunk)
+        self.slots[slot, :length] = data[:length]
+        self.lengths[slot] = length
+        self.write_count += 1
+        if fill + 1 > self.max_fill:
+            self.max_fill = fill + 1
+        self.data_ready.set()
+        return (None, pyaudio.paContinue)
+    
+    def read(self, timeout=0.5):
+        """Return the oldest unread chunk as bytes, or None if nothing arrived within timeout"""
+        if self.read_count == self.write_count:
+            # 先 clear 再复查，回调在两者之间写入也不会丢失唤醒
+            self.data_ready.clear()
+            if self.read_count == self.write_count and not self.data_ready.wait(timeout):
+                self.underruns += 1
+                return None
+        slot = self.read_count % self.capacity
+        data = self.slots[slot, :self.lengths[slot]].tobytes()
+        self.read_count += 1
+        return data
+    
+    def stats(self):
+        """Snapshot of the capture counters"""
+        return {
+            "captured": self.write_count,
+            "consumed": self.read_count,
+            "dropped": self.dropped_chunks,
+            "input_overflows": self.input_overflows,
+            "underruns": self.underruns,
+            "max_fill": self.max_fill,
+            "capacity": self.capacity,
+        }
+
+# ---------------- Pre-roll Buffer ----------------
+class PreRollBuffer:
+    """Fixed ring of the most recent non-speech chunks, prepended when speech starts.
+
+    push() copies into a preallocated slot, so the steady state (nobody speaking)
+    allocates nothing; drain() builds the byte strings only once per utterance.
+    """
+    #语音检测要等能量/模型判定“开始说话”之后才开始录，句首的辅音和第一个字往往已经过去了。
+    #这里始终保留最近 VAD_PRE_PADDING 秒的音频，开始说话时把它们接在最前面。
+
+    def __init__(self, seconds=VAD_PRE_PADDING, chunk=CHUNK):
+        self.capacity = int(np.ceil(seconds * RATE / chunk))
+        self.slots = np.zeros((max(1, self.capacity), chunk), dtype=np.int16)
+        self.lengths = np.zeros(max(1, self.capacity), dtype=np.int64)
+        self.count = 0
+        self.next_slot = 0
+    
+    def push(self, audio_data):
+        if self.capacity == 0:
+            return
+        data = np.frombuffer(audio_data, dtype=np.int16)
+        length = min(len(data), self.slots.shape[1])
+        self.slots[self.next_slot, :length] = data[:length]
+        self.lengths[self.next_slot] = length
+        self.next_slot = (self.next_slot + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+    
+    def drain(self):
+        """Return the buffered chunks oldest first as bytes and empty the ring"""
+        first = (self.next_slot - self.count) % self.capacity if self.capacity else 0
+        chunks = []
+        for i in range(self.count):
+            slot = (first + i) % self.capacity
+            chunks.append(self.slots[slot, :self.lengths[slot]].tobytes())
+        self.count = 0
+        return chunks
+
+# ---------------- Noise Statistics ----------------
+class NoiseStats:
+    """Fixed-size NumPy ring of recent noise energies with O(1) running mean / variance.
+
+    Stands in for the old Python list: append() evicts the oldest value once full,
+    and len() / mean / std never walk the history.
+    """
+
+    def __init__(self, capacity=100):
+        self.capacity = capacity
+        self.values = np.zeros(capacity, dtype=np.float64)
+        self.clear()
+    
+    def clear(self):
+        self.count = 0
+        self.index = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.updates = 0
+    
+    def __len__(self):
+        return self.count
+    
+    def append(self, value):
+        value = float(value)
+        if self.count == self.capacity:
+            old = float(self.values[self.index])
+            self.total -= old
+            self.total_sq -= old * old
+        else:
+            self.count += 1
+        self.values[self.index] = value
+        self.total += value
+        self.total_sq += value * value
+        self.index = (self.index + 1) % self.capacity
+        
+        # 增减累加会慢慢积累浮点误差，偶尔按整段历史重算一次（均摊后仍是 O(1)）
+        self.updates += 1
+        if self.updates % (self.capacity * 16) == 0:
+            window = self.values[:self.count]
+            self.total = float(window.sum())
+            self.total_sq = float(np.dot(window, window))
+    
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+    
+    @property
+    def variance(self):
+        if not self.count:
+            return 0.0
+        mean = self.total / self.count
+        return max(0.0, self.total_sq / self.count - mean * mean)
+    
+    @property
+    def std(self):
+        return self.variance ** 0.5
+
+# ---------------- VAD Backends ----------------
+class EnergyVadBackend:
+    """Energy above the (calibrated, noise-adaptive) threshold computed by VoiceActivityDetector"""
+    name = "energy"
+
+    def is_speech(self, audio_data, energy, threshold):
+        return energy > threshold
+    
+    def reset(self):
+        pass
+
+class WebRtcVadBackend:
+    """WebRTC VAD over fixed 10/20/30 ms frames; a chunk is speech when enough of its frames are"""
+    name = "webrtc"
+
+    def __init__(self, aggressiveness=WEBRTC_VAD_AGGRESSIVENESS, frame_ms=WEBRTC_VAD_FRAME_MS,
+                 speech_ratio=WEBRTC_VAD_SPEECH_RATIO):
+        if webrtcvad is None:
+            raise RuntimeError("未安装 webrtcvad")
+        self.vad = webrtcvad.Vad(aggressiveness)
+        self.frame_bytes = RATE * frame_ms // 1000 * 2  # int16
+        self.speech_ratio = speech_ratio
+        self.pending = bytearray()  # CHUNK 不是帧长的整数倍，剩下的字节留给下一块
+    
+    def is_speech(self, audio_data, energy=None, threshold=None):
+        self.pending += audio_data
+        frames = voiced = 0
+        offset = 0
+        while len(self.pending) - offset >= self.frame_bytes:
+            frame = bytes(self.pending[offset:offset + self.frame_bytes])
+            offset += self.frame_bytes
+            frames += 1
+            if self.vad.is_speech(frame, RATE):
+                voiced += 1
+        del self.pending[:offset]
+        return frames > 0 and voiced >= frames * self.speech_ratio
+    
+    def reset(self):
+        self.pending = bytearray()
+
+class SileroVadBackend:
+    """Silero VAD v5 (ONNX, CPU): 512-sample windows with 64 samples of carried context"""
+    name = "silero"
+    window = 512
+    context_size = 64
+
+    def __init__(self, model_path=SILERO_VAD_MODEL, threshold=SILERO_VAD_THRESHOLD):
+        if onnxruntime is None:
+            raise RuntimeError("未安装 onnxruntime")
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = 1
+        options.inter_op_num_threads = 1
+        self.session = onnxruntime.InferenceSession(model_path, sess_options=options,
+                                                    providers=["CPUExecutionProvider"])
+        self.threshold = threshold
+        self.sr = np.array(RATE, dtype=np.int64)
+        # 输入 = 上一窗口末尾 64 个采样 + 当前 512 个采样，预分配后原地填充
+        self.input = np.zeros((1, self.context_size + self.window), dtype=np.float32)
+        self.pending = np.zeros(self.window, dtype=np.float32)
+        self.pending_count = 0
+        self.reset()
+    
+    def reset(self):
+        self.state = np.zeros((2, 1, 128), dtype=np.float32)
+        self.input.fill(0)
+        self.pending_count = 0
+        self.last_probability = 0.0
+    
+    def _run_window(self, samples):
+        self.input[0, self.context_size:] = samples
+        probability, self.state = self.session.run(None, {"input": self.input, "state": self.state, "sr": self.sr})
+        self.input[0, :self.context_size] = self.input[0, -self.context_size:]
+        return float(probability[0][0])
+    
+    def is_speech(self, audio_data, energy=None, threshold=None):
+        samples = np.frombuffer(audio_data, dtype=np.int16)
+        best = None
+        offset = 0
+        while offset < len(samples):
+            take = min(self.window - self.pending_count, len(samples) - offset)
+            self.pending[self.pending_count:self.pending_count + take] = samples[offset:offset + take]
+            self.pending[self.pending_count:self.pending_count + take] *= 1.0 / 32768.0
+            self.pending_count += take
+            offset += take
+            if self.pending_count == self.window:
+                probability = self._run_window(self.pending)
+                best = probability if best is None else max(best, probability)
+                self.pending_count = 0
+        if best is not None:
+            self.last_probability = best
+        # 这一块没凑满一个窗口时，沿用上一次的判断
+        return self.last_probability > self.threshold
+
+def create_vad_backend(name=VAD_BACKEND):
+    """Build a VAD backend by name, falling back to the energy detector if it is unavailable"""
+    try:
+        if name == "webrtc":
+            return WebRtcVadBackend()
+        if name == "silero":
+            return SileroVadBackend()
+    except Exception as e:
+        print(f"VAD 后端 {name} 不可用，改用能量检测: {e}")
+    return EnergyVadBackend()
+
 class AudioRecorder:
     #这个类实现了“按键开始录音，按键停止录音”的功能，
-    #通过后台线程实时从麦克风采集音频数据，录完后保存为 WAV 文件，并调用主程序转写。
+    #通过后台线程实时从麦克风采集音频数据，录完后直接把内存中的音频交给主程序转写。
     def __init__(self, app):
         # 这个app再次出现，再次说明：
 
@@ -265,6 +1560,8 @@ class AudioRecorder:
         #通过这个 stream，你可以调用 stream.read(CHUNK) 读取音频数据。
         frames = []
         #用来存放录制的音频数据块（字节串）。
+        max_frames = int(ASR_MAX_SEGMENT_S * RATE / CHUNK)
+        #不串 fsmn-vad 时 SenseVoice 不会自己切分长音频，所以每满 ASR_MAX_SEGMENT_S 秒就先送一段去转写
         
         while self.recording and not self.stop_recording_flag:
             #这是循环录音的条件，只要没被停止，就持续录音。
@@ -273,6 +1570,10 @@ class AudioRecorder:
                 #从麦克风一次性读 CHUNK 大小的音频数据（字节串）。这个操作会阻塞，直到读到足够数据。
                 frames.append(data)
                 #将这次读取的音频数据保存起来，后面用来写文件。
+                if len(frames) >= max_frames:
+                    print(f"录音达到 {ASR_MAX_SEGMENT_S}s，先转写这一段，继续录音")
+                    self.app.transcribe_audio(frames_to_samples(frames))
+                    frames = []
             except Exception as e:
                 self.app.update_status(f"Error recording audio: {e}")
                 break
@@ -285,25 +1586,12 @@ class AudioRecorder:
         # 关闭流 stream.close()
         # 释放 PyAudio 资源 p.terminate()
         
-        if frames:# 判断录到音频才写文件：
+        if frames:# 判断录到音频才转写：
             try:
-                wf = wave.open(WAVE_OUTPUT_FILENAME, 'wb')
-                #  wave 模块是一个标准库模块，用于处理 WAV 格式的音频文件。
-                #  它支持对未压缩的单声道或立体声 WAV 文件进行读写操作。以下是模块的主要功能和用法：
-                #wf 其实是 wave 模块 里打开的 WAV 文件对象，名字叫 wf，它代表的是一个“WAV 文件写入器”的实例。
-                wf.setnchannels(CHANNELS)#设置 WAV 文件的声道数（单声道或立体声）
-                wf.setsampwidth(p.get_sample_size(FORMAT))
-                #设置采样宽度（每个采样点占用多少字节），这里用 p.get_sample_size(FORMAT) 自动获得对应的字节数，比如16位采样就是2字节
-                wf.setframerate(RATE)#设置采样率，表示每秒采样多少次
-                wf.writeframes(b''.join(frames))
-                #把之前录到的所有音频数据块 frames 拼接成一个完整的字节流，写入 WAV 文件
-                wf.close()
-                
-                self.app.transcribe_audio(WAVE_OUTPUT_FILENAME)
-                #调用主程序（self.app）中的一个方法 transcribe_audio，
-                #把刚录制并保存好的音频文件路径（WAVE_OUTPUT_FILENAME）传给它，让主程序去做“音频转文字”的处理。
+                # 直接把内存里的采样交给 ASR 模型，不再写 output.wav
+                self.app.transcribe_audio(frames_to_samples(frames))
             except Exception as e:
-                self.app.update_status(f"Error saving audio: {e}")
+                self.app.update_status(f"Error transcribing audio: {e}")
 
 class VoiceActivityDetector:
     def __init__(self, app):
@@ -319,6 +1607,8 @@ class VoiceActivityDetector:
         
         # Voice activity detection parameters - MUCH lower threshold
         #初始化语音检测参数
+        self.backend = create_vad_backend(VAD_BACKEND)
+        #语音判定后端（能量阈值 / WebRTC VAD / Silero），可以用 set_backend() 在运行时切换
         self.energy_threshold = 80  # Further reduced for better sensitivity
         #语音信号能量判定阈值，能量高于它才算是有人说话
         self.dynamic_threshold = True  # Dynamically adjust threshold based on environment noise
@@ -327,7 +1617,7 @@ class VoiceActivityDetector:
         #语音结束判定的静音时长，超过则认为说话结束
         self.min_speech_duration = 0.3  # Shorter minimum duration to catch brief utterances
         #最短语音长度，避免误触发
-        self.max_speech_duration = 30.0  # Maximum speech duration
+        self.max_speech_duration = float(ASR_MAX_SEGMENT_S)  # Maximum speech duration
         #最长语音长度，防止录音过长
         
         # Speech detection state
@@ -341,16 +1631,33 @@ class VoiceActivityDetector:
         self.speech_frames = []
         #保存检测到的语音音频帧，供后续识别处理用
         
+        self.pre_roll = PreRollBuffer()
+        #语音开始前最近 VAD_PRE_PADDING 秒的音频（预分配的环形数组）
+        self.trailing_silence_chunks = 0
+        #当前语音末尾连续静音的块数，处理时只保留 VAD_POST_PADDING 秒
+        self.paused_for_playback = False
+        #播放系统语音期间跳过了检测；恢复监听时要先清掉后端里的旧状态
+        
+        # Streaming ASR session for the current utterance (ASR_STREAMING)
+        self.stream_session = None
+        #当前语音对应的流式识别会话ID
+        self.stream_pending = bytearray()
+        #还不够一个识别块（ASR_STREAM_CHUNK_SAMPLES）的PCM字节
+        
         # For dynamic threshold adjustment
         #初始化动态阈值相关变量
-        self.noise_levels = []
-        #保存环境噪声的历史能量值，用于计算平均噪声
         self.max_noise_levels = 100
         #保存噪声样本的最大数量，防止内存无限增长
+        self.noise_levels = NoiseStats(self.max_noise_levels)
+        #保存环境噪声的历史能量值（固定大小的环形数组），平均值/方差随写入增量更新，用于计算平均噪声
+        self._energy_buffer = np.empty(CHUNK, dtype=np.float64)
+        #_get_energy 复用的计算缓冲区，每块音频不再分配临时数组
         
         # Audio stream
         self.audio = None
         self.stream = None
+        self.capture = None
+        #self.capture 是回调模式下的环形缓冲区（AudioCaptureRing），溢出/欠载计数见 capture_stats()
         #self.audio 和 self.stream 是后续打开音频采集设备和流的句柄，先初始化为空，稍后在监听线程中赋值
         
         # Debug mode调试和校准相关变量
@@ -405,24 +1712,41 @@ class VoiceActivityDetector:
 
             #关闭和释放 PyAudio 的流和实例，防止资源泄露或占用麦克风
     
+    def set_backend(self, name):
+        """Switch the speech/non-speech backend at runtime; returns the backend actually in use"""
+        backend = create_vad_backend(name)
+        self.backend = backend
+        #只替换一个属性，监听线程下一块音频就会用上新的后端
+        print(f"VAD 后端切换为: {backend.name}")
+        return backend.name
+    
+    def capture_stats(self):
+        """Overflow / underrun counters of the callback capture ring (None before monitoring starts)"""
+        return self.capture.stats() if self.capture else None
+    
     def _get_energy(self, audio_data):
         #计算传入音频数据帧的“能量”（声音强度）:能量是判断是否有人说话的关键特征
-        """Calculate audio energy level"""
+        """Calculate audio energy level (mean absolute amplitude) without per-chunk temporaries"""
         try:
             # Convert bytes to numpy array
             data = np.frombuffer(audio_data, dtype=np.int16)
-            #把原始 PCM 字节数据转成 16 位有符号整数的 numpy 数组，方便数值计算。
-            #音频数据需要转变数据的格式
+            #把原始 PCM 字节数据转成 16 位有符号整数的 numpy 数组（只是视图，不复制数据）。
             
             # Ensure we have valid data
-            if len(data) == 0 or np.all(data == 0):
-                #如果没有采样点或全是静音，能量直接算 0。
+            n = len(data)
+            if n == 0:
                 return 0.0
+            if n > len(self._energy_buffer):
+                self._energy_buffer = np.empty(n, dtype=np.float64)
+            buffer = self._energy_buffer[:n]
                 
-            # Calculate RMS energy
-            # Use np.mean(np.abs(data)) as it's more robust than squaring
-            energy = np.mean(np.abs(data))
+            # Mean absolute amplitude, computed in place on the reused buffer
+            # (全零的帧自然得到 0，不再单独做 np.all(data == 0) 检查)
+            np.copyto(buffer, data)
+            np.abs(buffer, out=buffer)
+            energy = float(buffer.sum()) / n
             #计算该音频帧的平均振幅（绝对值均值），代表声音强度，用来判断有没有声音。
+            #先转成 float64 再取绝对值，-32768 也不会溢出。
             return energy
         except Exception as e:
             print(f"Error calculating energy: {e}")
@@ -442,8 +1766,14 @@ class VoiceActivityDetector:
                 #debug输出，每2秒打印一次
                 if self.debug and time.time() % 2 < 0.1:
                     print("语音监测暂停中 - 正在播放系统语音")
+                self.paused_for_playback = True
                 return False
             
+            if self.paused_for_playback:
+                # 播放结束、恢复监听：丢掉播放前残留的帧和模型状态（WebRTC 未凑满的帧、Silero 的 RNN 状态）
+                self.paused_for_playback = False
+                self.backend.reset()
+            
             # Use provided energy or calculate it
             if energy is None:
                 energy = self._get_energy(audio_data)
@@ -465,7 +1795,7 @@ class VoiceActivityDetector:
             #动态阈值调整:非常聪明！
             if self.dynamic_threshold and len(self.noise_levels) > 0:
                 # Set threshold to be 2.5x the average noise level
-                noise_avg = sum(self.noise_levels) / len(self.noise_levels)
+                noise_avg = self.noise_levels.mean
                 dynamic_threshold = noise_avg * 2.5
                 threshold = max(threshold, dynamic_threshold)
 
@@ -482,12 +1812,12 @@ class VoiceActivityDetector:
             #每秒大约打印一次当前能量、阈值、平均噪音
             if self.debug and time.time() % 1 < 0.1:  # Print every second
                 print(f"能量: {energy:.1f}, 阈值: {threshold:.1f}, " + 
-                      f"平均噪音: {sum(self.noise_levels) / max(1, len(self.noise_levels)):.1f}")
+                      f"平均噪音: {self.noise_levels.mean:.1f} ± {self.noise_levels.std:.1f}")
 
 
-            # Detect speech when energy is above threshold
-            return energy > threshold
-            #核心判定条件：当前音频的能量值是否高于阈值
+            # Detect speech with the selected backend
+            return self.backend.is_speech(audio_data, energy, threshold)
+            #核心判定条件：能量后端比较当前音频的能量值是否高于阈值；WebRTC / Silero 后端由模型判断
 
 
         except Exception as e:
@@ -526,8 +1856,8 @@ class VoiceActivityDetector:
             #就是说校准时间太慢或者太快都不准确！
             self.is_calibrating = True
             #开启校准状态
-            self.noise_levels = []
-            #清空旧的噪音样本列表，确保这次校准只用新的数据。
+            self.noise_levels.clear()
+            #清空旧的噪音样本，确保这次校准只用新的数据。
             print("开始麦克风校准...")
             self.app.update_status("校准麦克风中，请保持安静...")
             
@@ -542,7 +1872,7 @@ class VoiceActivityDetector:
             # Calculate noise threshold
             if len(self.noise_levels) > 0:
                 #平均噪音能量值
-                avg_noise = sum(self.noise_levels) / len(self.noise_levels)
+                avg_noise = self.noise_levels.mean
                 #设置语音检测阈值
                 self.energy_threshold = max(100, avg_noise * 2.5)  # Set threshold to 2.5x average noise
                 
@@ -574,13 +1904,17 @@ class VoiceActivityDetector:
         try:
             #看！上面的那个audio stream对象的问题本质解决了，问题就在这里！
             self.audio = pyaudio.PyAudio()
+            self.capture = AudioCaptureRing()
             self.stream = self.audio.open(
                 format=FORMAT,
                 channels=CHANNELS,
                 rate=RATE,
                 input=True,
-                frames_per_buffer=CHUNK#chunk：数据块，大块
+                frames_per_buffer=CHUNK,#chunk：数据块，大块
+                stream_callback=self.capture.callback
             )
+            #回调模式：PortAudio 在自己的线程里调用 self.capture.callback 把数据写进环形缓冲区，
+            #下面的循环只负责从缓冲区取数据，不再需要 read + sleep 轮询
             #self.audio → 一个 PyAudio 的总控制对象，相当于“音频工厂”，用它来打开或关闭音频流。
             #self.stream → 一个正在录音的音频流对象，能从麦克风实时读取数据
             #format、channels、rate、frames_per_buffer 
@@ -591,7 +1925,6 @@ class VoiceActivityDetector:
                 # FORMAT = pyaudio.paInt16
                 # CHANNELS = 1
                 # RATE = 16000
-                # WAVE_OUTPUT_FILENAME = "output.wav"
 
             # Perform initial calibration
             self._calibrate_microphone()
@@ -600,24 +1933,29 @@ class VoiceActivityDetector:
             # 校准结束后，self.is_calibrating = False，进入正式监控。
                         
             # Continuous audio analysis loop进入监听循环
+            reported_losses = 0
             while self.running:
                 try:
                     # Read audio chunk
-                    audio_data = self.stream.read(CHUNK, exception_on_overflow=False)
-                    #每一轮循环从麦克风抓一块音频数据（字节串）。大小是 CHUNK，对应大约几十毫秒的声音
-                    #pyaudio 的Stream.read（） 有一个关键字参数exception_on_overflow，请将其设置为 False。避免输入溢出报错
+                    audio_data = self.capture.read(timeout=0.5)
+                    #从环形缓冲区取一块音频数据（字节串），大小是 CHUNK，对应大约几十毫秒的声音；没有数据时阻塞等待
+                    if audio_data is None:
+                        continue
+                    
+                    losses = self.capture.dropped_chunks + self.capture.input_overflows
+                    if losses > reported_losses:
+                        reported_losses = losses
+                        print(f"音频采集丢失: {self.capture_stats()}")
 
                     # Calculate energy once to avoid duplicate work
                     energy = self._get_energy(audio_data)
                     
                     # Update noise level (only when not speaking)
-                    if not self.is_speaking and len(self.noise_levels) < self.max_noise_levels:
+                    if not self.is_speaking:
                         self.noise_levels.append(energy)
                         #只有在当前没检测到说话时才更新 noise_levels（防止说话声音被当作噪音）。
                         #noise_levels 用来动态计算新的阈值（如果开启了 self.dynamic_threshold）
-
-                        if len(self.noise_levels) > self.max_noise_levels:
-                            self.noise_levels.pop(0)  # Keep the list size limited
+                        #环形数组满了会自动覆盖最旧的值，始终保留最近 max_noise_levels 个样本
                     
                     # Check if it's speech
                     #这是当前这一小段音频（一个 chunk，大约几毫秒）有没有检测到说话。
@@ -629,16 +1967,23 @@ class VoiceActivityDetector:
                             #这是一个状态变量，表示系统之前是否已经进入“讲话状态”。
                             self.is_speaking = True
                             self.speech_started = time.time()
-                            self.speech_frames = []
+                            self.speech_frames = self.pre_roll.drain()
+                            #句首补上开始说话之前的音频（pre-roll），而不是从当前这一块开始
+                            if ASR_STREAMING:
+                                for frame in self.speech_frames:
+                                    self._stream_frame(frame)
                             # Show visual feedback immediately
                             print("语音开始检测中...")
-                            self.app.after(0, lambda: self.app.update_status("检测到语音输入..."))
+                            self.app.update_status("检测到语音输入...")
                         
                         # Reset silence counter
                         self.silence_started = 0
+                        self.trailing_silence_chunks = 0
                         
                         # Add frame to speech buffer
                         self.speech_frames.append(audio_data)
+                        if ASR_STREAMING:
+                            self._stream_frame(audio_data)
                         
                         # Check if we've exceeded max duration
                         if time.time() - self.speech_started > self.max_speech_duration:
@@ -653,6 +1998,9 @@ class VoiceActivityDetector:
                         
                         # Add the silent frame (for smoother audio)
                         self.speech_frames.append(audio_data)
+                        self.trailing_silence_chunks += 1
+                        if ASR_STREAMING:
+                            self._stream_frame(audio_data)
                         
                         # If silence continues for threshold duration, process the speech
                         silence_duration = time.time() - self.silence_started
@@ -660,7 +2008,9 @@ class VoiceActivityDetector:
                             print(f"静音时长达到阈值 ({silence_duration:.2f}s > {self.silence_threshold}s)，开始处理语音")
                             self._process_speech()
                     
-                    time.sleep(0.01)  # Small sleep to reduce CPU usage
+                    else:
+                        # Not speaking: keep the chunk as pre-roll for the next utterance
+                        self.pre_roll.push(audio_data)
                     
                 except Exception as e:
                     error_msg = f"音频监测错误: {e}"
@@ -725,120 +2075,134 @@ class VoiceActivityDetector:
             self.silence_started = 0
             
             # Save a copy of speech frames before resetting
-            frames_copy = self.speech_frames.copy()
-            #先复制录下的所有音频帧到 frames_copy，以免后续被清空。
+            # (trailing silence beyond VAD_POST_PADDING is trimmed off)
+            post_chunks = int(np.ceil(VAD_POST_PADDING * RATE / CHUNK))
+            trim = max(0, self.trailing_silence_chunks - post_chunks)
+            frames_copy = self.speech_frames[:len(self.speech_frames) - trim]
+            #先复制录下的音频帧到 frames_copy（去掉多余的尾部静音），以免后续被清空。
             self.speech_frames = []
+            self.trailing_silence_chunks = 0
             #清空 self.speech_frames，准备下一次讲话录音。
+            self.backend.reset()
+            #一句话结束：后端状态也清零，下一句不受这一句尾巴的影响
             
             # Check if we truly had meaningful speech
             if is_speaking_was and speech_duration > 0.5:  # Additional validation
+                if self.stream_session is not None:
+                    # 流式模式：前面的块已经识别完了，只需送出最后一块并标记结束
+                    self._end_stream(keep=True)
+                    return
                 # Process in a separate thread to not block monitoring
                 self.detection_thread = threading.Thread(
-                    target=self._save_and_transcribe, 
+                    target=self._transcribe_frames, 
                     args=(frames_copy,)
                 )
                 self.detection_thread.daemon = True
                 self.detection_thread.start()
-                #用 线程 处理保存和转写，这样不会阻塞麦克风监听。
+                #用 线程 处理转写，这样不会阻塞麦克风监听。
             else:
                 print(f"语音太短或者无效: {speech_duration:.2f}秒")
+                self._end_stream(keep=False)
                 self.app.update_status("Ready")
         else:
             # Too short, reset without processing
             print(f"语音太短 ({speech_duration:.2f}秒 < {self.min_speech_duration}秒)，忽略")
+            self._end_stream(keep=False)
             self.is_speaking = False
             self.silence_started = 0
             self.speech_frames = []
+            self.trailing_silence_chunks = 0
+            self.backend.reset()
             self.app.update_status("Ready")
 
 
 
 
     
-    def _save_and_transcribe(self, frames):
-        """Save speech frames to file and start transcription"""
+    def _stream_frame(self, audio_data):
+        """Forward a speech frame to the streaming recognizer in ASR_STREAM_CHUNK_SAMPLES chunks"""
+        if self.stream_session is None:
+            self.stream_session = self.app.begin_voice_stream()
+            if self.stream_session is None:
+                return  # 识别模型不可用：这句话结束时走整段识别，由 transcribe_audio 报告
+        self.stream_pending += audio_data
+        chunk_bytes = ASR_STREAM_CHUNK_SAMPLES * 2  # int16
+        while len(self.stream_pending) >= chunk_bytes:
+            chunk = bytes(self.stream_pending[:chunk_bytes])
+            del self.stream_pending[:chunk_bytes]
+            self.app.asr_worker.feed(self.stream_session, frames_to_samples([chunk]))
+    
+    def _end_stream(self, keep):
+        """Finish the streaming session: send the tail as the final chunk, or cancel it"""
+        if self.stream_session is None:
+            return
+        session_id = self.stream_session
+        tail = frames_to_samples([bytes(self.stream_pending)])
+        self.stream_session = None
+        self.stream_pending = bytearray()
+        
+        if not keep:
+            self.app.cancel_voice_stream(session_id)
+            return
+        if len(tail) < 960:
+            # 最后一块太短时补一点静音，流式模型至少需要一帧（60ms）输入
+            tail = np.concatenate([tail, np.zeros(960 - len(tail), dtype=np.float32)])
+        print("语音结束，发送最后一块进行流式识别")
+        self.app.asr_worker.feed(session_id, tail, is_final=True)
+    
+    def _transcribe_frames(self, frames):
+        """Hand the speech frames to the ASR model in memory (runs on the detection thread)"""
         try:
-            temp_filename = f"speech_{int(time.time())}.wav"
-            #单独的给这个对象命名！生成文件名，拼成 speech_1691847275.wav 这种名字。，独一无二
-            print(f"保存语音到 {temp_filename}")
-            
-            # Ensure the audio object exists检查必要条件
-            if not self.audio:
-                print("错误: 音频对象不存在，无法保存语音")
-                return
-            
             # Check if we have frames
             if not frames or len(frames) == 0:
-                print("错误: 没有语音帧可以保存")
+                print("错误: 没有语音帧可以转写")
                 return
             
-            # Save frames to WAV file 保存音频文件
-            wf = wave.open(temp_filename, 'wb')
-            wf.setnchannels(CHANNELS)
-            wf.setsampwidth(self.audio.get_sample_size(FORMAT))
-            wf.setframerate(RATE)
-            wf.writeframes(b''.join(frames))
-            #writeframes(b''.join(frames)) → 把 frames 列表里的字节拼接成一个完整的音频流，然后一次性写入文件。
-            wf.close()
-            
-            # Verify the file was saved验证文件是否保存成功
-            if os.path.exists(temp_filename) and os.path.getsize(temp_filename) > 0:
-                print(f"语音文件已保存: {temp_filename}, 大小: {os.path.getsize(temp_filename)} 字节")
-            else:
-                print(f"保存语音文件失败: {temp_filename}")
-                return
-            
-            # 不再创建占位符，直接发送进行转录
-            # 确保UI响应完成后再进入繁重的语音处理
-            self.app.after(100, lambda: self._send_for_transcription(temp_filename))
-            # 为什么不直接调用？
-            # 转录可能是耗时操作（网络请求 / 模型推理），直接调用会卡住 UI。
-            # 先让 UI 有时间刷新（比如显示“正在转录”），再开始处理，用户体验更流畅
+            # 不再写 speech_xxx.wav、也不再经过 app.after(100) 绕回 UI 线程：
+            # int16 帧直接拼成 float32 数组交给 SenseVoice，转写在当前的后台线程里完成
+            samples = frames_to_samples(frames)
+            print(f"发送语音进行转写: {len(samples) / RATE:.2f}秒")
+            self.app.transcribe_audio(samples, priority=True)
                         
         except Exception as e:
             error_msg = f"处理语音出错: {e}"
             print(error_msg)
             self.app.update_status(error_msg)
 
-
-
-
-
-    
-    def _send_for_transcription(self, audio_file):
-        """Send audio file for transcription after UI is updated"""
-        try:
-            print(f"发送语音文件进行转写: {audio_file}")
-            # Send for transcription - without placeholder ID
-            self.app.transcribe_audio(audio_file, priority=True)
-            #最为重要的是这个调用主程序的对于转录函数
-        except Exception as e:
-            error_msg = f"发送转写请求时出错: {e}"
-            print(error_msg)
-            self.app.update_status(error_msg)
-
-
-
-
-
- 
 class WebcamHandler:
     def __init__(self, app):
         self.app = app
         self.running = False
         self.paused = False  # Flag to indicate if analysis is paused
-        self.processing = False  # Flag to indicate if analysis is in progress
         self.cap = None
         self.webcam_thread = None
-        self.last_webcam_image = None  # Store the most recent webcam image
+        self.frame_buffer = FrameRingBuffer()  # Raw BGR frames, converted only on demand
+        self.preview = PreviewRenderer()  # Camera window frames: preallocated buffers, adaptive fps
+        self.scene_detector = SceneChangeDetector()  # Skips analyses while the scene is static
+        self.last_analysis = None  # Last real Qwen-VL result, reused while nothing changes
+        
+        # Long-lived OSS client and upload pool (created on first upload)
+        self._oss_bucket = None
+        self._oss_lock = threading.Lock()
+        self.upload_executor = None
+        self.jpeg_encoder = JpegEncoder()  # Shared by the upload pool and the inline transport
         self.debug = True  # Set to True to enable debugging output
         
-        # Sequential processing control
+        # Analysis cycle control (bursts overlap in the pipeline, results stay in capture order)
         self.analysis_running = False
+        self.pipeline = None
+        self.last_capture_time = 0
+        self.capture_timer = None  # 唯一一个待触发的 trigger_next_capture 定时器（after id）
+        self.capture_due = 0  # 该定时器的触发时间
         
         # Camera window
         self.camera_window = None
     
+    @property
+    def last_webcam_image(self):
+        """Most recent webcam frame as a PIL image (converted on access)"""
+        return self.frame_buffer.get_image()
+    
     def start(self):
         """Start webcam capture process"""
         if not self.running:
@@ -859,10 +2223,11 @@ class WebcamHandler:
                 self.webcam_thread.start()
                 
                 # Start analysis (important - this kicks off the first capture)
+                self.pipeline = AnalysisPipeline(self._run_analysis, self._apply_analysis)
                 self.analysis_running = True
                 
                 # Start first analysis after a short delay
-                self.app.after(2000, self.trigger_next_capture)
+                self._schedule_capture(2000)
                 
                 return True
             except Exception as e:
@@ -884,38 +2249,53 @@ class WebcamHandler:
         """Stop webcam capture process"""
         self.running = False
         self.analysis_running = False
+        if self.capture_timer is not None:
+            self.app.after_cancel(self.capture_timer)
+            self.capture_timer = None
+        if self.pipeline:
+            self.pipeline.stop()
+            self.pipeline = None
         if self.cap:
             self.cap.release()
         
+        # Release the upload pool
+        with self._oss_lock:
+            if self.upload_executor:
+                self.upload_executor.shutdown(wait=False)
+                self.upload_executor = None
+        
         # Close the camera window
         if self.camera_window:
             self.camera_window.destroy()
             self.camera_window = None
     
     def _process_webcam(self):
-        """Main webcam processing loop - just keeps the most recent frame"""
-        last_ui_update_time = 0
-        ui_update_interval = 0.05  # Update UI at 20 fps
+        """Main webcam processing loop - keeps recent raw frames in the ring buffer"""
+        last_scene_check_time = 0
         
         while self.running:
             try:
-                ret, frame = self.cap.read()
+                # Read straight into the next ring slot (no per-frame allocation)
+                slot = self.frame_buffer.begin_write()
+                ret, frame = self.cap.read(slot) if slot is not None else self.cap.read()
                 if not ret:
+                    self.frame_buffer.abort_write()
                     self.app.update_status("Failed to capture frame")
                     time.sleep(0.1)
                     continue
                 
-                frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                img = Image.fromarray(frame_rgb)
-                
-                # Store the most recent image
-                self.last_webcam_image = img
+                self.frame_buffer.commit(frame)
                 
-                # Update camera window with the current frame
+                # Update camera window with the current frame (convert only when the preview needs it)
                 current_time = time.time()
-                if self.camera_window and not self.camera_window.is_closed and current_time - last_ui_update_time >= ui_update_interval:
-                    self.camera_window.update_frame(img)
-                    last_ui_update_time = current_time
+                if current_time - last_scene_check_time >= SCENE_CHECK_INTERVAL:
+                    self.scene_detector.update(frame)
+                    last_scene_check_time = current_time
+                if self.camera_window and not self.camera_window.is_closed and self.preview.due(current_time):
+                    # frame 是本线程刚写完的槽位，下一次 read 之前不会被改写，可以直接缩放
+                    # 预览帧率由 PreviewRenderer 按实测开销调整（最高 PREVIEW_MAX_FPS）
+                    self.preview.prepare(frame)
+                    self.app.ui.latest("preview", self.camera_window.show_preview, self.preview)
                 
                 time.sleep(0.03)  # ~30 fps for capture
             except Exception as e:
@@ -924,28 +2304,57 @@ class WebcamHandler:
                 self.app.update_status(error_msg)
                 time.sleep(1)  # Pause before retry
     
+    def _schedule_capture(self, delay_ms):
+        """Schedule trigger_next_capture, keeping a single pending timer (Tk thread only)"""
+        due = time.time() + delay_ms / 1000
+        if self.capture_timer is not None:
+            if self.capture_due <= due:
+                return  # 已经有一个更早的定时器，不再另起一条定时链
+            self.app.after_cancel(self.capture_timer)
+        self.capture_due = due
+        self.capture_timer = self.app.after(delay_ms, self.trigger_next_capture)
+    
     def trigger_next_capture(self):
         """Trigger the next capture and analysis cycle"""
-        if self.running and self.analysis_running and not self.paused and not self.processing:
+        self.capture_timer = None
+        if self.running and self.analysis_running and not self.paused and self.pipeline and self.pipeline.has_capacity():
             print(f"触发新一轮图像分析 {time.strftime('%H:%M:%S')}")
             self.capture_and_analyze()
     
     def capture_and_analyze(self):
-        """Capture screenshots and send for analysis"""
-        if self.processing or self.paused:
+        """Capture screenshots and submit them to the analysis pipeline"""
+        if self.paused or not self.pipeline or not self.pipeline.has_capacity():
+            return
+        
+        # Keep captures at least ANALYSIS_CAPTURE_INTERVAL apart even when several timers are pending
+        remaining = ANALYSIS_CAPTURE_INTERVAL - (time.time() - self.last_capture_time)
+        if remaining > 0:
+            self._schedule_capture(int(remaining * 1000) + 1)
             return
         
         try:
-            self.processing = True
+            # Nothing changed since the last analysis - reuse its result instead of calling the VLM
+            # (only once everything in flight has been applied, so observations stay in order)
+            if self.pipeline.idle() and self._can_reuse_analysis():
+                self._reuse_last_analysis()
+                self._schedule_capture(1000)
+                return
+            
+            # Same scene as the burst still being analyzed - don't send it twice, wait for that result
+            if not self.pipeline.idle() and not self.scene_detector.has_changed():
+                return
+            
             self.app.update_status("捕捉图像中...")
             
             # Get both analysis screenshots and current display screenshot
             screenshots, current_screenshot = self._capture_screenshots()
+            self.scene_detector.mark_reference()
+            self.last_capture_time = time.time()
             
             # Show immediate feedback with the current screenshot
             if current_screenshot:
-                # Generate placeholder ID for tracking
-                placeholder_id = f"img_{int(time.time())}"
+                # Generate placeholder ID for tracking (ms resolution - bursts can now be < 1s apart)
+                placeholder_id = f"img_{int(time.time() * 1000)}"
                 
                 # Show a placeholder message in the UI while we wait for analysis
                 self.app.add_ai_message("正在分析当前画面...", current_screenshot, is_placeholder=True, placeholder_id=placeholder_id)
@@ -953,93 +2362,140 @@ class WebcamHandler:
                 if self.debug:
                     print(f"已添加图像占位符到UI: {placeholder_id}")
                 
-                # Process analysis in another thread to keep UI responsive
-                analysis_thread = threading.Thread(
-                    target=self._analyze_screenshots, 
-                    args=(screenshots, current_screenshot, placeholder_id)
-                )
-                analysis_thread.daemon = True
-                analysis_thread.start()
+                # Upload + Qwen-VL run on the pipeline workers, overlapping with earlier bursts
+                self.pipeline.submit(screenshots, current_screenshot, placeholder_id)
+                
+                # Capture the next burst while this one is in flight (no-op if the pipeline is full)
+                self._schedule_capture(int(ANALYSIS_CAPTURE_INTERVAL * 1000))
             else:
                 print("未能获取有效截图，跳过分析")
-                self.processing = False
+                self.scene_detector.invalidate()
                 # Try again after a short delay
-                self.app.after(1000, self.trigger_next_capture)
+                self._schedule_capture(1000)
                 
         except Exception as e:
             error_msg = f"捕获/分析出错: {e}"
             print(error_msg)
             self.app.update_status(error_msg)
-            self.processing = False
             # Try again after a delay
-            self.app.after(2000, self.trigger_next_capture)
+            self._schedule_capture(2000)
     
+    def _can_reuse_analysis(self):
+        """Whether the previous analysis still describes the (unchanged) scene"""
+        if self.last_analysis is None or self.scene_detector.has_changed():
+            return False
+        return time.time() - self.last_analysis["timestamp"] < SCENE_MAX_REUSE_SECONDS
+    
+    def _reuse_last_analysis(self):
+        """Record the previous behavior again without uploading or calling Qwen-VL"""
+        behavior_num = self.last_analysis["behavior_num"]
+        behavior_desc = self.last_analysis["behavior_desc"]
+        analysis_text = self.last_analysis["analysis"]
+        
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        logging.info(f"{timestamp}-{behavior_num}-[画面无变化，沿用上次结果] {behavior_desc}")
+        
+        # 仍然记一条观察，保证 observation_history 的时间线连续（只是不再弹占位符/调用 DeepSeek）
+        self.app.add_observation({
+            "timestamp": time.time(),
+            "behavior_num": behavior_num,
+            "behavior_desc": behavior_desc,
+            "analysis": analysis_text
+        })
+        self.app.update_status(f"画面无变化，沿用上次结果: {behavior_desc}")
+        if self.debug:
+            print(f"画面无变化，跳过Qwen-VL分析，沿用: {behavior_num}-{behavior_desc}")
 
-    def _analyze_screenshots(self, screenshots, current_screenshot, placeholder_id):
-        """Analyze screenshots and update UI"""
+    def _run_analysis(self, screenshots):
+        """Pipeline worker stage: upload / encode the burst and get the Qwen-VL analysis text"""
         try:
             self.app.update_status("正在分析图像...")
             
-            # Upload screenshots to OSS
-            screenshot_urls = self._upload_screenshots(screenshots)
+            # Upload screenshots to OSS (or encode them inline, see IMAGE_TRANSPORT)
+            screenshot_urls = self._prepare_image_refs(screenshots)
             
-            if screenshot_urls:
-                print(f"已上传 {len(screenshot_urls)} 张图片，开始分析")
-                
-                # Send for analysis and wait for result (blocking)
-                analysis_text = self._get_image_analysis(screenshot_urls)
-                
-                if analysis_text:
-                    print(f"分析完成，更新占位符: {placeholder_id}")
-                    
-                    # Extract behavior type for logging
-                    behavior_num, behavior_desc = extract_behavior_type(analysis_text)
-                    
-                    # Log the behavior
-                    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    log_message = f"{timestamp}-{behavior_num}-{analysis_text}"
-                    logging.info(log_message)
-                    print(f"行为记录已保存到日志: {behavior_num}-{behavior_desc}")
-                    
-                    # *** 修改：在这里直接操作app的observation_history，确保记录被添加 ***
-                    current_time = time.time()
-                    observation = {
-                        "timestamp": current_time,
-                        "behavior_num": behavior_num,
-                        "behavior_desc": behavior_desc,
-                        "analysis": analysis_text
-                    }
-                    
-                    self.app.observation_history.append(observation)
-                    print(f"WebcamHandler: 已添加新行为到observation_history: {behavior_num}-{behavior_desc}, 当前长度: {len(self.app.observation_history)}")
-                    
-                    # Process the image analysis directly 
-                    if placeholder_id in self.app.placeholder_map:
-                        self.app.update_status("处理分析结果...")
-                        self.app.update_placeholder(
-                            placeholder_id, 
-                            analysis_text, 
-                            screenshots=[current_screenshot] if current_screenshot else []
-                        )
-                    else:
-                        print(f"警告: 找不到占位符 {placeholder_id}，无法更新UI")
-                else:
-                    print("图像分析返回空结果")
-            else:
-                print("未能上传截图，无法进行分析")
+            if not screenshot_urls:
+                print("未能准备截图，无法进行分析")
+                return None
+            
+            print(f"已准备 {len(screenshot_urls)} 张图片 ({IMAGE_TRANSPORT})，开始分析")
+            
+            # Send for analysis and wait for result (blocking this worker only)
+            analysis_text = self._get_image_analysis(screenshot_urls)
+            if not analysis_text:
+                print("图像分析返回空结果")
+            return analysis_text
         except Exception as e:
             error_msg = f"分析截图时出错: {e}"
             print(error_msg)
             self.app.update_status(error_msg)
+            return None
+    
+    def _apply_analysis(self, job, analysis_text):
+        """Pipeline apply stage (in capture order): log, record the observation and update the UI"""
+        placeholder_id = job["placeholder_id"]
+        current_screenshot = job["current_screenshot"]
+        analyzed = False
+        try:
+            if analysis_text:
+                print(f"分析完成，更新占位符: {placeholder_id}")
+                
+                # Extract behavior type for logging
+                behavior_num, behavior_desc = extract_behavior_type(analysis_text)
+                analyzed = True
+                
+                # Log the behavior
+                timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                log_message = f"{timestamp}-{behavior_num}-{analysis_text}"
+                logging.info(log_message)
+                print(f"行为记录已保存到日志: {behavior_num}-{behavior_desc}")
+                
+                # *** 修改：在这里直接操作app的observation_history，确保记录被添加 ***
+                # （流水线保证这里按采集顺序执行，observation_history 的时间线不会乱序）
+                current_time = time.time()
+                observation = {
+                    "timestamp": current_time,
+                    "behavior_num": behavior_num,
+                    "behavior_desc": behavior_desc,
+                    "analysis": analysis_text
+                }
+                
+                self.app.add_observation(observation)
+                self.last_analysis = observation
+                print(f"WebcamHandler: 已添加新行为到observation_history: {behavior_num}-{behavior_desc}, 当前长度: {len(self.app.observation_history)}")
+                
+                # Hand the DeepSeek commentary to the image lane: the pipeline does not wait for it,
+                # and commentary that went stale or was superseded by a newer analysis is skipped
+                if placeholder_id in self.app.placeholder_map:
+                    self.app.update_status("处理分析结果...")
+                    self.app.post_message(2, {
+                        "type": "image_analysis",
+                        "content": analysis_text,
+                        "screenshots": [current_screenshot] if current_screenshot else [],
+                        "placeholder_id": placeholder_id
+                    })
+                else:
+                    print(f"警告: 找不到占位符 {placeholder_id}，无法更新UI")
         finally:
-            # Important: Mark as not processing and trigger next capture
-            self.processing = False
-            # Add a slight delay before next capture
-            self.app.after(1000, self.trigger_next_capture)
+            if not analyzed:
+                # 分析失败时不能沿用旧结果，下一轮必须重新分析
+                self.scene_detector.invalidate()
+            # A pipeline slot frees up once this returns - schedule the next capture
+            # （这里在流水线的 apply 线程上，after() 也交给 UI 分发器在主线程调用）
+            self.app.ui.call(self._schedule_capture, 1000)
 
     
+    def _prepare_image_refs(self, screenshots):
+        """Turn the raw burst into image references Qwen-VL can read: OSS URLs or inline data URLs"""
+        # 按 BURST_LAYOUT / BURST_CROP_PERSON 先裁剪或拼图，减少上传字节和模型的图像 token
+        screenshots = compose_burst(screenshots)
+        if IMAGE_TRANSPORT == "inline":
+            # 跳过 OSS：不上传、Qwen 也不用再从 OSS 拉图，直接把缩小后的 JPEG 以 base64 随请求发送
+            return [encode_inline_image(frame, self.jpeg_encoder) for frame in screenshots]
+        return self._upload_screenshots(screenshots)
+    
     def _get_image_analysis(self, image_urls):
-        """Send images to Qwen-VL API and get analysis text"""
+        """Send images (OSS URLs or base64 data URLs) to Qwen-VL API and get analysis text"""
         try:
             print("调用Qwen-VL API分析图像...")
             
@@ -1048,11 +2504,19 @@ class WebcamHandler:
                 "content": [{"type": "text", "text": "详细观察这个人正在做什么。务必判断他属于以下哪种情况：1.认真专注工作, 2.吃东西, 3.用杯子喝水, 4.喝饮料, 5.玩手机, 6.睡觉, 7.其他。分析他的表情、姿势、手部动作和周围环境来作出判断。使用中文回答，并明确指出是哪种情况。"}]
             }]
             
+            if BURST_LAYOUT == "mosaic":
+                # A single grid image: send it as an image and explain the frame order
+                visual = {"type": "image_url", "image_url": {"url": image_urls[0]}}
+                layout_hint = "这张图由同一个人连续拍摄的几张画面按时间顺序（从左到右、从上到下）拼成网格，请把它们当作连续动作来判断。"
+            else:
+                visual = {"type": "video", "video": image_urls}
+                layout_hint = ""
+            
             message_payload = {
                 "role": "user",
                 "content": [
-                    {"type": "video", "video": image_urls},
-                    {"type": "text", "text": "这个人正在做什么？请判断他是：1.认真专注工作, 2.吃东西, 3.用杯子喝水, 4.喝饮料, 5.玩手机, 6.睡觉, 7.其他。请详细描述你观察到的内容并明确指出判断结果。"}
+                    visual,
+                    {"type": "text", "text": layout_hint + "这个人正在做什么？请判断他是：1.认真专注工作, 2.吃东西, 3.用杯子喝水, 4.喝饮料, 5.玩手机, 6.睡觉, 7.其他。请详细描述你观察到的内容并明确指出判断结果。"}
                 ]
             }
             messages.append(message_payload)
@@ -1080,57 +2544,78 @@ class WebcamHandler:
         print(status)
         
         # If unpausing, trigger next capture
-        if not self.paused and not self.processing:
-            self.app.after(500, self.trigger_next_capture)
+        if not self.paused:
+            self._schedule_capture(500)
     
     def get_current_screenshot(self):
         """Get the most recent webcam image"""
         return self.last_webcam_image
     
     def _capture_screenshots(self, num_shots=4, interval=0.1):
-        """Capture multiple screenshots from webcam for analysis
-           Return both the full set (for analysis) and one current screenshot for display"""
-        screenshots = []
-        for i in range(num_shots):
-            ret, frame = self.cap.read()
-            if not ret:
-                continue
-            
-            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            img = Image.fromarray(frame_rgb)
-            screenshots.append(img)
-            time.sleep(interval)
+        """Sample a burst of frames for analysis from the ring buffer
+           Return both the raw BGR burst (for analysis) and one current screenshot for display"""
+        # 不再直接读摄像头 + sleep（会和 _process_webcam 抢同一个 VideoCapture，还会卡住 Tk 线程 400ms 以上），
+        # 而是从已经采集好的历史帧里按间隔挑帧，只需要几次数组拷贝
+        screenshots = self.frame_buffer.sample(num_shots, interval)
         
-        # Capture one more current frame specifically for display
-        ret, current_frame = self.cap.read()
-        current_screenshot = None
-        if ret:
-            current_frame_rgb = cv2.cvtColor(current_frame, cv2.COLOR_BGR2RGB)
-            current_screenshot = Image.fromarray(current_frame_rgb)
+        # The latest frame doubles as the display screenshot
+        current_screenshot = self.frame_buffer.get_image()
         
         if self.debug:
             print(f"已捕获 {len(screenshots)} 张截图用于分析和 1 张当前截图")
             
         return screenshots, current_screenshot
     
+    def _get_oss_bucket(self):
+        """Return (bucket, executor): the long-lived OSS bucket and the upload pool, read under one lock"""
+        # 原来每次上传都新建 oss2.Auth + oss2.Bucket，连接无法复用；现在只建一次
+        with self._oss_lock:
+            if self._oss_bucket is None:
+                auth = oss2.Auth(OSS_ACCESS_KEY_ID, OSS_ACCESS_KEY_SECRET)
+                session = oss2.Session(pool_size=OSS_CONNECTION_POOL_SIZE)
+                self._oss_bucket = oss2.Bucket(auth, OSS_ENDPOINT, OSS_BUCKET, session=session)
+            if self.upload_executor is None:
+                self.upload_executor = ThreadPoolExecutor(max_workers=OSS_UPLOAD_WORKERS)
+            # 返回局部引用：stop() 可能随时把 self.upload_executor 置空
+            return self._oss_bucket, self.upload_executor
+    
+    def _upload_one(self, bucket, object_key, frame):
+        """Encode one raw BGR frame and PUT it to OSS (runs on the upload pool)"""
+        # Encode the raw BGR frame only now, off the Tk thread (backend / preset: JPEG_BACKEND, JPEG_PRESET)
+        return bucket.put_object(object_key, self.jpeg_encoder.encode(frame))
+    
     def _upload_screenshots(self, screenshots):
-        """Upload screenshots to OSS and return URLs"""
+        """Upload screenshots to OSS in parallel and return URLs in burst order"""
         try:
-            auth = oss2.Auth(OSS_ACCESS_KEY_ID, OSS_ACCESS_KEY_SECRET)
-            bucket = oss2.Bucket(auth, OSS_ENDPOINT, OSS_BUCKET)
+            bucket, executor = self._get_oss_bucket()
             
             if self.debug:
                 print(f"正在上传 {len(screenshots)} 张截图到OSS")
-                
+            
+            # 并行上传：总耗时从 sum(PUT) 变成 max(PUT)
+            # 毫秒时间戳 + 随机批次号：同一秒内的多次抓拍（流水线并发）不会互相覆盖
+            batch_id = f"{int(time.time() * 1000)}_{uuid.uuid4().hex[:8]}"
+            uploads = []
+            try:
+                for i, frame in enumerate(screenshots):
+                    object_key = f"screenshots/{batch_id}_{i}.jpg"
+                    uploads.append((object_key, executor.submit(self._upload_one, bucket, object_key, frame)))
+            except RuntimeError:
+                # stop() 已经关闭了线程池（cannot schedule new futures after shutdown）
+                if self.debug:
+                    print("摄像头已停止，放弃本次上传")
+                return []
+            
             oss_urls = []
-            for i, img in enumerate(screenshots):
-                buffer = io.BytesIO()
-                img.save(buffer, format='JPEG')
-                buffer.seek(0)
-                
-                object_key = f"screenshots/{int(time.time())}_{i}.jpg"
+            for i, (object_key, future) in enumerate(uploads):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    error_msg = f"上传图片 {i+1} 时出错: {e}"
+                    print(error_msg)
+                    self.app.update_status(error_msg)
+                    continue
                 
-                result = bucket.put_object(object_key, buffer)
                 if result.status == 200:
                     url = f"https://{OSS_BUCKET}.{OSS_ENDPOINT}/{object_key}"
                     oss_urls.append(url)
@@ -1152,9 +2637,93 @@ class WebcamHandler:
 
             #上面第一个文件已经有，到时候需要优化
 
+# ---------------- Streaming Reply Chunking ----------------
+SENTENCE_ENDINGS = "。！？!?；;\n"
+CLAUSE_ENDINGS = "，,、：:"
+
+class SentenceChunker:
+    """Split a streamed reply into sentence-sized pieces for TTS"""
+
+    def __init__(self, min_chars=TTS_CHUNK_MIN_CHARS, max_chars=TTS_CHUNK_MAX_CHARS):
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+        self.buffer = ""
+    
+    def _find_cut(self):
+        for i, char in enumerate(self.buffer):
+            if char in SENTENCE_ENDINGS and i + 1 >= self.min_chars:
+                return i + 1
+            # 句子太长还没结束时在逗号处切开，避免第一段语音等太久
+            if char in CLAUSE_ENDINGS and i + 1 >= self.max_chars:
+                return i + 1
+        return None
+    
+    def feed(self, delta):
+        """Add streamed text; return the sentences completed by it"""
+        self.buffer += delta
+        sentences = []
+        cut = self._find_cut()
+        while cut is not None:
+            sentence = self.buffer[:cut].strip()
+            self.buffer = self.buffer[cut:]
+            if sentence:
+                sentences.append(sentence)
+            cut = self._find_cut()
+        return sentences
+    
+    def flush(self):
+        """Return whatever is left once the stream has ended"""
+        rest = self.buffer.strip()
+        self.buffer = ""
+        return rest
+
+# ---------------- Streaming TTS ----------------
+class StreamingTtsCallback(ResultCallback):
+    """Forward the PCM chunks dashscope streams back into a queue; None marks the end"""
+
+    def __init__(self, chunks):
+        super().__init__()
+        self.chunks = chunks
+    
+    def on_data(self, data):
+        self.chunks.put(data)
+    
+    def on_complete(self):
+        self.chunks.put(None)
+    
+    def on_error(self, message):
+        print(f"流式TTS出错: {message}")
+        self.chunks.put(None)
+    
+    def on_close(self):
+        self.chunks.put(None)
+
+class PcmOutputStream:
+    """Persistent PyAudio output stream for 16-bit mono PCM, opened on first write"""
+
+    def __init__(self, rate=TTS_SAMPLE_RATE):
+        self.rate = rate
+        self.audio = None
+        self.stream = None
+    
+    def write(self, data):
+        if self.stream is None:
+            self.audio = pyaudio.PyAudio()
+            self.stream = self.audio.open(format=pyaudio.paInt16, channels=1, rate=self.rate, output=True)
+        self.stream.write(data)
+    
+    def close(self):
+        if self.stream is not None:
+            self.stream.stop_stream()
+            self.stream.close()
+            self.stream = None
+        if self.audio is not None:
+            self.audio.terminate()
+            self.audio = None
+
 class AudioPlayer:
     #是一个文字转语音 (TTS) 播放器的线程化队列处理系统
-    def __init__(self, app):
+    def __init__(self, app, synthesizer_factory=None, sink=None):
         self.app = app
         self.current_audio = None
         self.playing = False
@@ -1164,10 +2733,13 @@ class AudioPlayer:
         # 修改为优先级队列
         self.tts_queue = queue.PriorityQueue()
         #优先级队列：队列中的元素会按照优先级（数字）排序，数字越小优先级越高。
-        # 存放格式是 (priority, timestamp, text)
+        # 存放格式是 (priority, timestamp, text, stream_id)；text 为 None 表示关闭标记
+        self.wait_stats = getattr(app, "queue_stats", None) or QueueWaitStats()
+        #统计每条文本在TTS队列里等了多久（和主程序的消息队列共用一份统计）
         # priority: 优先级，0 最高，数字越大优先级越低
         # timestamp: 请求进入队列的时间
         # text: 要朗读的文字
+        # stream_id: 流式回复的分句属于哪一次回复（0 表示普通的整段文本）
 
 
         self.tts_thread = None
@@ -1175,6 +2747,18 @@ class AudioPlayer:
         
         # 最大队列长度限制
         self.max_queue_size = 1
+        
+        # 流式回复：当前有效的回复编号，被新回复取代后，旧回复剩下的分句全部作废
+        self.stream_lock = threading.Lock()
+        self.stream_counter = 0
+        self.active_stream = 0
+        self.active_stream_priority = None  # 回复还在生成时的优先级，生成结束后为 None
+        
+        # 流式合成：dashscope 回调把 PCM 块交给常驻输出流，不落盘、不起 ffmpeg 解码
+        # synthesizer_factory(callback) 返回带 call(text) 的合成器，sink 需要 write(bytes)；都可以替换成假的用于基准测试
+        self.synthesizer_factory = synthesizer_factory or self._create_streaming_synthesizer
+        self.sink = sink  # 第一次播放时才打开 PcmOutputStream
+        self.last_tts_latency = None  # (首个音频块耗时, 总耗时)，单位秒
     
     def start_tts_thread(self):
         """启动TTS处理线程"""
@@ -1190,52 +2774,80 @@ class AudioPlayer:
         """处理TTS队列中的文本，按优先级播放"""
         while self.tts_running:
             try:
-                if not self.tts_queue.empty() and not self.playing:
-                    #队列不为空 并且 当前没有正在播放音频时才会取任务
-                    # 获取优先级最高的项目 (priority, timestamp, text)
-                    priority, timestamp, text = self.tts_queue.get()
-                    
-                    # 检查是否过期（超过10秒的低优先级消息被视为过期）
-                    # 目的是让旧消息不再打断用户当前的操作。
-                    current_time = time.time()
-                    if priority > 1 and current_time - timestamp > 10:
-                        print(f"忽略过期的TTS请求 (已过{current_time - timestamp:.1f}秒): '{text[:30]}...'")
-                        self.tts_queue.task_done()
-                        #使用queue.task_done()方法通知队列，这样Queue对象就可以知道队列中那一项已经被处理完毕了。
-                        continue
-                    
-                    #表示当前的文本没有过期！可以朗读
-                    print(f"从TTS队列获取文本 (优先级: {priority}): '{text[:30]}...'")
-                    #播放处理
-                    self._synthesize_and_play(text)
+                try:
+                    # 阻塞等待下一条（按优先级），不再 empty() + sleep(0.1) 轮询；超时只是为了复查 tts_running
+                    priority, timestamp, text, stream_id = self.tts_queue.get(timeout=1.0)
+                except queue.Empty:
+                    continue
+                if text is None:
+                    # stop() 放入的关闭标记
                     self.tts_queue.task_done()
-                time.sleep(0.1)
+                    break
+                self.wait_stats.record("tts_stream" if stream_id else f"tts_p{priority}", time.time() - timestamp)
+                # 已被新回复取代的流式分句直接丢弃
+                if stream_id and stream_id != self.active_stream:
+                    self.tts_queue.task_done()
+                    continue
+                
+                # 检查是否过期（超过10秒的低优先级消息被视为过期）
+                # 目的是让旧消息不再打断用户当前的操作。
+                # 流式分句在前面的句子播完之前一直排队，不算过期
+                current_time = time.time()
+                if not stream_id and priority > 1 and current_time - timestamp > 10:
+                    print(f"忽略过期的TTS请求 (已过{current_time - timestamp:.1f}秒): '{text[:30]}...'")
+                    self.tts_queue.task_done()
+                    #使用queue.task_done()方法通知队列，这样Queue对象就可以知道队列中那一项已经被处理完毕了。
+                    continue
+                
+                #表示当前的文本没有过期！可以朗读
+                print(f"从TTS队列获取文本 (优先级: {priority}): '{text[:30]}...'")
+                #播放处理
+                self._synthesize_and_play(text)
+                # 非流式播放在单独的线程里进行：等它播完再取下一条，否则下一条会把这一条打断
+                self._wait_for_playback()
+                self.tts_queue.task_done()
             except Exception as e:
                 print(f"处理TTS队列时出错: {e}")
                 time.sleep(1)
     
 
 
-    def play_text(self, text, priority=2):
+    def _wait_for_playback(self):
+        """Block until the clip started by _play_audio_file_internal has finished or was skipped"""
+        thread = self.play_thread
+        while self.tts_running and thread is not None and thread.is_alive():
+            thread.join(timeout=0.5)
+    
+
+
+    def play_text(self, text, priority=2, stream_id=0):
         """将文本添加到TTS队列，支持优先级
            优先级: 1=用户语音回复(最高), 2=图像分析(普通)
+           stream_id: begin_stream() 返回的编号，表示这是流式回复中的一句，不再清理队列
         """
         if not text or len(text.strip()) == 0:
             print("警告: 尝试播放空文本，已忽略")
             return
         
-
-
-
-        # 清理队列，如果是高优先级请求或队列已满
-        if priority == 1 or self.tts_queue.qsize() >= self.max_queue_size:
-            #如果是最高优先级（1），清空整个队列（马上播放它）。
-            #如果队列满了（max_queue_size 默认 1），丢掉一些旧的任务。
-            self._clean_queue(priority)
-            #调用下面的清理队列函数
-
-
-
+        if stream_id:
+            # 同一次流式回复的后续分句：按顺序排在前面的句子后面，回复已被取代则丢弃
+            if stream_id != self.active_stream:
+                return
+        else:
+            with self.stream_lock:
+                # 更高优先级的回复还在边生成边朗读时，不让普通文本把它清掉
+                if self.active_stream_priority is not None and priority > self.active_stream_priority:
+                    print(f"正在朗读更高优先级的流式回复，忽略TTS请求: '{text[:30]}...'")
+                    return
+                self.active_stream = 0
+                self.active_stream_priority = None
+            
+            # 清理队列，如果是高优先级请求或队列已满
+            if priority == 1 or self.tts_queue.qsize() >= self.max_queue_size:
+                #如果是最高优先级（1），清空整个队列（马上播放它）。
+                #如果队列满了（max_queue_size 默认 1），丢掉一些旧的任务。
+                self._clean_queue(priority)
+                #调用下面的清理队列函数
             
         print(f"添加文本到TTS队列 (优先级: {priority}): '{text[:30]}...'")
         
@@ -1244,7 +2856,29 @@ class AudioPlayer:
             self.start_tts_thread()
         
         # 添加到队列（包含优先级和时间戳）
-        self.tts_queue.put((priority, time.time(), text))
+        self.tts_queue.put((priority, time.time(), text, stream_id))
+    
+    def begin_stream(self, priority=2):
+        """开始一次流式回复的朗读，返回分句要带上的 stream_id；返回 0 表示这次回复不朗读"""
+        with self.stream_lock:
+            if self.active_stream_priority is not None and priority > self.active_stream_priority:
+                print("正在朗读更高优先级的流式回复，这次回复不朗读")
+                return 0
+            self.stream_counter += 1
+            self.active_stream = self.stream_counter
+            self.active_stream_priority = priority
+            stream_id = self.active_stream
+        
+        # 和普通文本一样：高优先级清空队列，否则只保留队列长度上限
+        if priority == 1 or self.tts_queue.qsize() >= self.max_queue_size:
+            self._clean_queue(priority)
+        return stream_id
+    
+    def end_stream(self, stream_id):
+        """回复生成完毕：已排队的分句照常播放，之后的新请求可以正常清理队列"""
+        with self.stream_lock:
+            if stream_id == self.active_stream:
+                self.active_stream_priority = None
     
     def _clean_queue(self, new_priority):
         """清理队列，保留更高优先级的项目"""
@@ -1274,8 +2908,64 @@ class AudioPlayer:
                 break
 
     # 之前的方法保持不变...
+    def _create_streaming_synthesizer(self, callback):
+        """默认的流式合成器：CosyVoice 输出原始 PCM，通过 callback 分块返回"""
+        return SpeechSynthesizer(model=TTS_MODEL, voice=TTS_VOICE,
+                                 format=AudioFormat.PCM_22050HZ_MONO_16BIT, callback=callback)
+    
+    def _synthesize_and_stream(self, text):
+        """流式合成并播放：收到第一个 PCM 块就开始出声（由队列处理器调用，播完才返回）"""
+        self.app.update_status("正在合成语音...")
+        print(f"TTS流式合成: '{text}'")
+        
+        # Set playing status to disable voice detection
+        self.app.is_playing_audio = True
+        self.skip_requested = False
+        self.playing = True
+        
+        start_time = time.time()
+        first_chunk_time = None
+        chunks = queue.Queue()  # 每句话一个队列，被跳过后残留的音频块随它一起丢弃
+        try:
+            if self.sink is None:
+                self.sink = PcmOutputStream()
+            
+            synthesizer = self.synthesizer_factory(StreamingTtsCallback(chunks))
+            # 有 callback 时 call() 可能立即返回，也可能边合成边回调到结束，这里统一靠队列里的 None 判断结束
+            threading.Thread(target=synthesizer.call, args=(text,), daemon=True).start()
+            
+            while not self.skip_requested:
+                try:
+                    data = chunks.get(timeout=TTS_CHUNK_TIMEOUT)
+                except queue.Empty:
+                    print("等待TTS音频块超时")
+                    break
+                if data is None:
+                    break
+                if first_chunk_time is None:
+                    first_chunk_time = time.time() - start_time
+                    print(f"TTS首个音频块耗时: {first_chunk_time:.2f}秒")
+                    self.app.update_status("正在播放语音...")
+                self.sink.write(data)
+            
+            if self.skip_requested:
+                print("音频播放被跳过")
+            self.last_tts_latency = (first_chunk_time, time.time() - start_time)
+        except Exception as e:
+            error_msg = f"TTS错误: {e}"
+            print(error_msg)
+            self.app.update_status(error_msg)
+        
+        self.playing = False
+        # Reset playing status to re-enable voice detection
+        self.app.is_playing_audio = False
+        self.app.update_status("Ready")
+    
     def _synthesize_and_play(self, text):
         """合成并播放语音（内部方法，由队列处理器调用）"""
+        if TTS_STREAMING:
+            return self._synthesize_and_stream(text)
+        
         self.app.update_status("正在合成语音...")
         print(f"TTS合成: '{text}'")
         
@@ -1296,7 +2986,7 @@ class AudioPlayer:
                 self.app.is_playing_audio = False
                 return
             
-            output_file = f'output_{int(time.time())}.mp3'
+            output_file = f'output_{int(time.time() * 1000)}.mp3'  # 流式分句可能在同一秒内合成
             with open(output_file, 'wb') as f:
                 f.write(audio)
             
@@ -1467,6 +3157,13 @@ class AudioPlayer:
         """停止所有播放和处理"""
         self.skip_current()
         self.tts_running = False
+        self.tts_queue.put((0, 0.0, None, 0))  # 关闭标记，优先级最高，TTS 线程立刻醒来退出
+        
+        # 关闭常驻的 PCM 输出流（先等 TTS 线程写完手上的音频块退出）
+        if isinstance(self.sink, PcmOutputStream):
+            if self.tts_thread and self.tts_thread.is_alive():
+                self.tts_thread.join(timeout=1.0)
+            self.sink.close()
         
         # 清空队列
         while not self.tts_queue.empty():
@@ -1486,23 +3183,335 @@ class AudioPlayer:
 
 
 
+# ---------------- UI Dispatch ----------------
+class UIDispatcher:
+    """Marshals UI updates from worker threads onto the Tk loop.
+
+    call() queues an update that runs in order; latest() keeps only the newest update per
+    key (status text, camera preview, streaming bubble text), so redundant ones are
+    coalesced. A single after()-scheduled pump runs the keyed updates and at most
+    `max_calls` ordered ones per tick, which bounds UI work per second regardless of how
+    fast the producers are.
+    """
+    def __init__(self, root, interval_ms=UI_PUMP_INTERVAL, max_calls=UI_MAX_CALLS_PER_TICK):
+        self.root = root
+        self.interval_ms = interval_ms
+        self.max_calls = max_calls
+        self.calls = deque()
+        self.keyed = OrderedDict()
+        self.lock = threading.Lock()
+        self.stopped = False
+        self.started_at = None
+        self.posted = 0
+        self.coalesced = 0  # 被同 key 的新更新取代、没有执行的
+        self.dropped = 0  # 停止后提交的、以及执行出错的（比如控件已经销毁）
+        self.executed = 0
+        self.ticks = 0
+        self.max_backlog = 0
+    
+    def call(self, func, *args, **kwargs):
+        """Run func(*args, **kwargs) on the Tk thread, after everything queued before it"""
+        with self.lock:
+            self.posted += 1
+            if self.stopped:
+                self.dropped += 1
+                return
+            self.calls.append((func, args, kwargs))
+            self.max_backlog = max(self.max_backlog, len(self.calls))
+    
+    def latest(self, key, func, *args, **kwargs):
+        """Like call(), but an update still waiting under the same key is replaced"""
+        with self.lock:
+            self.posted += 1
+            if self.stopped:
+                self.dropped += 1
+                return
+            if key in self.keyed:
+                self.coalesced += 1
+            self.keyed[key] = (func, args, kwargs)
+    
+    def start(self):
+        self.started_at = time.time()
+        self.root.after(self.interval_ms, self._pump)
+    
+    def _pump(self):
+        with self.lock:
+            keyed, self.keyed = self.keyed, OrderedDict()
+            calls = [self.calls.popleft() for _ in range(min(len(self.calls), self.max_calls))]
+        # 合并类更新先执行：同一 tick 里，之后的按顺序调用（比如定稿气泡）总能覆盖它们
+        for func, args, kwargs in list(keyed.values()) + calls:
+            try:
+                func(*args, **kwargs)
+                self.executed += 1
+            except Exception as e:
+                self.dropped += 1
+                print(f"界面更新失败: {e}")
+        self.ticks += 1
+        if not self.stopped:
+            self.root.after(self.interval_ms, self._pump)
+    
+    def stop(self):
+        with self.lock:
+            self.stopped = True
+            self.dropped += len(self.calls) + len(self.keyed)
+            self.calls.clear()
+            self.keyed.clear()
+    
+    def summary(self):
+        elapsed = time.time() - self.started_at if self.started_at else 0
+        rate = self.executed / elapsed if elapsed > 0 else 0
+        return (f"提交 {self.posted}  合并 {self.coalesced}  丢弃 {self.dropped}  执行 {self.executed} "
+                f"({rate:.1f}/秒, {self.ticks} 次)  积压峰值 {self.max_backlog}")
+
+
+# ---------------- Chat Transcript ----------------
+class TranscriptStore:
+    """Every chat bubble as a plain record, so the UI only needs widgets for the newest ones.
+
+    The most recent `memory` records stay in memory; final records are also appended to a
+    JSONL file, from which older history is read back on demand through a seq -> byte offset
+    index. Placeholder records are pending until finish() and are written then; a pending
+    record pushed out of memory is held aside until it is finished. Thumbnails are kept for
+    the newest `thumbnails` records only.
+    """
+    def __init__(self, directory=TRANSCRIPT_DIR, memory=TRANSCRIPT_MEMORY, thumbnails=TRANSCRIPT_THUMBNAILS):
+        self.entries = OrderedDict()  # seq -> record, oldest first
+        self.evicted_pending = {}  # seq -> 被挤出内存但还没定稿的占位记录，finish() 时再写入文件
+        self.written_seqs = []  # 已写入文件的 seq（升序）
+        self.offsets = {}  # seq -> 该记录在文件中的字节偏移
+        self.memory = memory
+        self.max_thumbnails = thumbnails
+        self.thumbnail_seqs = deque()
+        self.next_seq = 0
+        self.lock = threading.Lock()
+        self.path = None
+        self.file = None
+        if directory:
+            try:
+                os.makedirs(directory, exist_ok=True)
+                self.path = os.path.join(directory, datetime.now().strftime("chat_%Y%m%d_%H%M%S.jsonl"))
+                self.file = open(self.path, "ab")
+            except OSError as e:
+                print(f"无法创建聊天记录文件，聊天记录只保存在内存里: {e}")
+                self.path = None
+    
+    def append(self, kind, text, thumbnail=None, pending=False):
+        """Add a record ("ai", "user" or "time") and return it"""
+        with self.lock:
+            entry = {"seq": self.next_seq, "kind": kind, "text": text, "time": time.time(),
+                     "image": thumbnail is not None, "thumbnail": thumbnail, "pending": pending}
+            self.next_seq += 1
+            self.entries[entry["seq"]] = entry
+            if thumbnail is not None:
+                self.thumbnail_seqs.append(entry["seq"])
+                while len(self.thumbnail_seqs) > self.max_thumbnails:
+                    old = self.entries.get(self.thumbnail_seqs.popleft())
+                    if old is not None:
+                        old["thumbnail"] = None
+            if not pending:
+                self._write(entry)
+            while len(self.entries) > self.memory:
+                old_seq, old = self.entries.popitem(last=False)
+                if old["pending"]:
+                    # 还没定稿就写出去会留下占位文字，之后的 finish() 也找不到它
+                    self.evicted_pending[old_seq] = old
+            return entry
+    
+    def _find(self, seq):
+        entry = self.entries.get(seq)
+        if entry is None:
+            entry = self.evicted_pending.get(seq)
+        return entry
+    
+    def get(self, seq):
+        with self.lock:
+            return self._find(seq)
+    
+    def update(self, seq, text):
+        """Change the text of a pending record (e.g. a reply that is still streaming)"""
+        with self.lock:
+            entry = self._find(seq)
+            if entry is not None:
+                entry["text"] = text
+    
+    def finish(self, seq, text):
+        """Set the final text of a placeholder record and write it out"""
+        with self.lock:
+            entry = self._find(seq)
+            if entry is None:
+                return
+            entry["text"] = text
+            if entry["pending"]:
+                entry["pending"] = False
+                self._write(entry)
+            self.evicted_pending.pop(seq, None)
+    
+    def discard(self, seq):
+        with self.lock:
+            self.entries.pop(seq, None)
+            self.evicted_pending.pop(seq, None)
+    
+    def has_before(self, seq):
+        """Whether any record older than seq is left to show (in memory or in the file)"""
+        with self.lock:
+            if self.entries and next(iter(self.entries)) < seq:
+                return True
+            return bool(self.written_seqs) and self.written_seqs[0] < seq
+    
+    def latest(self, count):
+        with self.lock:
+            return list(self.entries.values())[-count:]
+    
+    def before(self, seq, count):
+        """Up to `count` records older than seq, oldest first"""
+        with self.lock:
+            found = [entry for entry in self.entries.values() if entry["seq"] < seq][-count:]
+            oldest_in_memory = next(iter(self.entries), self.next_seq)
+            offsets = []
+            if len(found) < count and self.path:
+                # 内存里不够，按索引只读回需要的那几行（文件按写入顺序排列，占位消息定稿晚，所以按 seq 查索引）
+                limit = min(seq, oldest_in_memory)
+                end = bisect.bisect_left(self.written_seqs, limit)
+                start = max(0, end - (count - len(found)))
+                offsets = [self.offsets[s] for s in self.written_seqs[start:end]]
+        older = []
+        if offsets:
+            with open(self.path, "rb") as f:
+                for offset in offsets:
+                    f.seek(offset)
+                    try:
+                        entry = json.loads(f.readline().decode("utf-8"))
+                    except ValueError:
+                        continue
+                    entry.update(thumbnail=None, pending=False)
+                    older.append(entry)
+        return older + found
+    
+    def _write(self, entry):
+        if self.file is None:
+            return
+        try:
+            record = {key: entry[key] for key in ("seq", "kind", "text", "time", "image")}
+            offset = self.file.tell()
+            self.file.write((json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"))
+            self.file.flush()
+        except (OSError, ValueError) as e:
+            print(f"写入聊天记录失败: {e}")
+            return
+        self.offsets[entry["seq"]] = offset
+        if self.written_seqs and self.written_seqs[-1] > entry["seq"]:
+            bisect.insort(self.written_seqs, entry["seq"])
+        else:
+            self.written_seqs.append(entry["seq"])
+    
+    def close(self):
+        with self.lock:
+            for entry in list(self.evicted_pending.values()) + list(self.entries.values()):
+                if entry["pending"]:
+                    entry["pending"] = False
+                    self._write(entry)
+            self.evicted_pending.clear()
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+
+# ---------------- Placeholder Registry ----------------
+class PlaceholderRegistry:
+    """placeholder_id -> transcript seq of its bubble, plus when it was last touched.
+
+    Used like a dict (`in`, get, pop, item assignment); the bubble widget is reached
+    through the seq in O(1), which stays valid when the widget is released and
+    re-created. stale() lists placeholders nobody has updated for a while, and
+    was_closed() tells whether an ID has already been finalized or discarded.
+    """
+    def __init__(self, remember_closed=256):
+        self.items = {}  # placeholder_id -> [seq, last_touched]
+        self.closed = OrderedDict()  # 最近移除的占位符 ID，迟到的更新据此忽略
+        self.remember_closed = remember_closed
+        self.lock = threading.Lock()
+    
+    def __setitem__(self, placeholder_id, seq):
+        with self.lock:
+            self.items[placeholder_id] = [seq, time.time()]
+    
+    def __getitem__(self, placeholder_id):
+        with self.lock:
+            return self.items[placeholder_id][0]
+    
+    def __delitem__(self, placeholder_id):
+        with self.lock:
+            del self.items[placeholder_id]
+            self._mark_closed(placeholder_id)
+    
+    def __contains__(self, placeholder_id):
+        with self.lock:
+            return placeholder_id in self.items
+    
+    def __len__(self):
+        return len(self.items)
+    
+    def get(self, placeholder_id, default=None):
+        with self.lock:
+            item = self.items.get(placeholder_id)
+            return item[0] if item is not None else default
+    
+    def pop(self, placeholder_id, default=None):
+        with self.lock:
+            item = self.items.pop(placeholder_id, None)
+            # 即使还没登记过也记为已关闭：部分识别结果可能比定稿/丢弃还晚到
+            self._mark_closed(placeholder_id)
+            return item[0] if item is not None else default
+    
+    def was_closed(self, placeholder_id):
+        with self.lock:
+            return placeholder_id in self.closed
+    
+    def _mark_closed(self, placeholder_id):
+        self.closed[placeholder_id] = True
+        while len(self.closed) > self.remember_closed:
+            self.closed.popitem(last=False)
+    
+    def touch(self, placeholder_id):
+        with self.lock:
+            item = self.items.get(placeholder_id)
+            if item is not None:
+                item[1] = time.time()
+    
+    def stale(self, max_age):
+        """(placeholder_id, seq) pairs not touched for more than max_age seconds"""
+        now = time.time()
+        with self.lock:
+            return [(placeholder_id, item[0]) for placeholder_id, item in self.items.items()
+                    if now - item[1] > max_age]
+
+
 # ---------------- UI Class ----------------
 class MultimediaAssistantApp(ctk.CTk):
     def __init__(self):
         super().__init__()
         
-        # Set up priority queue for async processing
-        self.message_queue = queue.PriorityQueue()
-        #优先级消息队列，存放待处理的“任务”（比如语音输入、图像分析结果）。
-        self.processing_thread = None
-        #后台线程对象处理
+        # Set up message lanes for async processing
+        self.lanes = {}
+        #按消息类型分开的处理通道（MessageLane），每个通道有自己的队列和线程数上限：
+        #语音输入通道不会被一次慢吞吞的图像点评（DeepSeek 调用）卡住。在 start_processing_thread() 里创建。
         self.processing_running = False
+        self.image_reply_cancel = threading.Event()
+        #用户说话时置位：正在生成的图像点评立即停止，把 DeepSeek 和 TTS 让给语音回答
+        self.image_reply_cancel_lock = threading.Lock()
+        #“置位 + 入队”和“检查语音通道 + 清除”必须互斥，否则刚到的语音会被图像通道清掉打断标志
+        self.chat_context_lock = threading.Lock()
+        #两个通道都会读写 chat_context，读快照、追加问答都要加锁
         
         # Message sequence tracking (for updating placeholders)
         self.message_id = 0
         #给消息分配递增的 ID。
-        self.placeholder_map = {}  # Maps placeholder IDs to their row indexes
-        #记录 UI 中的占位符位置（比如“正在分析当前画面...”所在的行），方便更新。
+        self.message_id_lock = threading.Lock()
+        #VAD / ASR / 分析线程都会投递消息，分配 ID 时加锁
+        self.queue_stats = QueueWaitStats()
+        #每种消息在队列里等待的时间（入队 -> 被处理线程取出），退出时打印
+        self.placeholder_map = PlaceholderRegistry()  # Maps placeholder IDs to their transcript records
+        #记录 UI 中的占位符（比如“正在分析当前画面...”）对应的聊天记录编号，通过它直接找到气泡更新；长时间没更新的会被清理。
         
         # 先定义系统消息
         # 为什么可以直接这样写？
@@ -1587,8 +3596,18 @@ class MultimediaAssistantApp(ctk.CTk):
 
 
 
+        # 工作线程不直接操作控件：界面更新都交给 UI 分发器，在 Tk 主线程按节拍执行
+        self.ui = UIDispatcher(self)
+        
+        # Chat transcript: a record for every bubble; the chat area only keeps widgets for the newest ones
+        self.transcript = TranscriptStore()
+        self.chat_widgets = OrderedDict()  # seq -> 消息控件，按显示顺序
+        self.chat_at_latest = True  # False: 正在翻看更早的消息，新消息先不显示
+        self.scroll_pending = False
+        
         # Setup UI 初始化：定义的函数在下面
         self.setup_ui()
+        self.ui.start()
         
         # Initialize system components after UI
         #核心功能组件初始化
@@ -1599,6 +3618,10 @@ class MultimediaAssistantApp(ctk.CTk):
         # 这意味着 WebcamHandler 类的所有方法都可以通过 self.webcam_handler 访问。
         self.audio_player = AudioPlayer(self)
         self.voice_detector = VoiceActivityDetector(self)
+        # ASR 工作进程：模型只加载一次并常驻，转录请求通过队列提交
+        # 窗口显示出来之后才启动（见下方 after），加载期间状态栏显示进度
+        self.asr_worker = AsrWorker(self._handle_transcription, on_state=self._on_asr_state,
+                                    on_partial=self._on_partial_transcript)
         #为什么“核心功能组件初始化”要在这里才调用？
         #1.统一管理、可维护性好，所有模块都在这里创建，然后可以随时调用
         #2：模块之间需要主应用类的引用（self.app）
@@ -1632,6 +3655,9 @@ class MultimediaAssistantApp(ctk.CTk):
         # Start background processing启动后台线程
         self.start_processing_thread()
         
+        # Load the ASR model in the background once the window is up
+        self.after(ASR_START_DELAY, self.asr_worker.start)
+        
         # Start webcam after a short delay延迟启动设备
         self.after(1000, self.start_webcam)
         
@@ -1641,6 +3667,9 @@ class MultimediaAssistantApp(ctk.CTk):
         # Start timestamp check
         self.check_timestamp()
         
+        # 定期清理没人更新的孤儿占位气泡
+        self.after(PLACEHOLDER_CHECK_INTERVAL * 1000, self.check_placeholders)
+        
         # Start audio player TTS thread
         self.after(3000, self.audio_player.start_tts_thread)
         # 1000ms 后：启动摄像头。
@@ -1707,7 +3736,7 @@ class MultimediaAssistantApp(ctk.CTk):
         self.chat_frame = ctk.CTkScrollableFrame(self.main_frame)
         #CTkScrollableFrame：带滚动条的容器，方便显示大量聊天记录。这里放所有对话消息（AI 和用户）。
         self.chat_frame.grid(row=0, column=0, sticky="nsew", padx=10, pady=10)
-        self.chat_frame.grid_columnconfigure(0, weight=1)
+        #消息气泡用 pack 依次排列（AI 靠左、用户靠右），只保留最新的 TRANSCRIPT_WINDOW 条，见 _show_new_entry
         
 
 
@@ -1730,12 +3759,16 @@ class MultimediaAssistantApp(ctk.CTk):
         # Instruction label添加操作说明标签，CTk自带的功能函数，用以显示
         self.instruction_label = ctk.CTkLabel(
             self.status_frame, 
-            text="自动语音检测已启用, 'Space' 跳过语音/暂停分析",
+            text="自动语音检测已启用, 'Space' 跳过语音/暂停分析, 'V' 切换语音检测后端",
             font=("Arial", 10)
         )
-        self.instruction_label.grid(row=0, column=1, padx=10, pady=5, sticky="e")
+        self.instruction_label.grid(row=0, column=2, padx=10, pady=5, sticky="e")
         #放在状态栏的右边（sticky="e"）。
 
+        # ASR readiness label 语音识别模型的加载状态
+        self.asr_status_label = ctk.CTkLabel(self.status_frame, text="语音识别: 未启动", font=("Arial", 10))
+        self.asr_status_label.grid(row=0, column=1, padx=10, pady=5, sticky="e")
+
 
         # 检查头像图片是否存在
         ai_avatar_path = "ai_avatar.png"  # 在程序目录下放置此图片
@@ -1751,9 +3784,13 @@ class MultimediaAssistantApp(ctk.CTk):
 
 
 
+        # 聊天区顶部/底部的翻看按钮，需要时才显示（见 _update_history_buttons）
+        self.load_earlier_button = ctk.CTkButton(self.chat_frame, text="加载更早的消息", height=24,
+                                                 command=self.load_earlier_messages)
+        self.latest_button = ctk.CTkButton(self.chat_frame, text="回到最新消息", height=24,
+                                           command=self.show_latest_messages)
+        
         # Add welcome message
-        self.chat_row = 0
-        #记录聊天记录的行号，新增消息会按这个计数往下排。
         self.add_ai_message("欢迎使用多模态助手! 我会实时分析摄像头画面并回应。"
                         "系统已启用自动语音检测，直接说话即可。空格键可跳过当前语音播放并暂停/恢复分析。")
         #把欢迎消息显示在聊天框中（左侧，AI 头像）。这个函数后面会有2300多行左右
@@ -1865,6 +3902,7 @@ class MultimediaAssistantApp(ctk.CTk):
         self.bind("<r>", lambda e: self.start_voice_recording())
         self.bind("<s>", lambda e: self.stop_voice_recording())
         self.bind("<space>", lambda e: self.skip_audio())
+        self.bind("<v>", lambda e: self.cycle_vad_backend())
         #self.bind("<键>", 函数)：绑定窗口内部快捷键。
         # 这里用 lambda e: ... 是因为 Tkinter 绑定的回调默认会接收一个事件参数 e。
         # 举例：
@@ -1874,9 +3912,10 @@ class MultimediaAssistantApp(ctk.CTk):
 
         #全局快捷键（窗口不激活也能用）
         # Also add keyboard module hotkeys for global control
-        keyboard.add_hotkey('r', self.start_voice_recording)
-        keyboard.add_hotkey('s', self.stop_voice_recording)
-        keyboard.add_hotkey('space', self.skip_audio)
+        # （keyboard 的回调在它自己的线程里，交给 UI 分发器到主线程执行）
+        keyboard.add_hotkey('r', lambda: self.ui.call(self.start_voice_recording))
+        keyboard.add_hotkey('s', lambda: self.ui.call(self.stop_voice_recording))
+        keyboard.add_hotkey('space', lambda: self.ui.call(self.skip_audio))
         #keyboard 模块可以监听系统全局按键，即使你点到其他程序也能触发。
 
 
@@ -1886,41 +3925,66 @@ class MultimediaAssistantApp(ctk.CTk):
     
 
     def start_processing_thread(self):
-        #功能： 启动一个后台线程，专门处理消息队列。
-        """Start the background message processing thread"""
-        #必须记住四板斧：
-        #设置状态->创建一个线程指定后台函数->建立守护线程（主程序退出自动关）->启动线程
+        #功能： 启动后台处理通道，分别处理语音输入和图像分析消息。
+        """Start the per-type message lanes (voice input / image analysis)"""
+        #以前只有一个处理线程：一次几秒钟的图像点评（DeepSeek）会把紧接着到来的语音输入堵在后面，
+        #即使优先级队列已经把语音排在了前面。现在两类消息各走各的通道，互不等待。
         self.processing_running = True
-        self.processing_thread = threading.Thread(target=self.process_message_queue)
-        self.processing_thread.daemon = True
-        self.processing_thread.start()
+        self.lanes = {
+            "voice_input": MessageLane("voice", self.handle_message, workers=VOICE_LANE_WORKERS,
+                                       stats=self.queue_stats),
+            "image_analysis": MessageLane("image", self._handle_image_message, workers=IMAGE_LANE_WORKERS,
+                                          stats=self.queue_stats, coalesce=IMAGE_LANE_COALESCE,
+                                          max_age=IMAGE_LANE_MAX_AGE, on_drop=self._drop_image_message),
+        }
+        for lane in self.lanes.values():
+            lane.start()
     
-
-
-    def process_message_queue(self):
-        #功能： 循环从优先级队列取出消息并处理。
-        """Process messages from the priority queue"""
-        #存储内容是 (priority, msg_id, message)。
-        while self.processing_running:
-            try:
-                if not self.message_queue.empty():
-                    # Get message with priority (lower number = higher priority)
-                    priority, msg_id, message = self.message_queue.get()
-                    #→ 取出一条消息（阻塞式或非阻塞式）
-                    print(f"处理消息: 类型={message['type']}, 优先级={priority}, ID={msg_id}")
-                    self.handle_message(message, msg_id)
-                    #→ 根据消息类型做不同的事（比如显示文本、播放音频等）。函数就在下面
-                    self.message_queue.task_done()#告诉队列这条任务已完成。
-                time.sleep(0.05)  # Reduced sleep for more responsiveness，减少CPU占用
-
-            #异常处理
-            except Exception as e:
-                error_msg = f"Error processing message: {e}"
-                print(error_msg)
-                self.update_status(error_msg)
-
-
-
+    def stop_processing_thread(self):
+        """Stop every lane (shutdown sentinels) and wait for the workers to exit"""
+        self.processing_running = False
+        self.image_reply_cancel.set()
+        for lane in self.lanes.values():
+            lane.stop()
+    
+    def _next_message_id(self):
+        """Allocate a message / placeholder number (lanes and analysis threads call this concurrently)"""
+        with self.message_id_lock:
+            msg_id = self.message_id
+            self.message_id += 1
+            return msg_id
+    
+    def post_message(self, priority, message):
+        """Queue a message on its type's lane (lower priority number = handled first)"""
+        message["enqueued_at"] = time.perf_counter()
+        msg_id = self._next_message_id()
+        if message["type"] == "voice_input":
+            # 语音优先：打断正在生成的图像点评
+            with self.image_reply_cancel_lock:
+                self.image_reply_cancel.set()
+                self.lanes[message["type"]].put(priority, msg_id, message)
+        else:
+            self.lanes[message["type"]].put(priority, msg_id, message)
+        return msg_id
+    
+    def _handle_image_message(self, message, msg_id=None):
+        """Image lane handler: a fresh cancel flag for each commentary, then the usual dispatch"""
+        with self.image_reply_cancel_lock:
+            # 语音通道还有排队或正在回答的消息时保留打断标志，这条点评让给语音
+            if not self.lanes["voice_input"].busy():
+                self.image_reply_cancel.clear()
+        self.handle_message(message, msg_id)
+    
+    def _drop_image_message(self, message):
+        """Stale or superseded image analysis: show the analysis text, skip the DeepSeek commentary"""
+        self.last_image_analysis = message["content"]
+        placeholder_id = message.get("placeholder_id")
+        if placeholder_id and placeholder_id in self.placeholder_map:
+            text = f"📷 {message['content']}"
+            self.ui.call(self._finish_stream_bubble, placeholder_id, text)
+        elif not placeholder_id:
+            screenshots = message.get("screenshots") or [None]
+            self.add_ai_message(f"📷 {message['content']}", screenshots[0])
     
     def handle_message(self, message, msg_id=None):
         #从队列里取到一条消息后，根据它的 type（类型）判断是图像分析结果还是语音输入，再分别调用对应的处理方法。
@@ -2005,6 +4069,134 @@ class MultimediaAssistantApp(ctk.CTk):
 
 
 
+    def stream_ai_reply(self, messages, tts_priority=None, cancel=None):
+        """Get a DeepSeek reply and show it in a new chat bubble as tokens arrive.
+
+        With tts_priority set, completed sentences go to the TTS queue while the rest of
+        the reply is still being generated. If the cancel event is set mid-stream the
+        request is closed and the partial reply is returned. API errors propagate.
+        """
+        if not DEEPSEEK_STREAMING:
+            response = deepseek_client.chat.completions.create(
+                model="deepseek-chat",
+                messages=messages,
+                stream=False
+            )
+            assistant_reply = response.choices[0].message.content
+            self.add_ai_message(assistant_reply)
+            if tts_priority is not None:
+                self.audio_player.play_text(assistant_reply, priority=tts_priority)
+            return assistant_reply
+        
+        start_time = time.time()
+        stream = deepseek_client.chat.completions.create(
+            model="deepseek-chat",
+            messages=messages,
+            stream=True
+        )
+        
+        # 先放一个占位气泡，之后直接修改它的文字
+        placeholder_id = self.add_ai_message(STREAM_PLACEHOLDER_TEXT, is_placeholder=True,
+                                             placeholder_id=f"stream_{self._next_message_id()}")
+        stream_id = self.audio_player.begin_stream(tts_priority) if tts_priority is not None else 0
+        chunker = SentenceChunker()
+        first_sentence_sent = False
+        parts = []
+        last_render = 0
+        cancelled = False
+        try:
+            for chunk in stream:
+                if cancel is not None and cancel.is_set():
+                    print("回复被更高优先级的消息打断")
+                    cancelled = True
+                    stream.close()
+                    break
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if not delta:
+                    continue
+                if not parts:
+                    print(f"DeepSeek首个token耗时: {time.time() - start_time:.2f}秒")
+                parts.append(delta)
+                
+                if stream_id:
+                    for sentence in chunker.feed(delta):
+                        if not first_sentence_sent:
+                            print(f"首句送入TTS耗时: {time.time() - start_time:.2f}秒")
+                            first_sentence_sent = True
+                        self.audio_player.play_text(sentence, priority=tts_priority, stream_id=stream_id)
+                
+                # 限制刷新频率，避免每个token都重绘一次
+                now = time.time()
+                if now - last_render >= STREAM_RENDER_INTERVAL:
+                    self.ui.latest(("bubble", placeholder_id), self._update_bubble_text, placeholder_id, "".join(parts))
+                    last_render = now
+            
+            if stream_id and not cancelled:
+                rest = chunker.flush()
+                if rest:
+                    self.audio_player.play_text(rest, priority=tts_priority, stream_id=stream_id)
+        finally:
+            if stream_id:
+                self.audio_player.end_stream(stream_id)
+            assistant_reply = "".join(parts)
+            self.ui.call(self._finish_stream_bubble, placeholder_id,
+                         assistant_reply + "……" if cancelled and assistant_reply else assistant_reply)
+        
+        print(f"DeepSeek回应: {assistant_reply}")
+        return assistant_reply
+    
+    def _reply_with_context(self, user_message, tts_priority=None, cancel=None):
+        """Ask DeepSeek with the shared chat history plus user_message, then record the exchange.
+
+        Both lanes use chat_context: the snapshot is taken under the lock, the request runs
+        without it, and the question/answer pair is appended together afterwards.
+        """
+        with self.chat_context_lock:
+            messages = self.chat_context + [user_message]
+        print(f"调用DeepSeek生成回应，消息历史长度: {len(messages)}")
+        assistant_reply = self.stream_ai_reply(messages, tts_priority=tts_priority, cancel=cancel)
+        
+        with self.chat_context_lock:
+            self.chat_context.append(user_message)
+            self.chat_context.append({"role": "assistant", "content": assistant_reply})
+            # 限制上下文长度，避免超出token限制：保留系统消息和最近的消息
+            if len(self.chat_context) > 20:
+                self.chat_context = [self.chat_context[0]] + self.chat_context[-19:]
+        return assistant_reply
+    
+    def _find_placeholder_label(self, placeholder_id):
+        """Return the text label of a placeholder bubble, or None if it is not on screen"""
+        seq = self.placeholder_map.get(placeholder_id)
+        frame = self.chat_widgets.get(seq) if seq is not None else None
+        return frame.text_label if frame is not None else None
+    
+    def _update_bubble_text(self, placeholder_id, text):
+        """Show interim text (streaming reply / partial transcript) in a placeholder bubble"""
+        seq = self.placeholder_map.get(placeholder_id)
+        if seq is None:
+            return
+        self.transcript.update(seq, text)
+        self.placeholder_map.touch(placeholder_id)
+        label = self._find_placeholder_label(placeholder_id)
+        if label is not None:
+            label.configure(text=text)
+    
+    def _finish_stream_bubble(self, placeholder_id, text):
+        """Show the final reply text and switch the bubble from placeholder to normal style"""
+        text = text or "[DeepSeek 没有返回内容]"
+        label = self._find_placeholder_label(placeholder_id)
+        seq = self.placeholder_map.pop(placeholder_id, None)
+        if seq is not None:
+            # 气泡已经滚出显示窗口时只更新聊天记录，重新显示时就是最终内容
+            self.transcript.finish(seq, text)
+        if label is None:
+            return
+        label.configure(text=text, text_color=("black", "white"))
+        label.master.configure(fg_color=("#EAEAEA", "#2B2B2B"))
+        self.scroll_to_bottom()
+    
     def update_placeholder(self, placeholder_id, new_content, screenshots=None):
         """Update a placeholder message with actual content"""
         #用来把 UI 里“占位的临时文字”（例如“正在分析当前画面...”）替换成真正的分析结果，并根据结果让 AI 回复，还可以播语音。
@@ -2022,59 +4214,12 @@ class MultimediaAssistantApp(ctk.CTk):
                 # Store the analysis for context
                 self.last_image_analysis = new_content
                 
-                # Find the old row number
-                row_num = self.placeholder_map[placeholder_id]
-                #💡 先拿到占位符所在行号。
-                #self.placeholder_map 是个字典：
-                # {
-                #     "img_123": 5,  # 第5行是图像分析占位
-                #     "voice_456": 8 # 第8行是语音输入占位
-                # }
-
-
-
-                # Get the frame within the chat_frame at that row
-                #很抽象这里：
-                #注意：self.chat_frame = ctk.CTkScrollableFrame(self.main_frame)
-
-                for widget in self.chat_frame.winfo_children():
-                #winfo_children() 会返回聊天框里的所有“行”对应的控件（其实是一个个 frame，每一行就是一个小框）。
-                #grid_info()['row']就是用来查控件当前在第几行的。
-                    if int(widget.grid_info()['row']) == row_num:
-                        frame = widget
-                        #如果行号等于 row_num（比如 2），说明找到了那一行。
-                        # Find the text label within the frame
-                        for child in frame.winfo_children():
-                            # 每一行 frame 里可能有很多子控件（头像、名字、文字等），这里要找到：
-                            # 类型是 CTkLabel（文本控件）
-                            # 文字内容等于 "正在分析当前画面..."
-                            #描述 isinstance () 函数来判断一个对象是否是一个已知的类型
-                            #Tkinter中如何获取控件属性的三种方法：使用.cget() 方法、使用.config() 方法和直接访问属性
-                            if isinstance(child, ctk.CTkLabel) and child.cget("text") == "正在分析当前画面...":
-                                # Update the label text
-                                # 把文字更新成分析结果
-                                #new_content 就是摄像头分析的结果文字
-                                child.configure(text=f"📷 {new_content}")
-                                # Change the appearance from placeholder to normal
-                                frame.configure(fg_color=("#EAEAEA", "#2B2B2B"))
-                                child.configure(text_color=("black", "white"))
-                                print(f"成功更新占位符内容")
-                                #让它从“占位灰色”变成“正式内容颜色”。
-                                break
-
-                            #new_content从何而来？到底是什么？
-                            # 来自 handle_message() → 当消息类型是 "image_analysis" 且带 placeholder_id 时：
-                                # self.update_placeholder(
-                                #     placeholder_id, 
-                                #     message["content"],  # 这里就是 new_content
-                                #     screenshots=message.get("screenshots", [])
-                                # )
-                            # 所以 new_content = message["content"]，而 message["content"] 是消息队列里推送的分析结果。
-                            #好，那么handle_message(self, message, msg_id=None)里面的message又是从哪里来的？
-                            #在 process_message_queue() 里有：
-                                # priority, msg_id, message = self.message_queue.get()
-                                # print(f"处理消息: 类型={message['type']}, 优先级={priority}, ID={msg_id}")
-                                # self.handle_message(message, msg_id)，所以收到的是千问的回复！
+                # 把占位气泡的文字换成分析结果（“正在分析当前画面...” → “📷 结果文字”），
+                # 颜色从“占位灰色”变成“正式内容颜色”；气泡已经不在显示窗口里时只更新聊天记录
+                #new_content 就是摄像头分析的结果文字，来自图像通道的 handle_message()：
+                # 消息类型是 "image_analysis" 且带 placeholder_id 时调用 self.update_placeholder(placeholder_id, message["content"], ...)
+                self.ui.call(self._finish_stream_bubble, placeholder_id, f"📷 {new_content}")
+                print(f"成功更新占位符内容")
 
 
 
@@ -2090,32 +4235,16 @@ class MultimediaAssistantApp(ctk.CTk):
                         {"role": "user", "content": f"基于这个观察: {new_content}, 根据检测到的行为类型给出相应回应。如果是工作或喝水，给予鼓励；如果是吃东西、玩手机、喝饮料或睡觉，给予批评和提醒."}
                     ]
                     
-                    response = deepseek_client.chat.completions.create(
-                        model="deepseek-chat",
-                        messages=messages,
-                        stream=False
-                    )
-                    assistant_reply = response.choices[0].message.content
-                    #为什么这样回复：？
-                    # DeepSeek 的返回结构是个 JSON，choices 是一个列表（可能有多条回复）。
-                    # choices[0] → 取第一条回复（一般只返回一条）。
-                    # .message.content → 取这条回复的文本内容。
-                    # 这样才能拿到干净的字符串放到 UI 上。
-
-                    print(f"DeepSeek回应: {assistant_reply}")
-                    
-                    #在聊天框显示 AI 回复。具体函数在比较下面
-                    self.add_ai_message(assistant_reply)
-                    
-                    #用 audio_player 把文字转成语音播放。
-                    self.audio_player.play_text(assistant_reply)
+                    # 流式生成：边生成边显示在聊天框，整句整句地送去 TTS 播放
+                    # （DEEPSEEK_STREAMING=False 时退回到一次性拿完整回复再显示、朗读）
+                    # 用户一说话（语音通道收到消息）就停止生成
+                    self.stream_ai_reply(messages, tts_priority=2, cancel=self.image_reply_cancel)
                 except Exception as e:
                     error_msg = f"DeepSeek API错误: {e}"
                     print(error_msg)
                     self.update_status(error_msg)
                 
-                # Remove the placeholder from our tracking map
-                del self.placeholder_map[placeholder_id]
+                # 占位符由 _finish_stream_bubble 从 placeholder_map 中移除
             
             elif placeholder_id.startswith("voice_"):
                 # This is a voice input placeholder - we'll handle in process_voice_input
@@ -2192,7 +4321,11 @@ class MultimediaAssistantApp(ctk.CTk):
         voice_start_time = time.time()
         
         # 添加用户消息到UI， UI 显示用户的这句话
-        self.add_user_message(text)
+        if placeholder_id and placeholder_id.startswith("voice_"):
+            # 流式识别已经显示了部分文本，把那个占位气泡定稿
+            self.ui.call(self._finalize_user_message, text, placeholder_id)
+        else:
+            self.add_user_message(text)
         
 
         # 定义行为映射表
@@ -2368,40 +4501,16 @@ class MultimediaAssistantApp(ctk.CTk):
         
         # 将用户问题添加到聊天上下文
         user_message = {"role": "user", "content": f"{context_summary}\n\n用户说: {text}"}
-        self.chat_context.append(user_message)
-        
-        # 限制上下文长度
-        if len(self.chat_context) > 20:
-            self.chat_context = [self.chat_context[0]] + self.chat_context[-19:]
         
         try:
-            print(f"调用DeepSeek生成回应，消息历史长度: {len(self.chat_context)}")
-            
-
-
-
             # 使用完整的对话历史发送请求，调用 DeepSeek 生成回复 & 统计耗时
-            response = deepseek_client.chat.completions.create(
-                model="deepseek-chat",
-                messages=self.chat_context,
-                stream=False
-            )
-            assistant_reply = response.choices[0].message.content
-            print(f"DeepSeek回应: {assistant_reply}")
+            # 流式显示回复，第一句生成完就以高优先级开始朗读
+            # （问题和回答在拿到回复后一起写入 chat_context，见 _reply_with_context）
+            self._reply_with_context(user_message, tts_priority=1)
             
             # 记录语音处理结束时间
             voice_end_time = time.time()
             print(f"语音处理总耗时: {voice_end_time - voice_start_time:.2f}秒")
-            
-            # 将AI回应添加到对话历史
-            assistant_message = {"role": "assistant", "content": assistant_reply}
-            self.chat_context.append(assistant_message)
-            
-            # 添加AI回应到聊天记录
-            self.add_ai_message(assistant_reply)
-            
-            # 使用高优先级播放回复
-            self.audio_player.play_text(assistant_reply, priority=1)
         except Exception as e:
             error_msg = f"DeepSeek API error: {e}"
             print(error_msg)
@@ -2439,6 +4548,12 @@ class MultimediaAssistantApp(ctk.CTk):
 
 
 
+    def add_observation(self, observation):
+        """Append to observation_history and keep only the newest OBSERVATION_HISTORY_SIZE entries"""
+        # 流水线 apply 线程、Tk 线程（沿用上次结果）和图像通道都会追加，统一在这里截断
+        self.observation_history.append(observation)
+        del self.observation_history[:-OBSERVATION_HISTORY_SIZE]
+    
     def process_image_analysis(self, analysis_text, image_urls, screenshots, placeholder_id=None):
         #，核心功能是处理图像分析结果，并根据分析到的用户行为（比如工作、吃饭、玩手机等）进行跟踪、记录，
         # 最终生成 AI 回应（甚至可能通过语音播放）。可以理解为一个 “行为监测与智能反馈系统” 的核心处理逻辑。
@@ -2472,15 +4587,12 @@ class MultimediaAssistantApp(ctk.CTk):
             "analysis": analysis_text
         }
         
-        # 将观察添加到历史记录，保留最近20条
-        self.observation_history.append(observation)
+        # 将观察添加到历史记录，保留最近 OBSERVATION_HISTORY_SIZE 条
+        self.add_observation(observation)
         #为什么这么做？：方便后续查询 “用户最近做了什么”，比如用户问 “我刚才在干嘛”，就可以从这个列表里找答案。
         
         # 调试信息：确认添加成功
         print(f"已添加新行为到observation_history: {behavior_num}-{behavior_desc}, 当前长度: {len(self.observation_history)}")
-        
-        if len(self.observation_history) > 20:
-            self.observation_history.pop(0)  # 保留最近20条
             
 
         # 更新行为计数器
@@ -2616,39 +4728,16 @@ class MultimediaAssistantApp(ctk.CTk):
         
         # 添加当前观察到聊天上下文，更新聊天上下文（给 AI 的历史对话）
         user_message = {"role": "user", "content": f"观察结果: {analysis_text}\n\n{prompt_instruction}"}
-        self.chat_context.append(user_message)
-        
-        # 限制上下文长度，避免超出token限制
-        if len(self.chat_context) > 20:  # 保留最近20条消息
-            # 保留系统消息和最近的消息
-            self.chat_context = [self.chat_context[0]] + self.chat_context[-19:]
-        
-
-
 
         #调用 AI 模型生成回应 & 处理结果
         try:
-            print(f"调用DeepSeek生成回应，消息历史长度: {len(self.chat_context)}")
-            
             # 使用完整的聊天上下文
-            response = deepseek_client.chat.completions.create(
-                model="deepseek-chat",
-                messages=self.chat_context,  # 使用累积的对话历史
-                stream=False
+            # 流式显示回复；只有在需要提醒或鼓励时才朗读；用户一说话就停止生成
+            self._reply_with_context(
+                user_message,
+                tts_priority=2 if (should_remind or should_encourage) else None,
+                cancel=self.image_reply_cancel
             )
-            assistant_reply = response.choices[0].message.content
-            print(f"DeepSeek回应: {assistant_reply}")
-            
-            # 将AI回应也添加到对话历史
-            assistant_message = {"role": "assistant", "content": assistant_reply}
-            self.chat_context.append(assistant_message)
-            
-            # 添加AI回应到聊天记录
-            self.add_ai_message(assistant_reply)
-            
-            # 只有在需要提醒或鼓励时才播放语音
-            if should_remind or should_encourage:
-                self.audio_player.play_text(assistant_reply, priority=2)
         except Exception as e:
             error_msg = f"DeepSeek API error: {e}"
             print(error_msg)
@@ -2667,6 +4756,21 @@ class MultimediaAssistantApp(ctk.CTk):
 
 
 
+    def check_placeholders(self):
+        """Finalize placeholders nobody has updated within PLACEHOLDER_TTL (e.g. a failed image analysis)"""
+        for placeholder_id, seq in self.placeholder_map.stale(PLACEHOLDER_TTL):
+            print(f"占位符超时，不再等待: {placeholder_id}")
+            if placeholder_id.startswith("voice_"):
+                self._discard_partial_transcript(placeholder_id)
+            elif placeholder_id.startswith("img_"):
+                self._finish_stream_bubble(placeholder_id, "📷 [画面分析失败或超时]")
+            else:
+                # 流式回复等：保留已经显示的内容
+                entry = self.transcript.get(seq)
+                self._finish_stream_bubble(placeholder_id, entry["text"] if entry else "")
+        
+        self.after(PLACEHOLDER_CHECK_INTERVAL * 1000, self.check_placeholders)
+    
     def check_timestamp(self):
         """Check if we need to display a new timestamp"""
         current_time = time.time()
@@ -2683,24 +4787,25 @@ class MultimediaAssistantApp(ctk.CTk):
         now = datetime.now()
         time_str = now.strftime("%m月%d日 %H:%M")
         
+        entry = self.transcript.append("time", time_str)
+        self.ui.call(self._show_new_entry, entry)
+    
+    def _build_timestamp(self, entry):
         # Create timestamp frame
         timestamp_frame = ctk.CTkFrame(self.chat_frame, fg_color=("#E0E0E0", "#3F3F3F"), corner_radius=15)
-        timestamp_frame.grid(row=self.chat_row, column=0, pady=5)
-        self.chat_row += 1
         
         # Add timestamp label - 使用自定义时间戳字体
         timestamp_label = ctk.CTkLabel(
             timestamp_frame, 
-            text=time_str,
+            text=entry["text"],
             font=self.timestamp_font,
             fg_color="transparent",
             padx=10,
             pady=2
         )
         timestamp_label.grid(row=0, column=0)
-        
-        # Scroll to bottom
-        self.scroll_to_bottom()
+        timestamp_frame.text_label = timestamp_label
+        return timestamp_frame
     
 
 
@@ -2723,31 +4828,45 @@ class MultimediaAssistantApp(ctk.CTk):
         #生成占位符 ID（临时消息的唯一标识）
         #如果是占位符消息且没提供 ID，自动生成一个唯一 ID（比如 ai_0、ai_1），方便后续更新这条临时消息。
         if is_placeholder and not placeholder_id:
-            placeholder_id = f"ai_{self.message_id}"
-            self.message_id += 1
+            placeholder_id = f"ai_{self._next_message_id()}"
         
         print(f"添加AI消息: 长度={len(text)}, 有截图={screenshot is not None}, 是占位符={is_placeholder}, ID={placeholder_id}")
         
+        # 截图先缩成缩略图存进聊天记录（避免修改原图，限制最大尺寸为200x150），气泡重新显示时还能用
+        thumbnail = None
+        if screenshot is not None:
+            try:
+                thumbnail = screenshot.copy()
+                thumbnail.thumbnail((200, 150))
+            except Exception as e:
+                # 图片无效（比如没有copy方法）或损坏：只显示错误提示，不崩溃
+                print(f"图像处理错误: {e}")
+                thumbnail = None
+                text = f"[图像处理错误: {e}]\n{text}"
+        
+        entry = self.transcript.append("ai", text, thumbnail, pending=is_placeholder)
+        
+        # Store placeholder record if needed
+        if is_placeholder and placeholder_id:
+            self.placeholder_map[placeholder_id] = entry["seq"]
+            print(f"存储占位符 {placeholder_id} 在记录 {entry['seq']}")
+        #作用：如果是占位符消息，把它的 ID 和聊天记录编号存到 self.placeholder_map 字典中，后续需要更新时通过 ID 找到对应的气泡。
+        
+        # 记录和占位符在调用线程里同步登记，控件交给 UI 分发器在主线程创建
+        self.ui.call(self._show_new_entry, entry)
+        
+        # Return placeholder id if applicable
+        return placeholder_id if is_placeholder else None
+    
+    def _build_ai_bubble(self, entry):
         # Create message frame
         #创建一个 “消息容器”（CTkFrame 组件），用于包裹 AI 的头像、名称、文本、图片等内容。
         message_frame = ctk.CTkFrame(self.chat_frame, fg_color=("#EAEAEA", "#2B2B2B"))
-        message_frame.grid(row=self.chat_row, column=0, sticky="w", padx=5, pady=5)
         message_frame.grid_columnconfigure(1, weight=1)
         #重温细节：
             # fg_color=("#EAEAEA", "#2B2B2B")：设置背景色（浅色模式为浅灰，深色模式为深灰）；
-            # grid(row=self.chat_row, ...)：通过 grid 布局放在聊天区域（self.chat_frame）的第 self.chat_row 行（确保消息按顺序显示）；
-            # sticky="w"：消息左对齐（AI 消息通常靠左显示，用户消息靠右）；
+            # 由 _render_entry 用 pack(anchor="w") 放进聊天区域（self.chat_frame），AI 消息靠左显示，用户消息靠右；
             # grid_columnconfigure(1, weight=1)：第 1 列（文本 / 图片列）设置权重 1，确保内容能自适应窗口宽度。
-                    
-        # Store placeholder row if needed
-        if is_placeholder and placeholder_id:
-            self.placeholder_map[placeholder_id] = self.chat_row
-            print(f"存储占位符 {placeholder_id} 在行 {self.chat_row}")
-        #作用：如果是占位符消息，把它的 ID 和所在的行号存到 self.placeholder_map 字典中，后续需要更新时通过 ID 找到对应的行。
-        
-
-        self.chat_row += 1
-        ## 行号+1，下次添加消息时会显示在新行
 
         # Add avatar
         avatar_label = ctk.CTkLabel(message_frame, image=self.ai_avatar, text="")
@@ -2769,76 +4888,44 @@ class MultimediaAssistantApp(ctk.CTk):
 
 
         # Add screenshot if provided
-        #这部分是核心，负责在消息中显示截图：
-        if screenshot is not None:
-            try:
-                # 创建图片容器（避免图片和文字挤在一起）
-                img_frame = ctk.CTkFrame(message_frame, fg_color="transparent")
-                img_frame.grid(row=1, column=1, sticky="w", padx=5, pady=5)
-                
-                # 检查图片是否有效（是否有copy方法，确保是PIL Image对象）
-                if hasattr(screenshot, 'copy'):
-                    # Resize the image for display
-                    img_resized = screenshot.copy()# 复制原图（避免修改原图）
-                    img_resized.thumbnail((200, 150))# 限制最大尺寸为200x150
-                    
-                    # 转换为CTk支持的图片格式（CTkImage）
-                    ctk_img = ctk.CTkImage(
-                        light_image=img_resized,  # 浅色模式图片
-                        dark_image=img_resized,  # 深色模式图片（这里和浅色一样）
-                        size=(200, 150)  # 显示尺寸
-                    )
-                    
-                    # 创建图片标签并显示
-                    img_label = ctk.CTkLabel(img_frame, image=ctk_img, text="")
-                    img_label.grid(row=0, column=0, padx=2, pady=2)
-                    
-                    # 关键：保留图片引用，防止被Python垃圾回收机制删除
-                    img_label.image = ctk_img
-                    
-                    print(f"成功添加图片: {img_resized.size}")
-                else:
-                    ## 图片无效（没有copy方法）
-                    error_msg = "图像对象无copy属性"
-                    print(error_msg)
-                    error_label = ctk.CTkLabel(img_frame, text=f"[图像处理错误: {error_msg}]")
-                    error_label.grid(row=0, column=0, padx=2, pady=2)
-            except Exception as e:
-                # 其他图像处理错误（比如图片损坏）
-                print(f"图像处理错误: {e}")
-                error_label = ctk.CTkLabel(message_frame, text=f"[图像处理错误: {str(e)}]")
-                error_label.grid(row=1, column=1, padx=5, pady=5, sticky="w")
+        #这部分负责在消息中显示截图（缩略图在 add_ai_message 里已经生成好）：
+        text_row = 1
+        if entry["thumbnail"] is not None:
+            # 创建图片容器（避免图片和文字挤在一起）
+            img_frame = ctk.CTkFrame(message_frame, fg_color="transparent")
+            img_frame.grid(row=1, column=1, sticky="w", padx=5, pady=5)
             
-                # 作用：如果有截图，将图片处理后显示在消息中（头像右侧、名称下方），并在图片下方显示文本。
+            # 转换为CTk支持的图片格式（CTkImage）
+            ctk_img = ctk.CTkImage(
+                light_image=entry["thumbnail"],  # 浅色模式图片
+                dark_image=entry["thumbnail"],  # 深色模式图片（这里和浅色一样）
+                size=(200, 150)  # 显示尺寸
+            )
+            
+            # 创建图片标签并显示
+            img_label = ctk.CTkLabel(img_frame, image=ctk_img, text="")
+            img_label.grid(row=0, column=0, padx=2, pady=2)
+            
+            # 关键：保留图片引用，防止被Python垃圾回收机制删除
+            img_label.image = ctk_img
+            text_row = 2
+            
+                # 作用：如果有截图，将图片显示在消息中（头像右侧、名称下方），并在图片下方显示文本。
                 # 关键细节：
-                # 图片缩放：thumbnail((200, 150)) 确保图片不会太大，避免界面混乱；
                 # 格式转换：CTkImage 是 customtkinter 专用的图片格式，必须转换才能显示；
                 # 保留引用：img_label.image = ctk_img 非常重要！如果不保留，Python 会自动删除图片数据，界面上图片会消失；
-                # 错误处理：如果图片无效或处理失败，显示错误提示（而不是崩溃）。
+                # 更早的记录已经释放了缩略图（TRANSCRIPT_THUMBNAILS），重新显示时只有文字。
 
-            text_label = ctk.CTkLabel(message_frame, text=text, wraplength=600, justify="left", 
-                                     anchor="w", fg_color="transparent")
-            text_label.grid(row=2, column=1, sticky="w", padx=5, pady=5)
-        else:
-            #纯文本消息显示（无截图时）
-            text_label = ctk.CTkLabel(message_frame, text=text, wraplength=600, justify="left", 
-                                     anchor="w", fg_color="transparent")
-            text_label.grid(row=1, column=1, sticky="w", padx=5, pady=5)
+        text_label = ctk.CTkLabel(message_frame, text=entry["text"], wraplength=600, justify="left", 
+                                 anchor="w", fg_color="transparent")
+        text_label.grid(row=text_row, column=1, sticky="w", padx=5, pady=5)
+        message_frame.text_label = text_label
         
         #调整占位符样式（区分临时消息）
-        if is_placeholder:
+        if entry["pending"]:
             message_frame.configure(fg_color=("#F5F5F5", "#3B3B3B"))
-            if screenshot is not None:
-                text_label.configure(text_color=("#888888", "#AAAAAA"))
-            else:
-                text_label.configure(text_color=("#888888", "#AAAAAA"))
-        
-        #滚动到最底部（显示最新消息）
-        self.after(100, self.scroll_to_bottom)# 100毫秒后调用滚动方法
-        #作用：添加消息后，自动滚动聊天窗口到底部，确保用户能看到最新消息。
-        
-        # Return placeholder id if applicable
-        return placeholder_id if is_placeholder else None
+            text_label.configure(text_color=("#888888", "#AAAAAA"))
+        return message_frame
     
 
 
@@ -2869,20 +4956,25 @@ class MultimediaAssistantApp(ctk.CTk):
         
         #  生成用户占位符 ID
         if is_placeholder and not placeholder_id:
-            placeholder_id = f"user_{self.message_id}"
-            self.message_id += 1
+            placeholder_id = f"user_{self._next_message_id()}"
             print(f"生成新占位符ID: {placeholder_id}")
         
-        #  创建用户消息容器（Frame）
-        message_frame = ctk.CTkFrame(self.chat_frame, fg_color=("#C7E9C0", "#2D3F2D"))
-        message_frame.grid(row=self.chat_row, column=0, sticky="e", padx=5, pady=5)
+        entry = self.transcript.append("user", text, pending=is_placeholder)
         
-        # S存储用户占位符位置
+        # 存储用户占位符对应的记录
         if is_placeholder and placeholder_id:
-            self.placeholder_map[placeholder_id] = self.chat_row
-            print(f"存储占位符 {placeholder_id} 在行 {self.chat_row}")
-            
-        self.chat_row += 1
+            self.placeholder_map[placeholder_id] = entry["seq"]
+            print(f"存储占位符 {placeholder_id} 在记录 {entry['seq']}")
+        
+        self.ui.call(self._show_new_entry, entry)
+        
+        # Return placeholder id if applicable
+        return placeholder_id if is_placeholder else None
+        #add_user_message 是专门为 “用户消息” 设计的 UI 渲染方法
+    
+    def _build_user_bubble(self, entry):
+        #  创建用户消息容器（Frame）
+        message_frame = ctk.CTkFrame(self.chat_frame, fg_color=("#C7E9C0", "#2D3F2D"))
         
         # Add avatar
         avatar_label = ctk.CTkLabel(message_frame, image=self.user_avatar, text="")
@@ -2894,51 +4986,124 @@ class MultimediaAssistantApp(ctk.CTk):
         name_label.grid(row=0, column=0, sticky="e", padx=5, pady=(5, 0))
         
         # Add text
-        text_label = ctk.CTkLabel(message_frame, text=text, wraplength=600, justify="right", 
+        text_label = ctk.CTkLabel(message_frame, text=entry["text"], wraplength=600, justify="right", 
                                   anchor="e", fg_color="transparent")
         text_label.grid(row=1, column=0, sticky="e", padx=5, pady=5)
+        message_frame.text_label = text_label
         
         # Mark as placeholder with different color if needed
-        if is_placeholder:
+        if entry["pending"]:
             message_frame.configure(fg_color=("#DCF0D5", "#394639"))
             text_label.configure(text_color=("#888888", "#AAAAAA"))
-        
-        # Scroll to bottom
-        self.after(100, self.scroll_to_bottom)
-        
-        # Return placeholder id if applicable
-        return placeholder_id if is_placeholder else None
-        #add_user_message 是专门为 “用户消息” 设计的 UI 渲染方法
+        return message_frame
+    
 
 
 
 
+    # ---------------- Chat Window ----------------
+    # 聊天区只为最新的 TRANSCRIPT_WINDOW 条记录保留控件，更早的消息留在 self.transcript 里，
+    # 需要时通过“加载更早的消息”重新创建；控件数量和布局开销不会随着使用时间增长。
+    
+    def _render_entry(self, entry, before=None):
+        """Create the widget for a record; at the bottom, or above `before` when given"""
+        builders = {"ai": self._build_ai_bubble, "user": self._build_user_bubble, "time": self._build_timestamp}
+        anchors = {"ai": "w", "user": "e", "time": "center"}
+        frame = builders[entry["kind"]](entry)
+        frame.pack(anchor=anchors[entry["kind"]], padx=5, pady=5, before=before)
+        self.chat_widgets[entry["seq"]] = frame
+        if before is not None:
+            self.chat_widgets.move_to_end(entry["seq"], last=False)
+        return frame
+    
+    def _show_new_entry(self, entry):
+        """Show a new record at the bottom of the chat and release the oldest widgets"""
+        if self.transcript.get(entry["seq"]) is None:
+            return  # 还没显示就被丢弃了（比如被取消的部分识别结果）
+        if not self.chat_at_latest:
+            # 正在翻看更早的消息：新消息只进聊天记录，点“回到最新消息”再显示
+            self.latest_button.configure(text="回到最新消息（有新消息）")
+            return
+        self._render_entry(entry)
+        while len(self.chat_widgets) > TRANSCRIPT_WINDOW:
+            _, frame = self.chat_widgets.popitem(last=False)
+            frame.destroy()
+        self._update_history_buttons()
+        self.scroll_to_bottom()
+    
+    def _update_history_buttons(self):
+        """Show "load earlier" above the oldest bubble when there is more history, and
+        "back to latest" at the bottom while the newest messages are not shown"""
+        first = next(iter(self.chat_widgets), None)
+        if first is not None and self.transcript.has_before(first):
+            if not self.load_earlier_button.winfo_manager():
+                self.load_earlier_button.pack(pady=5, before=self.chat_widgets[first])
+        else:
+            self.load_earlier_button.pack_forget()
+        
+        if self.chat_at_latest:
+            self.latest_button.pack_forget()
+        elif not self.latest_button.winfo_manager():
+            self.latest_button.pack(pady=5)
+    
+    def load_earlier_messages(self):
+        """Re-create the bubbles just above the oldest one on screen"""
+        first = next(iter(self.chat_widgets), None)
+        if first is None:
+            return
+        entries = self.transcript.before(first, TRANSCRIPT_LOAD_STEP)
+        if not entries:
+            self.load_earlier_button.pack_forget()
+            return
+        for entry in reversed(entries):
+            self._render_entry(entry, before=next(iter(self.chat_widgets.values())))
+        
+        # 控件总数仍有上限：超出时释放最底部的气泡，新消息要点“回到最新消息”才显示
+        while len(self.chat_widgets) > TRANSCRIPT_WINDOW + TRANSCRIPT_LOAD_STEP:
+            _, frame = self.chat_widgets.popitem(last=True)
+            frame.destroy()
+            self.chat_at_latest = False
+        self._update_history_buttons()
+    
+    def show_latest_messages(self):
+        """Drop the history view and show the newest TRANSCRIPT_WINDOW records again"""
+        for frame in self.chat_widgets.values():
+            frame.destroy()
+        self.chat_widgets.clear()
+        self.chat_at_latest = True
+        self.latest_button.configure(text="回到最新消息")
+        for entry in self.transcript.latest(TRANSCRIPT_WINDOW):
+            self._render_entry(entry)
+        self._update_history_buttons()
+        self.scroll_to_bottom()
 
     def scroll_to_bottom(self):
         """更可靠地滚动聊天视图到底部"""
+        # 连续添加多条消息时只滚动一次
+        if self.scroll_pending:
+            return
+        self.scroll_pending = True
         try:
             # 使用after方法确保在UI更新后执行滚动
-            self.after(10, lambda: self._do_scroll_to_bottom())
+            self.after(100, self._do_scroll_to_bottom)
         except Exception as e:
+            self.scroll_pending = False
             print(f"Scroll error: {e}")
 
 
 
     def _do_scroll_to_bottom(self):
         """实际执行滚动的内部方法"""
+        self.scroll_pending = False
         try:
             # 获取可滚动区域的画布
             canvas = self.chat_frame._parent_canvas
             
-            # 获取画布的内容高度
+            # 获取画布的内容高度（控件数量有上限，这里的布局更新开销是固定的）
             canvas.update_idletasks()  # 确保更新布局
             
             # 明确设置滚动区域底部位置
             canvas.yview_moveto(1.0)
-            
-            # 额外的方法确保滚动到底部
-            canvas.update_idletasks()
-            canvas.yview_scroll(1000000, "units")  # 大数字确保滚动到底部
         except Exception as e:
             print(f"Detailed scroll error: {e}")
             
@@ -2949,19 +5114,19 @@ class MultimediaAssistantApp(ctk.CTk):
         pass
     
     def update_status(self, text):
-        """Update the status message"""
-        self.status_label.configure(text=text)
+        """Update the status message (from any thread; only the newest text per UI tick is drawn)"""
+        self.ui.latest("status", self.status_label.configure, text=text)
     
     def analyze_images(self, image_urls, screenshots, current_screenshot, placeholder_id=None):
         #核心功能是将图像发送给 Qwen-VL 视觉语言模型 API 进行分析，判断用户当前的行为（如工作、吃东西、玩手机等），
         # 并将分析结果传递给后续流程处理。它是连接 “图像采集” 和 “行为分析反馈” 的关键环节。
         #         参数说明：
         # self：类实例本身（访问类变量和方法）；
-        # image_urls：图像的 URL 列表（已上传到 OSS 等存储，供 API 访问）；
+        # image_urls：WebcamHandler._prepare_image_refs() 的结果（OSS 公网 URL、data URL，BURST_LAYOUT="mosaic" 时是一张拼图）；
         # screenshots：截图数据（可能用于后续 UI 显示）；
         # current_screenshot：当前截图（用于后续在 UI 中展示对应的分析结果）；
         # placeholder_id：UI 中对应的占位符 ID（后续用分析结果更新这个占位符）。
-        """Send images to Qwen-VL for analysis"""
+        """Send images (OSS URLs or inline data URLs) to Qwen-VL for analysis"""
         #检查图像 URL 是否有效
         if not image_urls:
             print("没有图像URL可供分析")
@@ -2971,30 +5136,12 @@ class MultimediaAssistantApp(ctk.CTk):
         self.update_status("正在分析图像...")
         print(f"分析图像: {len(image_urls)} URLs, 占位符ID: {placeholder_id}")
         
-        #构建发送给 Qwen-VL 的消息
-        messages = [{
-            "role": "system",
-            "content": [{"type": "text", "text": "详细观察这个人正在做什么。务必判断他属于以下哪种情况：1.认真专注工作, 2.吃东西, 3.用杯子喝水, 4.喝饮料, 5.玩手机, 6.睡觉, 7.其他。分析他的表情、姿势、手部动作和周围环境来作出判断。使用中文回答，并明确指出是哪种情况。"}]
-        }]
-        
-        message_payload = {
-            "role": "user",
-            "content": [
-                {"type": "video", "video": image_urls},
-                {"type": "text", "text": "这个人正在做什么？请判断他是：1.认真专注工作, 2.吃东西, 3.用杯子喝水, 4.喝饮料, 5.玩手机, 6.睡觉, 7.其他。请详细描述你观察到的内容并明确指出判断结果。"}
-            ]
-        }
-        messages.append(message_payload)
-        
-        #调用 Qwen-VL API 获取分析结果
+        #调用 Qwen-VL API 获取分析结果：和定时抓拍走同一个实现，
+        #消息格式跟随 IMAGE_TRANSPORT / BURST_LAYOUT（视频帧序列或拼图），这里不再另写一份
         try:
-            print("调用Qwen-VL API进行图像分析...")
-            completion = qwen_client.chat.completions.create(
-                model="qwen-vl-max",
-                messages=messages,
-            )
-            analysis_text = completion.choices[0].message.content
-            print(f"图像分析完成，分析长度: {len(analysis_text)} 字符")
+            analysis_text = self.webcam_handler._get_image_analysis(image_urls)
+            if not analysis_text:
+                return
             
            # 从分析文本中提取行为编号和描述（调用之前学过的extract_behavior_type函数）
             behavior_num, behavior_desc = extract_behavior_type(analysis_text)
@@ -3009,9 +5156,8 @@ class MultimediaAssistantApp(ctk.CTk):
             # Add to message queue for processing with appropriate priority
             # Priority 2 for normal image analysis (voice input would be priority 1)
             print("添加分析结果到消息队列")
-            self.message_queue.put((
+            self.post_message(
                 2, # 优先级（数字越小优先级越高，图像分析为2，语音输入为1）
-                self.message_id,  # message id for sequence
                 {
                     "type": "image_analysis",
                     "content": analysis_text,
@@ -3019,16 +5165,15 @@ class MultimediaAssistantApp(ctk.CTk):
                     "screenshots": [current_screenshot] if current_screenshot else [],
                     "placeholder_id": placeholder_id
                 }
-            ))
+            )
             #将分析结果封装成消息，放入优先级队列（message_queue），由后台线程（process_message_queue）处理。
-            self.message_id += 1
             
         except Exception as e:
             error_msg = f"Qwen-VL API error: {e}"
             print(error_msg)
             self.update_status(error_msg)
     
-    def transcribe_audio(self, audio_file, priority=False, placeholder_id=None):
+    def transcribe_audio(self, audio, priority=False, placeholder_id=None):
         #核心功能是将录制的音频文件通过 ASR（自动语音识别）模型（这里用的是 SenseVoice）转录成文本，
         # 并将转录结果放入消息队列供后续处理（比如生成 AI 回应）
 
@@ -3037,55 +5182,87 @@ class MultimediaAssistantApp(ctk.CTk):
 
         #         参数说明：
         # self：类实例本身（访问类变量和方法）；
-        # audio_file：音频文件路径（需要转录的音频，比如 speech_123.wav）；
+        # audio：需要转录的音频——float32 采样数组（RATE 采样率，VAD/录音直接传入），或音频文件路径；
         # priority：是否为高优先级（True 表示语音输入需要优先处理，比如用户主动说话）；
         # placeholder_id：对应的 UI 占位符 ID（后续用转录结果更新这个占位符）。
         """Transcribe recorded audio using SenseVoice"""
         self.update_status("正在转录语音...")
-        print(f"转录音频: {audio_file}, 优先级: {priority}, 占位ID: {placeholder_id}")
         
         try:
-            # 前置检查：音频文件是否有效
-            if not os.path.exists(audio_file):
-                error_msg = f"音频文件不存在: {audio_file}"
-                print(error_msg)
-                self.update_status(error_msg)
+            if isinstance(audio, str):
+                print(f"转录音频文件: {audio}, 优先级: {priority}, 占位ID: {placeholder_id}")
+                # 前置检查：音频文件是否有效
+                if not os.path.exists(audio) or os.path.getsize(audio) == 0:
+                    error_msg = f"音频文件不存在或为空: {audio}"
+                    print(error_msg)
+                    self.update_status(error_msg)
+                    return
+            else:
+                print(f"转录音频: {len(audio) / RATE:.2f}秒, 优先级: {priority}, 占位ID: {placeholder_id}")
+                # 检查采样数（避免空音频）
+                if len(audio) == 0:
+                    error_msg = "音频为空"
+                    print(error_msg)
+                    self.update_status(error_msg)
+                    return
+            
+            if self.asr_worker.state == "failed":
+                self.update_status("语音识别模型不可用，无法转录")
                 return
+            if not self.asr_worker.ready.is_set():
+                self.update_status("语音识别模型加载中，就绪后自动识别...")
             
-            # 检查文件大小（避免空文件）
-            file_size = os.path.getsize(audio_file)
-            print(f"音频文件大小: {file_size} 字节")
-            if file_size == 0:
-                error_msg = "音频文件为空"
+            # 交给常驻的 ASR 工作进程，立即返回：调用方（VAD 线程或 UI 线程）不会被推理卡住
+            # 同时到达的多段语音会在工作进程里合成一批推理，结果由 _handle_transcription 放进消息队列
+            self.asr_worker.submit(audio, {"priority": priority, "placeholder_id": placeholder_id})
+        except Exception as e:
+            error_msg = f"转录错误: {e}"
+            print(error_msg)
+            self.update_status(error_msg)
+    
+    def _on_asr_state(self, state, detail=None):
+        """ASR worker state callback: show model loading / readiness in the status bar"""
+        if state == "loading":
+            text = "语音识别: 模型加载中..."
+        elif state == "ready":
+            text = f"语音识别: 就绪 ({detail})"
+        else:
+            text = "语音识别: 加载失败"
+        # 回调来自监听线程，交给 Tk 主线程更新控件
+        self.ui.latest("asr_status", self.asr_status_label.configure, text=text)
+        if state == "ready":
+            self.update_status("语音识别模型已就绪")
+        elif state == "failed":
+            self.update_status(f"语音识别模型加载失败: {detail}")
+    
+    def _handle_transcription(self, context, text, error):
+        """ASR result callback (listener thread): clean up the text and queue it as voice input"""
+        priority = context["priority"] if context else False
+        placeholder_id = context["placeholder_id"] if context else None
+        if context and not context.get("partial_shown", True):
+            placeholder_id = None  # 流式会话没有显示过部分文本，也就没有占位气泡
+        
+        try:
+            if error:
+                error_msg = f"转录错误: {error}"
                 print(error_msg)
                 self.update_status(error_msg)
+                self._discard_partial_transcript(placeholder_id)
                 return
             
-            # 调用 ASR 模型进行转录
-            print("调用ASR模型转录...")
-            res = asr_model.generate(
-                input=audio_file,
-                cache={},
-                language="auto",
-                use_itn=False,
-                ban_emo_unk=True,
-                batch_size_s=60,
-                merge_vad=True,
-                merge_length_s=15,
-            )
-            
-            print(f"ASR结果: {res}")
+            print(f"ASR结果: {text}")
             
             #处理转录结果：提取有效文本
-            if len(res) > 0 and "text" in res[0]:
-                text = res[0]["text"]
-                extracted_text = extract_language_emotion_content(text)
+            if text:
+                # SenseVoice 的结果带 <|zh|><|NEUTRAL|>... 标记，流式模型的结果是纯文本
+                extracted_text = extract_language_emotion_content(text) if text.startswith("<|") else text.strip()
                 print(f"提取的文本内容: {extracted_text}")
                 
                 # 新增：检查提取的文本是否为空或太短（可能是噪音）
                 if not extracted_text or len(extracted_text.strip()) < 2:
                     print(f"检测到空语音或噪音: '{extracted_text}'，忽略处理")
                     self.update_status("检测到噪音，忽略")
+                    self._discard_partial_transcript(placeholder_id)
                     return
 
                 # 关键细节：
@@ -3098,16 +5275,14 @@ class MultimediaAssistantApp(ctk.CTk):
                 print(f"添加语音输入到消息队列，优先级: {priority_level}")
                 #将转录结果放入消息队列’#
                 #作用：将有效的转录文本封装成消息，放入优先级队列，由后台线程处理（后续会调用 process_voice_input 生成 AI 回应）。
-                self.message_queue.put((
+                self.post_message(
                     priority_level,  # priority (lower number = higher priority)
-                    self.message_id,  # message id for sequence
                     {
                         "type": "voice_input",
                         "content": extracted_text,
                         "placeholder_id": placeholder_id
                     }
-                ))
-                self.message_id += 1
+                )
                 
                 # 高优先级语音中断当前播放
                 #当用户主动说话（高优先级）时，立即停止系统正在播放的语音（比如之前的提醒），确保用户能快速得到回应，提升交互体验。
@@ -3118,12 +5293,70 @@ class MultimediaAssistantApp(ctk.CTk):
                 error_msg = "未检测到语音或转录失败"
                 print(error_msg)
                 self.update_status(error_msg)
+                self._discard_partial_transcript(placeholder_id)
                 
         except Exception as e:
             error_msg = f"转录错误: {e}"
             print(error_msg)
             self.update_status(error_msg)
     
+    def begin_voice_stream(self):
+        """Open a streaming ASR session for the utterance that just started (VAD thread)"""
+        context = {
+            "priority": True,
+            "placeholder_id": f"voice_{int(time.time() * 1000)}",
+            "partial_shown": False,
+        }
+        return self.asr_worker.open_stream(context)
+    
+    def cancel_voice_stream(self, session_id):
+        """Drop a streaming session whose utterance turned out too short (VAD thread)"""
+        context = self.asr_worker.cancel_stream(session_id)
+        if context and context["partial_shown"]:
+            self._discard_partial_transcript(context["placeholder_id"])
+    
+    def _on_partial_transcript(self, context, text):
+        """Streaming ASR callback (listener thread): show the text recognized so far"""
+        context["partial_shown"] = True
+        self.ui.latest(("partial", context["placeholder_id"]), self._show_partial_transcript,
+                       context["placeholder_id"], text)
+    
+    def _show_partial_transcript(self, placeholder_id, text):
+        """Create or update the user placeholder bubble holding the partial transcript"""
+        if self.placeholder_map.was_closed(placeholder_id):
+            return  # 迟到的部分结果：气泡已经定稿或被丢弃，不能再建一个孤儿占位气泡
+        if placeholder_id not in self.placeholder_map:
+            self.add_user_message(text, is_placeholder=True, placeholder_id=placeholder_id)
+        else:
+            self._update_bubble_text(placeholder_id, text)
+    
+    def _finalize_user_message(self, text, placeholder_id):
+        """Turn the partial transcript bubble into the final user message"""
+        label = self._find_placeholder_label(placeholder_id)
+        seq = self.placeholder_map.pop(placeholder_id, None)
+        if seq is None:
+            self.add_user_message(text)
+            return
+        self.transcript.finish(seq, text)
+        if label is None:
+            return
+        label.configure(text=text, text_color=("black", "white"))
+        label.master.configure(fg_color=("#C7E9C0", "#2D3F2D"))
+    
+    def _discard_partial_transcript(self, placeholder_id):
+        """Remove a partial transcript bubble whose utterance was dropped"""
+        if not placeholder_id or not placeholder_id.startswith("voice_"):
+            return
+        
+        def remove():
+            seq = self.placeholder_map.pop(placeholder_id, None)
+            if seq is not None:
+                self.transcript.discard(seq)
+                frame = self.chat_widgets.pop(seq, None)
+                if frame is not None:
+                    frame.destroy()
+        self.ui.call(remove)
+    
     def start_voice_recording(self):
         """Start recording voice when 'r' key is pressed"""
         # This is retained for backwards compatibility, but the continuous
@@ -3138,6 +5371,16 @@ class MultimediaAssistantApp(ctk.CTk):
         pass
     
 
+    def cycle_vad_backend(self):
+        """Switch the voice detector to the next backend in VAD_BACKENDS"""
+        current = self.voice_detector.backend.name
+        index = VAD_BACKENDS.index(current) if current in VAD_BACKENDS else -1
+        for step in range(1, len(VAD_BACKENDS) + 1):
+            name = VAD_BACKENDS[(index + step) % len(VAD_BACKENDS)]
+            if self.voice_detector.set_backend(name) == name:
+                break
+        self.update_status(f"语音检测后端: {self.voice_detector.backend.name}")
+    
     def skip_audio(self):
         """Skip currently playing audio and toggle analysis pause when spacebar is pressed"""
         self.audio_player.skip_current()
@@ -3168,11 +5411,24 @@ def quit_app(app):
     if hasattr(app, 'voice_detector'):
         app.voice_detector.stop_monitoring()
     
-    if hasattr(app, 'processing_running'):
-        app.processing_running = False
+    if hasattr(app, 'lanes'):
+        app.stop_processing_thread()
         
     if hasattr(app, 'audio_player'):
         app.audio_player.stop()
+    
+    if hasattr(app, 'asr_worker'):
+        app.asr_worker.stop()
+    
+    if hasattr(app, 'transcript'):
+        app.transcript.close()
+    
+    if hasattr(app, 'ui'):
+        app.ui.stop()
+        print(f"界面更新统计: {app.ui.summary()}")
+    
+    if hasattr(app, 'queue_stats'):
+        print(f"队列等待时间统计:\n{app.queue_stats.summary()}")
         
     # Clean up keyboard handlers
     keyboard.unhook_all()